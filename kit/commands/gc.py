@@ -0,0 +1,101 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module removes the instances not used by a set of recipes"""
+
+from os import listdir, rmdir
+from pathlib import Path
+
+from kit.commands.install import get_recipe_arg_dict
+from kit.utils.config import config_required
+from kit.utils.dependencies import DependencyIndex
+from kit.utils.disk_usage import disk_usages, human_size
+from kit.utils.plan import expand_specs
+from kit.utils.spec import RecipeArgDict, get_dependency_graph, spec_cache
+from kit.utils.status_index import StatusIndex
+from kit.utils.subparsers import validate_input
+from kit.utils.trash import Trash
+from kit.utils.yes import is_yes
+
+
+def root_instances(
+    recipe_files: list[str], repo_location: str, recipe_arg_dict: RecipeArgDict
+) -> set[str]:
+    """Return the component/instance of the instances of the recipes. The
+    specs are expanded as by install, so the names can reference the user
+    arguments and the other attributes of the instance"""
+    roots = set()
+    for recipe_file in recipe_files:
+        toml_specs = spec_cache.load(recipe_file)
+        graph = get_dependency_graph(toml_specs)
+        for spec in expand_specs(toml_specs, graph, repo_location, recipe_arg_dict):
+            roots.add(f"{spec.component}/{spec.name}")
+    return roots
+
+
+@config_required
+def collect_garbage(args):
+    """Report the instances that are neither in the recipes nor dependencies
+    of their instances, with the disk space they use, and remove them if
+    requested"""
+    repo_location = args.config.repo_location
+    index = DependencyIndex.from_repo(repo_location)
+    roots = root_instances(args.recipe_files, repo_location, args.recipe_arg)
+    unused = sorted(index.dependencies.keys() - index.reachable(roots))
+    if not unused:
+        print("No unused instances")
+        return
+
+    sizes = disk_usages(Path(repo_location, key) for key in unused)
+    width = max(map(len, unused)) + 2
+    for key, size in zip(unused, sizes):
+        print(f"{key:{width}} {human_size(size):>8}")
+    print(f"{len(unused)} unused instances using {human_size(sum(sizes))}")
+
+    if not args.remove:
+        return
+    if args.y:
+        user_answer = input(
+            "The unused instances will be deleted. Do you want to continue? (y/n) "
+        )
+        if not is_yes(user_answer):
+            return
+
+    trash = Trash(repo_location)
+    status_index = StatusIndex(repo_location)
+    trashed = []
+    for key in unused:
+        trashed.append(trash.move(Path(repo_location, key)))
+        status_index.remove(*key.split("/", 1))
+    trash.delete_in_background(*trashed)
+
+    # Delete the component directories if all their instances were deleted
+    for component in {key.split("/", 1)[0] for key in unused}:
+        if len(listdir(f"{repo_location}/{component}")) == 0:
+            rmdir(f"{repo_location}/{component}")
+    print(f"{len(unused)} unused instances removed")
+
+
+def set_gc_subparser(subparsers):
+    """create the parser for the 'gc' command"""
+    parser_gc = subparsers.add_parser(
+        "gc", description="lists and removes the instances not used by the recipes"
+    )
+    parser_gc.add_argument(
+        "recipe_files",
+        metavar="recipe-file",
+        type=validate_input,
+        nargs="+",
+        help="TOML files of the instances to keep, along with their dependencies",
+    )
+    parser_gc.add_argument(
+        "--recipe_arg",
+        default={},
+        type=get_recipe_arg_dict,
+        help="Collection of key=value pairs separated by commas. The content of the TOML file will be replaced with this data.",
+    )
+    parser_gc.add_argument(
+        "--remove", action="store_true", help="remove the unused instances"
+    )
+    parser_gc.add_argument("-y", action="store_false", help="say yes to prompts")
+    parser_gc.set_defaults(fn=collect_garbage)
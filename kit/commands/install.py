@@ -3,9 +3,10 @@
 
 """This module fetches, builds, or installs the requested libraries"""
 
-from argparse import HelpFormatter
+from argparse import ArgumentTypeError, HelpFormatter
 
 from kit.utils.component_builder import install_components_from_recipe_file
+from kit.utils.plan import plan_components_from_recipe_file
 from kit.utils.subparsers import validate_input
 from kit.utils.config import config_required
 
@@ -13,12 +14,24 @@ from kit.utils.config import config_required
 @config_required
 def install_components(args):
     """Install command"""
+    if args.plan:
+        plan_components_from_recipe_file(
+            args.recipe_file,
+            args.upto_stage,
+            args.config.repo_location,
+            args.force,
+            args.recipe_arg,
+        )
+        return
+
     install_components_from_recipe_file(
         args.recipe_file,
         args.upto_stage,
         args.config.repo_location,
         args.force,
         args.recipe_arg,
+        args.jobs,
+        args.verbose,
     )
 
 
@@ -35,6 +48,17 @@ def get_recipe_arg_dict(recipe_arg: str) -> dict[str, str] | None:
         return None
 
 
+def get_jobs_number(jobs: str) -> int:
+    """Returns the number of jobs as a positive integer"""
+    try:
+        number = int(jobs)
+    except ValueError as e:
+        raise ArgumentTypeError(f"Number of jobs '{jobs}' is not an integer") from e
+    if number < 1:
+        raise ArgumentTypeError(f"Number of jobs '{jobs}' should be at least 1")
+    return number
+
+
 def set_install_subparser(subparsers) -> None:
     """create the parser for the 'install' command"""
     actions = ["install", "build", "fetch"]
@@ -57,6 +81,24 @@ def set_install_subparser(subparsers) -> None:
             type=get_recipe_arg_dict,
             help="Collection of key=value pairs separated by commas. The content of the TOML file will be replaced with this data.",
         )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            default=1,
+            type=get_jobs_number,
+            help="Number of components to process concurrently, respecting their dependencies",
+        )
+        parser.add_argument(
+            "-v",
+            "--verbose",
+            action="store_true",
+            help="Print the complete output of the commands, otherwise it is only written to the log files",
+        )
+        parser.add_argument(
+            "--plan",
+            action="store_true",
+            help="Print the stages that would be executed and their commands without executing them",
+        )
 
         if action == "fetch":
             parser.set_defaults(fn=install_components, upto_stage=action, force=False)
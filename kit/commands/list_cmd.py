@@ -3,26 +3,47 @@
 
 """This module lists the libraries that were installed with hekit"""
 
+import json
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from csv import DictWriter
 from pathlib import Path
 from itertools import chain
+from typing import Any, Callable, Iterable, Iterator, Optional
 
-from kit.utils.files import list_dirs, load_toml
+from kit.utils.disk_usage import human_size, instance_sizes
+from kit.utils.files import dump_toml, list_dirs, load_toml
 from kit.utils.config import config_required
+from kit.utils.status_index import StatusIndex
+from kit.utils.subparsers import validate_input
+from kit.utils.tab_completion import components_completer
 from kit.utils.typing import PathType
 
 # Number of separation spaces for columns
 _SEP_SPACES = 2
 _HEADER_COL_1 = "COMPONENT"
 _HEADER_COL_2 = "INSTANCE"
+_STAGES = ("fetch", "build", "install")
+# Number of threads reading the repo. The scan is bound by the latency of
+# stat and open, mostly on network filesystems, rather than by the CPU
+_SCAN_WORKERS = 16
 
 
 class RepoProperties:
     """Contains a dictionary with the structure of the repo
     and widths of the widest component and instance"""
 
-    def __init__(self, repo_location: str, separation_spaces: int = _SEP_SPACES):
-        # Get the components and instances
-        self._repo_structure = RepoProperties._repo_struct(repo_location)
+    def __init__(
+        self,
+        repo_location: PathType,
+        separation_spaces: int = _SEP_SPACES,
+        structure: Optional[dict[str, list[str]]] = None,
+    ):
+        # Get the components and instances, unless already known
+        if structure is None:
+            structure = RepoProperties._repo_struct(repo_location)
+        self._repo_structure = structure
 
         # Get the width of the widest component
         all_components = [*self._repo_structure.keys(), _HEADER_COL_1]
@@ -48,20 +69,223 @@ class RepoProperties:
         """Return a dictionary with the structure of the repo"""
         return self._repo_structure
 
+    @staticmethod
+    def structure_from_keys(keys: Iterable[str]) -> dict[str, list[str]]:
+        """Return a dictionary with the structure of the repo given
+        the component/instance of every instance"""
+        structure: dict[str, list[str]] = {}
+        for key in sorted(keys):
+            component, instance = key.split("/", 1)
+            structure.setdefault(component, []).append(instance)
+        return structure
+
     @staticmethod
     def _repo_struct(path: PathType) -> dict[str, list[str]]:
         """Return a dictionary with sorted keys as components and values as
         sorted list of instances"""
         path = Path(path)
-        return {component: list_dirs(path / component) for component in list_dirs(path)}
+        # Hidden directories, as the trash, are not components
+        components = [c for c in list_dirs(path) if not c.startswith(".")]
+        with ThreadPoolExecutor(max_workers=_SCAN_WORKERS) as executor:
+            instances = executor.map(lambda comp: list_dirs(path / comp), components)
+            return dict(zip(components, instances))
+
+
+InfoGetter = Callable[[str, str], dict]
+Record = dict[str, Any]
+
+_USAGE_KEYS = ("wall_time", "user_time", "sys_time", "max_rss", "exit_code")
+_SIZE_KEYS = (*_STAGES, "total")
 
 
 @config_required
 def list_components(args):
-    """List to stdout info on components."""
+    """List to stdout info on components. The info is read from the status
+    index of the repo, or from the info file of each instance when there is
+    no index or a rescan is requested, updating the index"""
     repo_location = Path(args.config.repo_location)
-    repo_properties = RepoProperties(repo_location)
+    index = StatusIndex(repo_location)
+    indexed = None if args.rescan else index.load()
+
+    scanned: dict[str, dict] = {}
+    backfilled: dict[str, dict] = {}
+    loads: dict[str, Future] = {}
+    get_info: InfoGetter
+    if indexed is None:
+        structure = None
+        if args.component:
+            structure = {args.component: list_dirs(repo_location / args.component)}
+        repo_properties = RepoProperties(repo_location, structure=structure)
+
+        def get_info(comp_name: str, comp_inst: str) -> dict:
+            key = f"{comp_name}/{comp_inst}"
+            try:
+                scanned[key] = loads[key].result()
+            except FileNotFoundError:
+                # Indexed with the error, so it is listed from the index too
+                info_file = repo_location.joinpath(comp_name, comp_inst, "hekit.info")
+                scanned[key] = {"error": f"file '{info_file}' not found"}
+            return scanned[key]
+
+    else:
+        index_info = indexed
+        keys = [
+            k
+            for k in index_info
+            if not args.component or k.split("/")[0] == args.component
+        ]
+        repo_properties = RepoProperties(
+            repo_location, structure=RepoProperties.structure_from_keys(keys)
+        )
+
+        def get_info(comp_name: str, comp_inst: str) -> dict:
+            return index_info[f"{comp_name}/{comp_inst}"]
+
+    with ThreadPoolExecutor(max_workers=_SCAN_WORKERS) as executor:
+        # The info files are read concurrently, and the records
+        # are produced in the sorted order of the repo structure
+        if indexed is None:
+            loads.update(load_info_files(executor, repo_location, repo_properties))
+
+        records = instance_records(repo_location, repo_properties, get_info)
+        if args.status:
+            records = (
+                r for r in records if any(r[stage] == args.status for stage in _STAGES)
+            )
+        if args.size:
+            records = with_sizes(executor, repo_location, records, backfilled)
+
+        write_records(args, repo_properties, records)
+
+    if indexed is None:
+        update_index(index, scanned, backfilled, rebuild=not args.component)
+    else:
+        update_index(index, {key: indexed[key] for key in backfilled}, backfilled)
+
+
+def update_index(
+    index: StatusIndex,
+    infos: dict[str, dict],
+    backfilled: dict[str, dict],
+    rebuild: bool = False,
+) -> None:
+    """Record the infos in the index with the sizes measured,
+    replacing the whole index if rebuild"""
+    for key, sizes in backfilled.items():
+        infos[key]["sizes"] = sizes
+    if rebuild:
+        index.rebuild(infos)
+        return
+    for key, info in infos.items():
+        component, instance = key.split("/", 1)
+        index.update(component, instance, info)
+
+
+def write_records(
+    args, repo_properties: RepoProperties, records: Iterable[Record]
+) -> None:
+    """Write the records to stdout in the format requested"""
+    shown = {"timings": args.timings, "sizes": args.size}
+    tables = [table for table, show in shown.items() if show]
+    if args.format == "json":
+        write_json(records, tables, args.stream)
+    elif args.format == "csv":
+        write_csv(records, tables, args.stream)
+    elif args.timings:
+        list_timings(repo_properties, records, args.stream)
+    elif args.size:
+        list_sizes(repo_properties, records, args.stream)
+    else:
+        list_status(repo_properties, records, args.stream)
+
+
+def load_info_files(
+    executor: ThreadPoolExecutor,
+    repo_location: Path,
+    repo_properties: RepoProperties,
+) -> dict[str, Future]:
+    """Submit the read of the info file of every instance,
+    return the futures keyed by component/instance"""
+    return {
+        f"{comp_name}/{comp_inst}": executor.submit(
+            load_toml, repo_location.joinpath(comp_name, comp_inst, "hekit.info")
+        )
+        for comp_name, inst_list in repo_properties.structure.items()
+        for comp_inst in inst_list
+    }
+
+
+def instance_records(
+    repo_location: Path, repo_properties: RepoProperties, get_info: InfoGetter
+) -> Iterator[Record]:
+    """Yield the status of each stage of the instances, and the resources
+    they used, as soon as the info of each instance is read"""
+    for comp_name, inst_list in repo_properties.structure.items():
+        for comp_inst in inst_list:
+            record: Record = {"component": comp_name, "instance": comp_inst}
+            record.update(dict.fromkeys(_STAGES, "unknown"))
+            record.update(error="", timings={}, sizes={})
+            info_filepath = repo_location.joinpath(comp_name, comp_inst, "hekit.info")
+            try:
+                info = get_info(comp_name, comp_inst)
+                if "error" in info:
+                    record["error"] = info["error"]
+                else:
+                    record["timings"] = info.get("timings", {})
+                    record["sizes"] = info.get("sizes", {})
+                    record.update({stage: info["status"][stage] for stage in _STAGES})
+            except FileNotFoundError:
+                record["error"] = f"file '{info_filepath}' not found"
+            except KeyError as emsg:
+                record["error"] = f"key {emsg} not found"
+            yield record
+
+
+def backfill_sizes(instance_dir: Path) -> dict[str, int]:
+    """Measure the disk usage of an instance installed before the
+    sizes were recorded by each stage, and record it in its info file"""
+    sizes = instance_sizes(instance_dir)
+    info = load_toml(instance_dir / "hekit.info")
+    info["sizes"] = sizes
+    dump_toml(instance_dir / "hekit.info", info)
+    return sizes
+
+
+def with_sizes(
+    executor: ThreadPoolExecutor,
+    repo_location: Path,
+    records: Iterable[Record],
+    backfilled: dict[str, dict],
+) -> Iterator[Record]:
+    """Yield the records with the disk usage of their instances. Instances
+    without recorded sizes are measured concurrently, up to a window of
+    records ahead of the one yielded, and their sizes added to backfilled"""
+    window: deque[tuple[Record, Optional[Future]]] = deque()
+
+    def finish(record: Record, future: Optional[Future]) -> Record:
+        if future is not None:
+            record["sizes"] = future.result()
+            backfilled[f"{record['component']}/{record['instance']}"] = record["sizes"]
+        return record
 
+    for record in records:
+        future = None
+        if not record["sizes"] and not record["error"]:
+            instance_dir = repo_location.joinpath(
+                record["component"], record["instance"]
+            )
+            future = executor.submit(backfill_sizes, instance_dir)
+        window.append((record, future))
+        if len(window) > 2 * _SCAN_WORKERS:
+            yield finish(*window.popleft())
+    while window:
+        yield finish(*window.popleft())
+
+
+def list_status(
+    repo_properties: RepoProperties, records: Iterable[Record], stream: bool = False
+) -> None:
+    """List to stdout the status of each stage of the components"""
     # Aliases
     width_status = repo_properties.width_status
     width_comp = repo_properties.width_comp
@@ -72,33 +296,111 @@ def list_components(args):
         f"{_HEADER_COL_1:{width_comp}} {_HEADER_COL_2:{width_inst}} {'FETCH':{width_status}} {'BUILD':{width_status}} {'INSTALL':{width_status}}"
     )
 
-    for comp_name, inst_list in repo_properties.structure.items():
-        for comp_inst in inst_list:
-            try:
-                info_filepath = repo_location / comp_name / comp_inst / "hekit.info"
-                info_file = load_toml(info_filepath)
-                print(
-                    f"{comp_name:{width_comp}} {comp_inst:{width_inst}}",
-                    f"{info_file['status']['fetch']:{width_status}}",
-                    f"{info_file['status']['build']:{width_status}}",
-                    f"{info_file['status']['install']:{width_status}}",
-                )
-            except FileNotFoundError:
-                print(
-                    f"{comp_name:{width_comp}} {comp_inst:{width_inst}}",
-                    f"{'unknown':{width_status}}",
-                    f"{'unknown':{width_status}}",
-                    f"{'unknown':{width_status}}",
-                    f"file '{info_filepath}' not found",
-                )
-            except KeyError as emsg:
-                print(
-                    f"{comp_name:{width_comp}} {comp_inst:{width_inst}}",
-                    f"{'unknown':{width_status}}",
-                    f"{'unknown':{width_status}}",
-                    f"{'unknown':{width_status}}",
-                    f"key {emsg} not found",
-                )
+    for record in records:
+        columns = [
+            f"{record['component']:{width_comp}} {record['instance']:{width_inst}}",
+            *(f"{record[stage]:{width_status}}" for stage in _STAGES),
+        ]
+        if record["error"]:
+            columns.append(record["error"])
+        print(*columns)
+        if stream:
+            sys.stdout.flush()
+
+
+def list_timings(
+    repo_properties: RepoProperties, records: Iterable[Record], stream: bool = False
+) -> None:
+    """List to stdout the resources used by each stage of the components:
+    wall time, CPU user and system times, peak memory and exit code"""
+    width_comp = repo_properties.width_comp
+    width_inst = repo_properties.width_inst
+    width_stage = 9
+    width_num = 10
+
+    print(
+        f"{_HEADER_COL_1:{width_comp}} {_HEADER_COL_2:{width_inst}} {'STAGE':{width_stage}}",
+        f"{'WALL(s)':>{width_num}} {'USER(s)':>{width_num}} {'SYS(s)':>{width_num}}",
+        f"{'RSS(MiB)':>{width_num}} {'EXIT':>{width_num}}",
+    )
+
+    for record in records:
+        comp_name, comp_inst = record["component"], record["instance"]
+        for stage in _STAGES:
+            if stage not in record["timings"]:
+                continue
+            usage = record["timings"][stage]
+            print(
+                f"{comp_name:{width_comp}} {comp_inst:{width_inst}} {stage:{width_stage}}",
+                f"{usage['wall_time']:{width_num}.2f} {usage['user_time']:{width_num}.2f}",
+                f"{usage['sys_time']:{width_num}.2f} {usage['max_rss'] / 1024:{width_num}.1f}",
+                f"{usage['exit_code']:{width_num}}",
+            )
+        if stream:
+            sys.stdout.flush()
+
+
+def list_sizes(
+    repo_properties: RepoProperties, records: Iterable[Record], stream: bool = False
+) -> None:
+    """List to stdout the disk space used by the directory
+    of each stage of the components and in total"""
+    width_comp = repo_properties.width_comp
+    width_inst = repo_properties.width_inst
+    width_num = 10
+
+    print(
+        f"{_HEADER_COL_1:{width_comp}} {_HEADER_COL_2:{width_inst}}",
+        *(f"{key.upper():>{width_num}}" for key in _SIZE_KEYS),
+    )
+
+    for record in records:
+        columns = [
+            f"{record['component']:{width_comp}} {record['instance']:{width_inst}}"
+        ]
+        if record["error"]:
+            columns.append(record["error"])
+        else:
+            sizes = record["sizes"]
+            columns += [
+                f"{human_size(sizes[key]) if key in sizes else '-':>{width_num}}"
+                for key in _SIZE_KEYS
+            ]
+        print(*columns)
+        if stream:
+            sys.stdout.flush()
+
+
+def write_json(records: Iterable[Record], tables: list[str], stream: bool) -> None:
+    """Write the records to stdout as a JSON array, or as one JSON object
+    per line if streaming. The timings and sizes are written if in tables"""
+    hidden = {"timings", "sizes"} - set(tables)
+    records = ({k: v for k, v in r.items() if k not in hidden} for r in records)
+    if stream:
+        for record in records:
+            print(json.dumps(record), flush=True)
+    else:
+        print(json.dumps(list(records), indent=2))
+
+
+def write_csv(records: Iterable[Record], tables: list[str], stream: bool) -> None:
+    """Write the records to stdout as CSV, with one column for each resource
+    used by each stage if timings in tables, and for each size if sizes"""
+    fieldnames = ["component", "instance", *_STAGES, "error"]
+    if "timings" in tables:
+        fieldnames += [f"{stage}_{key}" for stage in _STAGES for key in _USAGE_KEYS]
+    if "sizes" in tables:
+        fieldnames += [f"{key}_size" for key in _SIZE_KEYS]
+    writer = DictWriter(sys.stdout, fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    for record in records:
+        row = {**record}
+        for stage, usage in record["timings"].items():
+            row.update({f"{stage}_{k}": v for k, v in usage.items()})
+        row.update({f"{k}_size": v for k, v in record["sizes"].items()})
+        writer.writerow(row)
+        if stream:
+            sys.stdout.flush()
 
 
 def set_list_subparser(subparsers):
@@ -106,4 +408,40 @@ def set_list_subparser(subparsers):
     parser_list = subparsers.add_parser(
         "list", description="lists installed components"
     )
+    parser_list.add_argument(
+        "--format",
+        default="text",
+        choices=["text", "json", "csv"],
+        help="output format",
+    )
+    parser_list.add_argument(
+        "--status",
+        choices=["success", "failure", "unknown", ""],
+        help="lists the instances with a stage in this status",
+    )
+    parser_list.add_argument(
+        "--component",
+        type=validate_input,
+        help="lists the instances of this component",
+    ).completer = components_completer
+    parser_list.add_argument(
+        "--stream",
+        action="store_true",
+        help="prints each instance as soon as it is read, JSON is printed as one object per line",
+    )
+    parser_list.add_argument(
+        "--rescan",
+        action="store_true",
+        help="reads the info file of every instance and rebuilds the status index",
+    )
+    parser_list.add_argument(
+        "--timings",
+        action="store_true",
+        help="lists the time and resources used by each stage",
+    )
+    parser_list.add_argument(
+        "--size",
+        action="store_true",
+        help="lists the disk space used by each stage, measuring the instances installed without it",
+    )
     parser_list.set_defaults(fn=list_components)
@@ -3,13 +3,18 @@
 
 """This module handles the usage of third party plugins"""
 
+import tarfile
 from argparse import RawTextHelpFormatter
 from enum import Enum
-from shutil import rmtree, copytree
+from hashlib import sha256
+from shutil import rmtree, copytree, move
 from tarfile import is_tarfile, open as tar_open
+from tempfile import TemporaryDirectory
+from typing import BinaryIO, Optional
 
 from zipfile import is_zipfile, ZipFile
 from pathlib import Path
+from posixpath import normpath
 
 from toml import loads as toml_loads
 
@@ -18,6 +23,7 @@ from kit.utils.yes import is_yes
 from kit.utils.subparsers import (
     get_options_description,
     get_plugin_arg_choices,
+    get_plugin_manifests,
     validate_input,
 )
 from kit.utils.files import list_dirs, load_toml, dump_toml, dash_to_underscore
@@ -27,6 +33,13 @@ PluginSettings = dict[str, str]
 PluginSettingsList = list[PluginSettings]
 ConfigDict = dict[str, PluginSettings]
 
+# Size of the blocks read to compute checksums
+_CHUNK_SIZE = 2**20
+
+# Reject links and special files pointing outside the
+# destination, if this version of Python supports it
+_TAR_FILTER = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+
 
 class InvalidPluginError(Exception):
     """InvalidPluginError exception raised for an invalid plugin"""
@@ -76,11 +89,117 @@ def get_plugin_type(plugin_path: Path) -> PluginType:
     raise TypeError("This program only supports tarball or zip files")
 
 
+class HashingReader:
+    """Binary file object computing the SHA-256 of the data read through it"""
+
+    def __init__(self, file: BinaryIO) -> None:
+        self._file = file
+        self.hash = sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        """Read and hash up to size bytes"""
+        data = self._file.read(size)
+        self.hash.update(data)
+        return data
+
+    def drain(self) -> None:
+        """Hash the data left in the file"""
+        while self.read(_CHUNK_SIZE):
+            pass
+
+
+def file_sha256(path: Path) -> str:
+    """Return the SHA-256 of a file"""
+    with path.open("rb") as f:
+        reader = HashingReader(f)
+        reader.drain()
+        return reader.hash.hexdigest()
+
+
+def archive_member_name(name: str, plugin_path: Path) -> str:
+    """Return the normalized name of an archive member, as 'dir/file' for
+    './dir/file' or 'dir/', raise an InvalidPluginError if it would be
+    extracted outside the destination"""
+    if name.startswith("/") or ".." in name.split("/"):
+        raise InvalidPluginError(f"Invalid path '{name}' in '{plugin_path.name}'")
+    return normpath(name)
+
+
+def is_plugin_toml(name: str) -> bool:
+    """Return whether an archive member is the TOML file of a plugin,
+    placed in a top-level directory"""
+    return name.count("/") == 1 and name.endswith("/plugin.toml")
+
+
+def read_plugin_archive(
+    plugin_path: Path,
+    plugin_type: PluginType,
+    staging_path: Optional[Path] = None,
+    checksum: Optional[str] = None,
+) -> tuple[set[str], dict[str, bytes]]:
+    """Read a tarball or zip file in a single pass, extracting its members
+    into staging_path if given and verifying its SHA-256 checksum if given.
+    Return the names of its members and the content of the TOML files of
+    its plugins"""
+    names: set[str] = set()
+    tomls: dict[str, bytes] = {}
+    digest = ""
+
+    if PluginType.TAR == plugin_type:
+        with plugin_path.open("rb") as raw_file:
+            # Compressed tarballs are read as a stream, hashing the data read
+            reader = HashingReader(raw_file)
+            # The stubs of tarfile expect a full file object
+            with tar_open(  # type: ignore[call-overload]
+                fileobj=reader, mode="r|*"
+            ) as f:
+                for item in f:
+                    name = archive_member_name(item.name, plugin_path)
+                    names.add(name)
+                    if staging_path is not None:
+                        f.extract(item, staging_path, **_TAR_FILTER)
+                        if is_plugin_toml(name) and item.isfile():
+                            tomls[name] = (staging_path / name).read_bytes()
+                    elif is_plugin_toml(name) and item.isfile():
+                        file = f.extractfile(item)
+                        if file is not None:
+                            tomls[name] = file.read()
+            reader.drain()
+            digest = reader.hash.hexdigest()
+
+    elif PluginType.ZIP == plugin_type:
+        # The members of a zip file are located by its central directory at
+        # the end, so the checksum is computed in a sequential read first
+        if checksum:
+            digest = file_sha256(plugin_path)
+        with ZipFile(plugin_path) as f:
+            for info in f.infolist():
+                name = archive_member_name(info.filename, plugin_path)
+                names.add(name)
+                if staging_path is not None:
+                    f.extract(info, staging_path)
+                if is_plugin_toml(name):
+                    tomls[name] = f.read(info)
+
+    if checksum and digest != checksum.lower():
+        raise InvalidPluginError(
+            f"Checksum of '{plugin_path.name}' does not match, "
+            f"expected {checksum} but found {digest}"
+        )
+
+    return names, tomls
+
+
 def check_plugin_structure(
-    plugin_path: Path, plugin_type: PluginType
+    plugin_path: Path,
+    plugin_type: PluginType,
+    staging_path: Optional[Path] = None,
+    checksum: Optional[str] = None,
 ) -> PluginSettingsList:
-    """Check the minimum plugin structure (a directory with a plugin.py file)
-    and return its name"""
+    """Check the minimum plugin structure (a directory with a plugin.toml file
+    and the start file) and return the settings of each plugin. A tarball or
+    zip file is read once, extracting it into staging_path if given and
+    verifying its SHA-256 checksum if given"""
     plugin_settings_list = []
     exp_toml = "plugin.toml"
 
@@ -92,61 +211,30 @@ def check_plugin_structure(
             if not Path(exp_file).exists():
                 raise FileNotFoundError()
             plugin_settings_list = [plugin_settings_dict]
+        else:
+            exp_file = exp_toml
+            names, tomls = read_plugin_archive(
+                plugin_path, plugin_type, staging_path, checksum
+            )
+            if exp_toml in names:
+                # Verify the toml file is in a directory
+                exp_file = f"DIRECTORY/{exp_toml}"
+                raise FileNotFoundError()
+            if not tomls:
+                raise FileNotFoundError()
 
-        elif PluginType.TAR == plugin_type:
-            with tar_open(plugin_path) as f:
-                # get the list of plugin.toml files
-                exp_file = exp_toml
-                tar_toml_list = [
-                    item.name for item in f.getmembers() if exp_file in item.name
-                ]
-                if not tar_toml_list:
+            for toml_file, content in sorted(tomls.items()):
+                # Check that the directory is named after the plugin
+                # and the file defined in "start" is present
+                plugin_settings_dict = toml_loads(content.decode("utf-8"))["plugin"]
+                dir_name = dash_to_underscore(plugin_settings_dict["name"])
+                exp_file = f"{dir_name}/{exp_toml}"
+                if toml_file != exp_file:
                     raise FileNotFoundError()
-
-                # getmember and extractfile raise a KeyError if the file cannot be found
-                for toml_file in tar_toml_list:
-                    # Verify the toml file is in a directory
-                    exp_file = f"DIRECTORY/{exp_toml}"
-                    dir_name = toml_file.split("/")[0]
-                    f.getmember(dir_name)
-
-                    # Read the toml file and check that the file
-                    # defined in "start" is present
-                    file = f.extractfile(toml_file)
-                    if file is None:
-                        raise TypeError(f"{toml_file} is not valid file")
-                    with file:
-                        file_content = file.read().decode("utf-8")
-                        plugin_settings_dict = toml_loads(file_content)["plugin"]
-                        exp_file = f'{dir_name}/{plugin_settings_dict["start"]}'
-                        f.getmember(exp_file)
-                        plugin_settings_list.append(plugin_settings_dict)
-
-        elif PluginType.ZIP == plugin_type:
-            with ZipFile(plugin_path) as f:
-                # get the list of plugin.toml files
-                exp_file = exp_toml
-                zip_toml_list = [
-                    item.filename for item in f.infolist() if exp_file in item.filename
-                ]
-                if not zip_toml_list:
+                exp_file = f'{dir_name}/{plugin_settings_dict["start"]}'
+                if exp_file not in names:
                     raise FileNotFoundError()
-
-                # getinfo and open raise a KeyError if the file cannot be found
-                for toml_file in zip_toml_list:
-                    # Verify the toml file is in a directory
-                    exp_file = f"DIRECTORY/{exp_toml}"
-                    dir_name = toml_file.split("/")[0]
-                    f.getinfo(f"{dir_name}/")
-
-                    # Read the toml file and check that the file
-                    # defined in "start" is present
-                    with f.open(toml_file) as file:
-                        file_content = file.read().decode("utf-8")
-                        plugin_settings_dict = toml_loads(file_content)["plugin"]
-                        exp_file = f'{dir_name}/{plugin_settings_dict["start"]}'
-                        f.getinfo(exp_file)
-                        plugin_settings_list.append(plugin_settings_dict)
+                plugin_settings_list.append(plugin_settings_dict)
 
     except (FileNotFoundError, KeyError) as e:
         raise InvalidPluginError(
@@ -162,17 +250,13 @@ def move_plugin_data(
     plugin_type: PluginType,
     dest_path: Path = PluginsConfig.ROOT_DIR,
 ) -> None:
-    """Move the plugin data to ~/.hekit/plugins"""
+    """Move the plugin data to ~/.hekit/plugins. The data of a tarball or
+    zip file is moved from plugin_path, where it was extracted"""
+    plugin_dirname = dash_to_underscore(plugin_name)
     if PluginType.DIR == plugin_type:
-        copytree(plugin_path, dest_path / dash_to_underscore(plugin_name))
-    elif PluginType.TAR == plugin_type:
-        with tar_open(plugin_path) as f:
-            tar_items = [item for item in f.getmembers() if plugin_name in item.name]
-            f.extractall(dest_path, tar_items)
-    elif PluginType.ZIP == plugin_type:
-        with ZipFile(plugin_path) as f:
-            zip_items = [item for item in f.infolist() if plugin_name in item.filename]
-            f.extractall(dest_path, zip_items)
+        copytree(plugin_path, dest_path / plugin_dirname)
+    else:
+        move(plugin_path / plugin_dirname, dest_path / plugin_dirname)
 
 
 def remove_plugin_data(
@@ -184,6 +268,30 @@ def remove_plugin_data(
         rmtree(plugin_path)
 
 
+def get_plugin_settings_dict(
+    plugin_name: str,
+    plugin_version: str,
+    plugin_start: str,
+    plugin_root: Path = PluginsConfig.ROOT_DIR,
+) -> PluginSettings:
+    """Return the settings of an enabled plugin for the plugin config file,
+    with the sub-command it defines and the function that creates its
+    parser, so the plugin is only imported when its sub-command is used"""
+    settings = {
+        "version": plugin_version,
+        "state": PluginState.ENABLE,
+        "start": plugin_start,
+    }
+    manifest = get_plugin_manifests(plugin_name, plugin_start, plugin_root).get(
+        plugin_name
+    )
+    if manifest is not None:
+        settings["command"] = plugin_name
+        settings["function"] = manifest.function
+        settings["description"] = manifest.description
+    return settings
+
+
 def are_plugin_args_correct(
     plugin_name: str, is_plugin_present: bool, hekit_parsers_list: list[str]
 ) -> bool:
@@ -228,9 +336,34 @@ def install_plugin(args) -> None:
     config_dict = load_plugins_config_file()
     plugin_path = Path(args.plugin).resolve()
     plugin_type = get_plugin_type(plugin_path)
-    plugin_settings_list = check_plugin_structure(plugin_path, plugin_type)
-    update_config = False
+    if args.sha256 and PluginType.DIR == plugin_type:
+        raise ValueError("Flag '--sha256' can only be used with tarball or zip files")
+
+    # The archives are extracted while they are checked
+    with TemporaryDirectory() as staging_dir:
+        staging_path = Path(staging_dir)
+        plugin_settings_list = check_plugin_structure(
+            plugin_path, plugin_type, staging_path, args.sha256
+        )
+        data_path = plugin_path if PluginType.DIR == plugin_type else staging_path
+        update_config = install_plugin_list(
+            args, config_dict, plugin_settings_list, data_path, plugin_type
+        )
 
+    if update_config:
+        update_plugins_config_file(config_dict)
+
+
+def install_plugin_list(
+    args,
+    config_dict: ConfigDict,
+    plugin_settings_list: PluginSettingsList,
+    plugin_path: Path,
+    plugin_type: PluginType,
+) -> bool:
+    """Install the plugins of a plugin file, whose data is in plugin_path,
+    and return whether config_dict was updated"""
+    update_config = False
     for plugin_settings_dict in plugin_settings_list:
         plugin_name = plugin_settings_dict["name"]
         plugin_version = plugin_settings_dict["version"]
@@ -260,24 +393,26 @@ def install_plugin(args) -> None:
 
         move_plugin_data(plugin_name, plugin_path, plugin_type)
 
-        # verify the plugin arguments
+        # verify the plugin arguments. The sub-commands of the
+        # installed plugins are not registered by 'hekit plugins'
+        hekit_parsers_list = [
+            *args.hekit_parsers_list,
+            *(v.get("command", k) for k, v in config_dict.items()),
+        ]
         if not are_plugin_args_correct(
-            plugin_name, is_plugin_present, args.hekit_parsers_list
+            plugin_name, is_plugin_present, hekit_parsers_list
         ):
             remove_plugin_data(plugin_name)
             continue
 
-        config_dict[plugin_name] = {
-            "version": plugin_version,
-            "state": PluginState.ENABLE,
-            "start": plugin_settings_dict["start"],
-        }
+        config_dict[plugin_name] = get_plugin_settings_dict(
+            plugin_name, plugin_version, plugin_settings_dict["start"]
+        )
 
         update_config = True
         print(f"Plugin {plugin_name} was installed successfully")
 
-    if update_config:
-        update_plugins_config_file(config_dict)
+    return update_config
 
 
 def remove_plugin(args) -> None:
@@ -355,8 +490,9 @@ def list_plugins(args) -> None:
         )
 
 
-def refresh_plugins(args) -> None:  # pylint: disable=unused-argument
-    """Synchronize the information regarding the plugins on the system"""
+def refresh_plugins(args) -> None:
+    """Synchronize the information regarding the plugins on the system,
+    recording the sub-command of each plugin"""
 
     def get_plugin_settings():
         root_dir = args.root_dir
@@ -381,7 +517,7 @@ def refresh_plugins(args) -> None:  # pylint: disable=unused-argument
             yield name, version, start
 
     config_dict = {
-        name: {"version": version, "state": PluginState.ENABLE, "start": start}
+        name: get_plugin_settings_dict(name, version, start, args.root_dir)
         for name, version, start in get_plugin_settings()
     }
 
@@ -423,6 +559,11 @@ def set_plugin_subparser(subparsers) -> None:
     parser_install.add_argument(
         "--force", action="store_true", help="forces the installation process"
     )
+    parser_install.add_argument(
+        "--sha256",
+        type=validate_input,
+        help="verify the SHA-256 checksum of the tarball or zip file",
+    )
     parser_install.set_defaults(
         fn=install_plugin, hekit_parsers_list=subparsers.choices.keys()
     )
@@ -3,17 +3,24 @@
 
 """This module removes specific libraries"""
 
-from shutil import rmtree
-from os import listdir
+from os import listdir, rmdir
 from kit.utils.tab_completion import components_completer, instances_completer
 from kit.utils.subparsers import validate_input
 from kit.utils.yes import is_yes
 from kit.utils.config import config_required
+from kit.utils.dependencies import DependencyIndex
+from kit.utils.status_index import StatusIndex
+from kit.utils.trash import Trash
 
 
 @config_required
 def remove_components(args):
-    """Remove component instances"""
+    """Remove component instances. They are moved into the trash of the
+    repo at once, and deleted from it by a process in the background"""
+    if args.purge_trash:
+        purge_trash(args)
+        return
+
     try:
         user_answer = "y"
         request_info = args.y
@@ -22,6 +29,9 @@ def remove_components(args):
         repo_path = args.config.repo_location
         comp_path = f"{repo_path}/{component}"
         inst_path = f"{comp_path}/{instance}"
+        trash = Trash(repo_path)
+
+        check_not_required(args)
 
         if args.all:
             # Case: delete all components
@@ -34,7 +44,9 @@ def remove_components(args):
                     f"All components in {repo_path} will be deleted. Do you want to continue? (y/n) "
                 )
             if is_yes(user_answer):
-                rmtree(repo_path)
+                entries = set(listdir(repo_path)) - {Trash.dirname}
+                trashed = [trash.move(f"{repo_path}/{e}") for e in sorted(entries)]
+                trash.delete_in_background(*trashed)
                 print("All components successfully removed")
         elif not component:
             raise ValueError(
@@ -47,18 +59,20 @@ def remove_components(args):
                     f"All instances of component '{component}' will be deleted. Do you want to continue? (y/n) "
                 )
             if is_yes(user_answer):
-                rmtree(comp_path)
+                trash.delete_in_background(trash.move(comp_path))
+                StatusIndex(repo_path).remove(component)
                 print(f"All instances of component '{component}' successfully removed")
         else:
             # Case: delete a specific instances of a component
-            rmtree(inst_path)
+            trash.delete_in_background(trash.move(inst_path))
+            StatusIndex(repo_path).remove(component, instance)
             print(
                 f"Instance '{instance}' of component '{component}' successfully removed"
             )
 
             # Delete the component directory if all its instances were deleted
             if len(listdir(comp_path)) == 0:
-                rmtree(comp_path)
+                rmdir(comp_path)
 
     except FileNotFoundError:
         print(
@@ -67,6 +81,36 @@ def remove_components(args):
         )
 
 
+def check_not_required(args) -> None:
+    """Raise ValueError if other instances depend on the instance
+    being removed, or on any instance of the component if not given"""
+    component, instance = args.component, args.instance
+    if args.all or args.force or not component:
+        return
+    index = DependencyIndex.from_repo(args.config.repo_location)
+    removed = [
+        key
+        for key in index.dependencies
+        if key == f"{component}/{instance}"
+        or (not instance and key.startswith(f"{component}/"))
+    ]
+    required = index.required_by(removed)
+    if required:
+        details = "; ".join(
+            f"'{key}' is required by {', '.join(dependents)}"
+            for key, dependents in required.items()
+        )
+        raise ValueError(f"{details}. Use '--force' to remove anyway")
+
+
+def purge_trash(args):
+    """Delete the components whose removal is still in progress"""
+    if args.all or args.component or args.instance:
+        raise ValueError("Flag '--purge-trash' cannot be used when removing components")
+    trash = Trash(args.config.repo_location)
+    print(f"{trash.purge()} entries deleted from the trash")
+
+
 def set_remove_subparser(subparsers):
     """create the parser for the 'remove' command"""
     parser_remove = subparsers.add_parser(
@@ -76,6 +120,17 @@ def set_remove_subparser(subparsers):
         "--all", action="store_true", help="remove all components"
     )
     parser_remove.add_argument("-y", action="store_false", help="say yes to prompts")
+    parser_remove.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="remove even if other instances depend on it",
+    )
+    parser_remove.add_argument(
+        "--purge-trash",
+        action="store_true",
+        help="delete the components whose removal is still in progress",
+    )
     parser_remove.add_argument(
         "component",
         type=validate_input,
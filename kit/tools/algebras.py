@@ -5,16 +5,14 @@
 
 import math
 import re
-import shutil
 from argparse import ArgumentTypeError
+from functools import partial
 from sys import stderr, exit as sys_exit
 from itertools import chain, combinations
 from collections import Counter
-from pathlib import Path
 from typing import Callable, Generator, Iterable, Optional
-from kit.utils.typing import PathType
-from kit.utils.files import create_default_workspace
-from kit.utils.primes import compute_prime_factors, write_primes
+from kit.utils.factor_cache import FactorCache
+from kit.utils.primes import PrimeTable, factorize_numbers
 
 
 def powerset(iterable: Iterable[int]) -> chain:
@@ -24,9 +22,22 @@ def powerset(iterable: Iterable[int]) -> chain:
     return chain.from_iterable(combinations(s, r) for r in range(1, len(s) + 1))
 
 
-def find_ms(ps: Iterable[int], ds: Iterable[int], factorize: Callable) -> Generator:
-    """Returns the p, gen for max m's for p^d"""
-    prime_factors = factorize(p**d - 1 for p in ps for d in ds)
+def find_ms(
+    ps: Iterable[int],
+    ds: Iterable[int],
+    factorize: Callable,
+    cache: Optional[FactorCache] = None,
+) -> Generator:
+    """Returns the p, gen for max m's for p^d. If a cache is given, only the
+    numbers p^d - 1 not in the cache are factorized, and the cache is saved"""
+    numbers = (p**d - 1 for p in ps for d in ds)
+    if cache is None:
+        prime_factors = factorize(numbers)
+    else:
+        try:
+            prime_factors = cache.factorize(numbers, factorize)
+        finally:
+            cache.save()
     if prime_factors:
         all_factors = tuple(powerset(primes) for primes in prime_factors)
         pd = ((p, d) for p in ps for d in ds)
@@ -63,9 +74,14 @@ def str_to_range(s: str) -> range:
         raise ArgumentTypeError(f"Wrong syntax for range given '{s}'.") from error
 
 
+def str_to_ranges(string: str) -> Generator[range, None, None]:
+    """Parse a string of comma separated numbers and ranges"""
+    return (str_to_range(s) for s in string.replace(" ", "").split(","))
+
+
 def parse_range(string: str, filter_fn: Optional[Callable] = None) -> list[int]:
     """Returns sorted list"""
-    ranges = (str_to_range(s) for s in string.replace(" ", "").split(","))
+    ranges = str_to_ranges(string)
 
     if filter_fn is None:
         unique_nums = {x for r in ranges for x in r}
@@ -76,33 +92,13 @@ def parse_range(string: str, filter_fn: Optional[Callable] = None) -> list[int]:
 
 
 def parse_range_for_primes(string: str) -> list[int]:
-    """Create a file with sorted primes"""
-    default_primes_filepath = Path("~/.hekit/primes.txt").expanduser()
-    try:
-        primes_list = PrimesFromFile(default_primes_filepath)
-    except FileNotFoundError:
-        create_default_workspace()
-        with default_primes_filepath.open("w", encoding="utf-8") as f:
-            write_primes(2, 140_000, outfile=f)
-        primes_list = PrimesFromFile(default_primes_filepath)
-
-    return parse_range(string, filter_fn=primes_list.is_prime)
-
-
-class PrimesFromFile:
-    """Process primes from a text file."""
-
-    def __init__(self, filename: PathType) -> None:
-        """Load file with primes."""
-        with open(filename, encoding="utf-8") as f:
-            self.primes = tuple(int(p) for p in f.readlines())
-            self.max = self.primes[-1]
-
-    def is_prime(self, n: int) -> bool:
-        """Return True if prime for numbers up to numbers in the file."""
-        if n > self.max:
-            raise ValueError(f"Cannot process number higher than {self.max}")
-        return n in self.primes
+    """Return the sorted primes in the ranges, from the table of
+    primes under ~/.hekit, which is extended as needed"""
+    prime_table = PrimeTable()
+    unique_primes = {
+        p for r in str_to_ranges(string) for p in prime_table.primes_in_range(r)
+    }
+    return sorted(unique_primes)
 
 
 def set_gen_algebras_subparser(subparsers) -> None:
@@ -124,12 +120,34 @@ def set_gen_algebras_subparser(subparsers) -> None:
         "--no-header", action="store_false", help="do not print headers"
     )
 
-    factor_util = shutil.which("factor") or shutil.which("gfactor")
-    if factor_util is None:
-        print("To run, factor utility is required.", file=stderr)
-        sys_exit(1)
+    parser.add_argument(
+        "--timeout",
+        type=positive_float,
+        default=None,
+        help="seconds to factorize each p^d - 1, without limit by default",
+    )
+    parser.add_argument(
+        "--ecm",
+        action="store_true",
+        help="factorize with the elliptic curve method, for large p^d - 1",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="factorize all p^d - 1, without the cache of factors under ~/.hekit",
+    )
+    parser.set_defaults(fn=algebras)
 
-    parser.set_defaults(fn=algebras, factor_util=factor_util)
+
+def positive_float(string: str) -> float:
+    """Parse a positive number of seconds"""
+    try:
+        value = float(string)
+    except ValueError as error:
+        raise ArgumentTypeError(f"'{string}' is not a number") from error
+    if value <= 0:
+        raise ArgumentTypeError(f"'{string}' is not a positive number")
+    return value
 
 
 def phi(prime_factors: Iterable[int]) -> int:
@@ -169,7 +187,9 @@ def algebras(args):
         print(
             f"{'p' :^{width}} {'d' :^{width}} {'m' :^{width}} {'phim' :^{width}} {'nslots' :^{width}}"
         )
-    for p, d, m_factors in find_ms(args.p, args.d, compute_prime_factors):
+    factorize = partial(factorize_numbers, timeout=args.timeout, use_ecm=args.ecm)
+    cache = None if args.no_cache else FactorCache()
+    for p, d, m_factors in find_ms(args.p, args.d, factorize, cache):
         m = math.prod(m_factors)
         e, corrected = correct_for_d(p, d, m)
         soln = (p, e, m)
@@ -0,0 +1,349 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module provides the caches used to fetch, build and install components"""
+
+import json
+import shlex
+from contextlib import contextmanager
+from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_SH, LOCK_UN
+from hashlib import sha256
+from os import getpid, link, utime, walk
+from pathlib import Path
+from shutil import copy2, copytree, rmtree
+from threading import get_ident
+from typing import Callable, Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+from kit.utils.typing import PathType
+
+RunOutput = tuple[bool, int]
+
+
+def stage_key(stage: str, attribs: dict, input_keys: Iterable[str]) -> str:
+    """Return the hash identifying a stage from the expanded attribs
+    it executes and the keys of the stages it consumes"""
+    content = {
+        "stage": stage,
+        "attribs": attribs,
+        "inputs": sorted(input_keys),
+    }
+    serialized = json.dumps(content, sort_keys=True, default=str)
+    return sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def tree_fingerprint(path: PathType) -> str:
+    """Return a hash of the names, sizes and modification times of the
+    files in a tree, used to key local sources without reading them"""
+    entries = sorted(
+        (str(Path(root, f).relative_to(path)), stat.st_size, stat.st_mtime_ns)
+        for root, _, files in walk(path)
+        for f in files
+        for stat in (Path(root, f).lstat(),)
+    )
+    return sha256(json.dumps(entries).encode("utf-8")).hexdigest()
+
+
+def tree_size(path: PathType) -> int:
+    """Return the size in bytes of the files in a tree"""
+    return sum(
+        (Path(root) / f).lstat().st_size for root, _, files in walk(path) for f in files
+    )
+
+
+class CacheDirectory:
+    """Directory of entries evicted least recently used first when their
+    total size is above max_size bytes. The size of each entry is recorded
+    in a <key>.size file when the entry is added, and each entry can be
+    locked with flock on a <key>.lock file, shared between processes"""
+
+    def __init__(self, root: PathType, max_size: int) -> None:
+        self._root = Path(root)
+        self._max_size = max_size
+
+    def path(self, key: str) -> Path:
+        """Return the location of the entry of key"""
+        return self._root / key
+
+    def __contains__(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def tmp_path(self, key: str) -> Path:
+        """Return a location to prepare the entry of key,
+        ignored by the cache until renamed to path(key)"""
+        self._root.mkdir(parents=True, exist_ok=True)
+        tmp = self._root / f".tmp-{key}-{getpid()}-{get_ident()}"
+        rmtree(tmp, ignore_errors=True)
+        return tmp
+
+    def add(self, key: str, tmp: Path) -> None:
+        """Rename tmp as the entry of key and record its size.
+        If the entry was added in the meantime, tmp is dropped"""
+        try:
+            tmp.rename(self.path(key))
+        except OSError:
+            rmtree(tmp, ignore_errors=True)
+            return
+        size = tree_size(self.path(key)) if self.path(key).is_dir() else 0
+        self._root.joinpath(f"{key}.size").write_text(str(size), encoding="utf-8")
+
+    def used(self, key: str) -> None:
+        """Mark the entry of key as recently used"""
+        utime(self.path(key))
+
+    @contextmanager
+    def lock(
+        self, key: str, exclusive: bool = True, blocking: bool = True
+    ) -> Iterator[bool]:
+        """Lock the entry of key. Yields False if not blocking
+        and the entry is already locked"""
+        self._root.mkdir(parents=True, exist_ok=True)
+        with self._root.joinpath(f"{key}.lock").open(
+            "a", encoding="utf-8"
+        ) as lock_file:
+            operation = LOCK_EX if exclusive else LOCK_SH
+            try:
+                flock(lock_file, operation if blocking else operation | LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                flock(lock_file, LOCK_UN)
+
+    def _size(self, key: str) -> int:
+        """Return the recorded size of an entry, recording it if missing"""
+        size_file = self._root / f"{key}.size"
+        try:
+            return int(size_file.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            size = tree_size(self.path(key))
+            size_file.write_text(str(size), encoding="utf-8")
+            return size
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove the least recently used entries until the size of the
+        cache is not above the maximum size. Locked entries are kept"""
+        if not self._root.is_dir():
+            return
+        keys = [
+            entry.name
+            for entry in self._root.iterdir()
+            if not entry.name.startswith(".") and entry.suffix not in (".size", ".lock")
+        ]
+        sizes = {key: self._size(key) for key in keys}
+        total = sum(sizes.values())
+        for key in sorted(keys, key=lambda k: self.path(k).stat().st_mtime):
+            if total <= self._max_size:
+                break
+            if key == keep:
+                continue
+            with self.lock(key, blocking=False) as locked:
+                if not locked:
+                    continue
+                rmtree(self.path(key), ignore_errors=True)
+                self._root.joinpath(f"{key}.size").unlink(missing_ok=True)
+                total -= sizes[key]
+
+
+class ArtifactCache(CacheDirectory):
+    """Directory of trees stored by key.
+    Trees are copied in place before being renamed, so a key is
+    either fully present or absent"""
+
+    def store(self, key: str, src_dir: PathType) -> None:
+        """Copy the tree src_dir into the cache"""
+        with self.lock(key):
+            if key in self:
+                return
+            tmp_dir = self.tmp_path(key)
+            copytree(src_dir, tmp_dir, symlinks=True)
+            self.add(key, tmp_dir)
+        self.evict(keep=key)
+
+    def restore(self, key: str, dst_dir: PathType) -> None:
+        """Replace the tree dst_dir by the tree stored with key"""
+        with self.lock(key, exclusive=False):
+            if key not in self:
+                raise KeyError(f"key '{key}' not found in cache '{self._root}'")
+            rmtree(dst_dir, ignore_errors=True)
+            copytree(self.path(key), dst_dir, symlinks=True)
+            self.used(key)
+
+
+# Options of 'git clone' followed by a value in the next argument
+_GIT_CLONE_OPTS_WITH_VALUE = {
+    "-b",
+    "--branch",
+    "-o",
+    "--origin",
+    "-u",
+    "--upload-pack",
+    "--reference",
+    "--reference-if-able",
+    "--separate-git-dir",
+    "--depth",
+    "--shallow-since",
+    "--shallow-exclude",
+    "-c",
+    "--config",
+    "--template",
+    "-j",
+    "--jobs",
+    "--filter",
+    "--server-option",
+    "--bundle-uri",
+}
+
+# Options of 'wget' that do not change where the file is written
+_WGET_SAFE_OPTS = {"-q", "--quiet", "-nv", "--no-verbose", "--no-check-certificate"}
+
+
+def _positional_args(args: list[str], opts_with_value: set[str]) -> list[int]:
+    """Return the indices of the arguments that are not options"""
+    indices = []
+    skip_next = False
+    for i, arg in enumerate(args):
+        if skip_next:
+            skip_next = False
+        elif arg in opts_with_value:
+            skip_next = True
+        elif not arg.startswith("-"):
+            indices.append(i)
+    return indices
+
+
+def _url_basename(url: str) -> str:
+    """Return the last component of the path of url"""
+    return urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+class FetchCache(CacheDirectory):
+    """Shared directory of fetched sources. Git repositories are kept as
+    bare mirrors and downloaded files as they are, the least recently used
+    ones are evicted when the cache grows above max_size bytes. An entry is
+    locked while it is fetched or copied, so concurrent hekit processes
+    fetching the same url wait for each other.
+
+    Fetch commands that are not a 'git clone' or a plain 'wget'
+    are executed unchanged"""
+
+    def __init__(
+        self,
+        root: PathType,
+        max_size: int,
+        runner: Callable,
+        printer: Callable = print,
+    ) -> None:
+        super().__init__(root, max_size)
+        self._run = runner
+        self._print = printer
+
+    def run(self, cmd_and_args: str | list[str], cwd: PathType) -> RunOutput:
+        """Execute a fetch command in cwd through the cache"""
+        args = (
+            shlex.split(cmd_and_args)
+            if isinstance(cmd_and_args, str)
+            else list(cmd_and_args)
+        )
+        result = None
+        if args[:2] == ["git", "clone"]:
+            result = self._git_clone(args, Path(cwd))
+        elif args[:1] == ["wget"]:
+            result = self._wget(args, Path(cwd))
+        if result is None:
+            # Not a command handled by the cache
+            return self._run(cmd_and_args, cwd=cwd)
+        return result
+
+    @staticmethod
+    def key(kind: str, url: str) -> str:
+        """Return the key of the cached url"""
+        return f"{kind}-{sha256(url.encode('utf-8')).hexdigest()}"
+
+    def _git_clone(self, args: list[str], cwd: Path) -> Optional[RunOutput]:
+        """Update the mirror of the repository and clone from it"""
+        positionals = _positional_args(args[2:], _GIT_CLONE_OPTS_WITH_VALUE)
+        if len(positionals) not in (1, 2):
+            return None
+        url = args[2 + positionals[0]]
+        if len(positionals) == 2:
+            clone_dir = args[2 + positionals[1]]
+        else:
+            clone_dir = _url_basename(url).removesuffix(".git")
+        origin = "origin"
+        for opt in ("-o", "--origin"):
+            if opt in args:
+                origin = args[args.index(opt) + 1]
+
+        key = self.key("git", url)
+        mirror = self.path(key)
+        with self.lock(key):
+            if key in self:
+                success, _ = self._run(
+                    ["git", "-C", str(mirror), "remote", "update", "--prune"],
+                    cwd=cwd,
+                )
+                if not success:
+                    self._print(f"Cannot update mirror of '{url}', using cached copy")
+            else:
+                tmp_mirror = self.tmp_path(key)
+                success, return_code = self._run(
+                    ["git", "clone", "--mirror", url, str(tmp_mirror)], cwd=cwd
+                )
+                if not success:
+                    rmtree(tmp_mirror, ignore_errors=True)
+                    return success, return_code
+                self.add(key, tmp_mirror)
+            self.used(key)
+
+            # A local clone hard-links the objects of the mirror
+            clone_args = [*args]
+            clone_args[2 + positionals[0]] = str(mirror)
+            if len(positionals) == 1:
+                clone_args.append(clone_dir)
+            success, return_code = self._run(clone_args, cwd=cwd)
+        if success:
+            success, return_code = self._run(
+                ["git", "-C", clone_dir, "remote", "set-url", origin, url], cwd=cwd
+            )
+        self.evict(keep=key)
+        return success, return_code
+
+    def _wget(self, args: list[str], cwd: Path) -> Optional[RunOutput]:
+        """Download the file in the cache and link it"""
+        options, urls = args[1:-1], args[-1:]
+        if not urls or any(opt not in _WGET_SAFE_OPTS for opt in options):
+            return None
+        url = urls[0]
+        filename = _url_basename(url)
+        if not filename:
+            return None
+
+        key = self.key("files", url)
+        entry = self.path(key)
+        with self.lock(key):
+            if key not in self:
+                tmp_entry = self.tmp_path(key)
+                tmp_entry.mkdir()
+                success, return_code = self._run(args, cwd=tmp_entry)
+                if not success:
+                    rmtree(tmp_entry, ignore_errors=True)
+                    return success, return_code
+                if not (tmp_entry / filename).is_file():
+                    # Saved with a name not given by the url, do not cache it
+                    rmtree(tmp_entry, ignore_errors=True)
+                    return None
+                self.add(key, tmp_entry)
+            self.used(key)
+
+            dst = cwd / filename
+            dst.unlink(missing_ok=True)
+            try:
+                link(entry / filename, dst)
+            except OSError:
+                # Different filesystem
+                copy2(entry / filename, dst)
+        self.evict(keep=key)
+        return True, 0
@@ -0,0 +1,93 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module caches what tab completion offers, so that completing a
+command line neither imports the plugins nor lists the repo again"""
+
+import json
+from contextlib import suppress
+from pathlib import Path
+from typing import Callable, Optional
+
+from kit.utils.constants import CacheConfig, PluginsConfig
+from kit.utils.files import dump_json, list_dirs
+from kit.utils.typing import PathType
+
+# Sub-command names of the plugins with their descriptions
+PluginCommands = dict[str, Optional[str]]
+
+
+def mtime_stamp(path: PathType) -> Optional[int]:
+    """Return the modification time of path in
+    nanoseconds, None if it does not exist"""
+    try:
+        return Path(path).stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class CompletionCache:
+    """JSON file with the sub-commands of the enabled plugins and the
+    directories listed while completing, as the components of a repo and
+    their instances. The sub-commands are valid while the plugin config file
+    is not modified, and a listing while its directory is not modified, as
+    creating or removing an entry updates the directory's mtime"""
+
+    version = 1
+
+    def __init__(
+        self,
+        path: PathType = CacheConfig.COMPLETION_FILE,
+        plugins_file: PathType = PluginsConfig.FILE,
+    ) -> None:
+        self._path = Path(path)
+        self._plugins_file = Path(plugins_file)
+        self._modified = False
+        try:
+            with self._path.open(encoding="utf-8") as f:
+                self._data = json.load(f)
+            if self._data.get("version") != self.version:
+                raise ValueError("Outdated completion cache")
+        except (OSError, ValueError, AttributeError):
+            self._data = {"version": self.version, "plugins": {}, "dirs": {}}
+
+    @property
+    def path(self) -> Path:
+        """Return the location of the cache"""
+        return self._path
+
+    def plugin_commands(self, compute: Callable[[], PluginCommands]) -> PluginCommands:
+        """Return the sub-commands of the plugins, calling compute only if
+        the plugin config file changed since cached, or was created or
+        deleted"""
+        stamp = mtime_stamp(self._plugins_file)
+        cached = self._data["plugins"]
+        if "stamp" not in cached or cached["stamp"] != stamp:
+            cached = {"stamp": stamp, "commands": compute()}
+            self._data["plugins"] = cached
+            self._modified = True
+        return cached["commands"]
+
+    def list_dirs(self, path: PathType) -> list[str]:
+        """Return the directories in path, listing
+        them only if path changed since cached"""
+        key = str(Path(path).expanduser().absolute())
+        stamp = mtime_stamp(key)
+        if stamp is None:
+            return []
+        cached = self._data["dirs"].get(key, {})
+        if cached.get("stamp") != stamp:
+            cached = {"stamp": stamp, "entries": list_dirs(key)}
+            self._data["dirs"][key] = cached
+            self._modified = True
+        return cached["entries"]
+
+    def save(self) -> None:
+        """Write the cache if it was modified. Completion must not fail,
+        so a cache that cannot be written is silently skipped"""
+        if not self._modified:
+            return
+        with suppress(OSError):
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            dump_json(self._path, self._data)
+            self._modified = False
@@ -4,41 +4,155 @@
 """This module executes the actions specified by the user in the hekit arguments"""
 
 import shlex
-from os import chdir as change_directory_to
+from collections import deque
+from dataclasses import asdict, dataclass
+from io import BufferedReader
+from os import wait4, waitstatus_to_exitcode
+from resource import struct_rusage
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from subprocess import Popen, PIPE, STDOUT  # nosec B404
-from typing import Iterable, Callable
+from threading import Lock
+from time import monotonic
+from typing import BinaryIO, Iterable, Callable, Optional, cast
 
+from kit.utils.cache import ArtifactCache, FetchCache, stage_key, tree_fingerprint
+from kit.utils.constants import CacheConfig
+from kit.utils.disk_usage import disk_usages
 from kit.utils.files import dump_toml, load_toml
-from kit.utils.spec import Spec
+from kit.utils.spec import Spec, fill_user_args, get_dependency_graph, spec_cache
+from kit.utils.status_index import StatusIndex
+from kit.utils.tsort import TopologicalSorter
+from kit.utils.typing import PathType
 
 RunOutput = tuple[bool, int]
 
+# Stages of a component, in order
+_STAGES = ("fetch", "build", "install")
 
-def install_components_from_recipe_file(
-    recipe_file: str, upto_stage: str, repo_location: str, force: bool, recipe_args
+# Held while printing a line, shared by the threads of concurrent components
+_print_lock = Lock()
+
+
+def install_components_from_recipe_file(  # pylint: disable=too-many-arguments
+    recipe_file: str,
+    upto_stage: str,
+    repo_location: str,
+    force: bool,
+    recipe_args,
+    jobs: int = 1,
+    verbose: bool = False,
 ) -> None:
     """install components from a recipe file upto a given stage"""
+    validate_install_args(recipe_file, upto_stage)
+    the_stages = stages(upto_stage, force)
+
+    if jobs > 1:
+        install_components_concurrently(
+            recipe_file, repo_location, recipe_args, the_stages, jobs, verbose
+        )
+        return
+
+    components = components_to_build_from(
+        recipe_file, repo_location, recipe_args, verbose
+    )
+
+    for component in components:
+        chain_run(the_stages(component))
+
+
+def validate_install_args(recipe_file: str, upto_stage: str) -> None:
+    """Raise if the components of a recipe file cannot be installed upto
+    a given stage. Shared with the plan, so that it rejects the same input"""
     if Path(recipe_file).is_symlink():
         raise TypeError("The TOML file cannot be a symlink")
+    if upto_stage not in _STAGES:
+        raise ValueError(f"Not a valid stage value '{upto_stage}'")
 
-    the_stages = stages(upto_stage, force)
-
-    components = components_to_build_from(recipe_file, repo_location, recipe_args)
 
+def install_components_concurrently(  # pylint: disable=too-many-arguments
+    recipe_file: str,
+    repo_location: str,
+    recipe_args,
+    the_stages: Callable,
+    jobs: int,
+    verbose: bool = False,
+) -> None:
+    """Run the stages of the components of a recipe file on a pool of
+    jobs workers. A component is scheduled as soon as all the components
+    it depends on were completed; its instances run one after the other"""
+    toml_specs = spec_cache.load(recipe_file)
+    sorter = TopologicalSorter(get_dependency_graph(toml_specs))
+    # Ask for every missing argument before any output of the workers
+    fill_user_args(toml_specs, recipe_args)
+
+    running: dict[Future, str] = {}
+    errors: list[BaseException] = []
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+
+        def submit_ready() -> None:
+            ready = list(sorter.get_ready())
+            while ready:
+                component = ready.pop(0)
+                # The specs are expanded here, in the main thread, because
+                # they read the hekit.spec file of dependencies that have
+                # just been installed
+                builders = [
+                    ComponentBuilder(spec, verbose=verbose, label_output=True)
+                    for spec in Spec.from_toml_component(
+                        toml_specs, component, repo_location, recipe_args
+                    )
+                ]
+                if builders:
+                    future = executor.submit(chain_run_components, builders, the_stages)
+                    running[future] = component
+                else:
+                    # Dependency defined in a separated toml file
+                    sorter.done(component)
+                    ready.extend(sorter.get_ready())
+
+        submit_ready()
+        while running:
+            for future in wait(running, return_when=FIRST_COMPLETED).done:
+                component = running.pop(future)
+                exception = future.exception()
+                if exception is None:
+                    sorter.done(component)
+                else:
+                    errors.append(exception)
+            # Let the running jobs finish but do not start new ones on failure
+            if not errors:
+                submit_ready()
+
+    if errors:
+        raise errors[0]
+
+
+def chain_run_components(components: Iterable, the_stages: Callable) -> None:
+    """Run the stages of each component sequentially"""
     for component in components:
         chain_run(the_stages(component))
 
 
-def hekit_print(*args, box_msg="HEKIT", **kwargs) -> None:
-    """print but prefixes [HEKIT] or other if box_msg given"""
+def labelled(box_msg: str, label: str) -> str:
+    """Append label to box_msg, used to tell concurrent components apart"""
+    return f"{box_msg} {label}" if label else box_msg
+
+
+def hekit_print(*args, box_msg="HEKIT", sep=" ", end="\n", **kwargs) -> None:
+    """print but prefixes [HEKIT] or other if box_msg given. The line is
+    written at once holding a lock, so the lines of concurrent components
+    are not mixed"""
     args_prefixed = [arg.replace("\n", f"\n[{box_msg}]") for arg in map(str, args)]
-    print(f"[{box_msg}]", *args_prefixed, **kwargs)
+    line = sep.join([f"[{box_msg}]", *args_prefixed]) + end
+    with _print_lock:
+        print(line, end="", **kwargs)
 
 
 def stages(upto_stage: str, force: bool) -> Callable:
     """Return a generator function that handles a component"""
-    if upto_stage not in ("fetch", "build", "install"):
+    if upto_stage not in _STAGES:
         raise ValueError(f"Not a valid stage value '{upto_stage}'")
 
     def the_stages(component):
@@ -55,6 +169,10 @@ def stages(upto_stage: str, force: bool) -> Callable:
             component.reset_stage_info_file(upto_stage)
 
         yield component.setup
+        # An install tree found in the cache replaces all the stages
+        if upto_stage == "install" and not force and component.cached_install():
+            yield component.restore_install
+            return
         yield component.fetch
         if upto_stage == "fetch":
             return
@@ -87,40 +205,175 @@ def chain_run(funcs: Iterable[Callable]):
             )
 
 
-def run(cmd_and_args: str | list[str]) -> RunOutput:
-    """Takes either a string or list of strings and runs as command."""
+@dataclass
+class StageUsage:
+    """Resources used by the commands of a stage. The CPU times and the
+    peak resident set size (KiB) cover each command and its descendants"""
+
+    wall_time: float = 0.0
+    user_time: float = 0.0
+    sys_time: float = 0.0
+    max_rss: int = 0
+    exit_code: int = 0
+
+    def add(self, rusage: struct_rusage) -> None:
+        """Account for the resources used by a command"""
+        self.user_time += rusage.ru_utime
+        self.sys_time += rusage.ru_stime
+        self.max_rss = max(self.max_rss, rusage.ru_maxrss)
+
+    def to_dict(self) -> dict:
+        """Return the usage as a dictionary for the info file"""
+        usage = asdict(self)
+        for key in ("wall_time", "user_time", "sys_time"):
+            usage[key] = round(usage[key], 3)
+        return usage
+
+
+class ProcessOutput:
+    """Sink for the output of a child process. The output is written
+    verbatim to a log file and printed line by line when verbose,
+    otherwise a progress line is printed at most every few seconds"""
+
+    chunk_size = 64 * 1024
+    progress_interval = 5.0
+    tail_lines = 30
+
+    def __init__(
+        self, box_msg: str, log: Optional[BinaryIO] = None, verbose: bool = True
+    ) -> None:
+        self._box_msg = box_msg
+        self._log = log
+        self._verbose = verbose
+        self._partial_line = b""
+        self._tail: deque[bytes] = deque(maxlen=self.tail_lines)
+        self._nlines = 0
+        self._last_progress = monotonic()
+
+    def _print_lines(self, lines: Iterable[bytes]) -> None:
+        for line in lines:
+            hekit_print(
+                line.decode("utf-8", errors="replace").rstrip(), box_msg=self._box_msg
+            )
+
+    def write(self, chunk: bytes) -> None:
+        """Process a chunk of output"""
+        if self._log is not None:
+            self._log.write(chunk)
+        lines = (self._partial_line + chunk).split(b"\n")
+        self._partial_line = lines.pop()
+        self._nlines += len(lines)
+        self._tail.extend(lines)
+        if self._verbose:
+            self._print_lines(lines)
+        elif lines and monotonic() - self._last_progress > self.progress_interval:
+            self._last_progress = monotonic()
+            self._print_lines([b"(%d lines) %s" % (self._nlines, lines[-1])])
+
+    def close(self) -> None:
+        """Process the last line if it does not end in a new line"""
+        if self._partial_line:
+            self.write(b"\n")
+
+    def print_tail(self) -> None:
+        """Print the last lines of output unless they were already printed"""
+        if self._verbose or not self._tail:
+            return
+        hekit_print(f"last {len(self._tail)} lines of output:", box_msg=self._box_msg)
+        self._print_lines(self._tail)
+
+
+def reap(proc: Popen, usage: StageUsage) -> None:
+    """Wait for the process and add its resource usage to usage"""
+    _, status, rusage = wait4(proc.pid, 0)
+    proc.returncode = waitstatus_to_exitcode(status)
+    usage.add(rusage)
+
+
+def run(  # pylint: disable=too-many-arguments
+    cmd_and_args: str | list[str],
+    cwd: Optional[PathType] = None,
+    log: Optional[BinaryIO] = None,
+    verbose: bool = True,
+    label: str = "",
+    usage: Optional[StageUsage] = None,
+) -> RunOutput:
+    """Takes either a string or list of strings and runs as command.
+    The command is executed in cwd if given. The output is written to log
+    if given and only printed completely when verbose. The printed lines
+    are prefixed with label if given. The resources used by the command
+    are added to usage if given."""
     if not cmd_and_args:
         return True, 0
 
     if isinstance(cmd_and_args, str):
         cmd_and_args_list = shlex.split(cmd_and_args)
-        hekit_print(cmd_and_args)
+        cmd_string = cmd_and_args
     else:
         cmd_and_args_list = cmd_and_args
-        hekit_print(" ".join(cmd_and_args))
+        cmd_string = " ".join(cmd_and_args)
+    hekit_print(cmd_string, box_msg=labelled("HEKIT", label))
+    if log is not None:
+        log.write(f"$ {cmd_string}\n".encode("utf-8"))
+
     basename = Path(cmd_and_args_list[0]).name.upper()  # Capitalized
-    with Popen(cmd_and_args_list, stdout=PIPE, stderr=STDOUT) as proc:  # nosec B603
+    output = ProcessOutput(labelled(basename, label), log, verbose)
+    with Popen(
+        cmd_and_args_list, stdout=PIPE, stderr=STDOUT, cwd=cwd
+    ) as proc:  # nosec B603
         if proc.stdout is None:
             raise ValueError("STDOUT is None")
-        for line in proc.stdout:
-            hekit_print(line.decode("utf-8").rstrip(), box_msg=basename)
+        # read1 returns what is available, up to chunk_size bytes
+        stdout = cast(BufferedReader, proc.stdout)
+        while chunk := stdout.read1(ProcessOutput.chunk_size):
+            output.write(chunk)
+        if usage is not None:
+            reap(proc, usage)
+    output.close()
     success = proc.returncode == 0
+    if not success:
+        output.print_tail()
     return success, proc.returncode
 
 
+def is_non_empty_dir(path: Path) -> bool:
+    """Returns True if path is a directory with some content"""
+    return path.is_dir() and any(path.iterdir())
+
+
 def components_to_build_from(
-    filename: str, repo_location: str, recipe_arg_dict: dict[str, str]
+    filename: str,
+    repo_location: str,
+    recipe_arg_dict: dict[str, str],
+    verbose: bool = False,
 ):
     """Returns a generator that yields a component to be built and/or installed"""
     specs = Spec.from_toml_file(filename, repo_location, recipe_arg_dict)
-    return (ComponentBuilder(spec) for spec in specs)
+    return (ComponentBuilder(spec, verbose=verbose) for spec in specs)
 
 
-class ComponentBuilder:
+class ComponentBuilder:  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """Objects of this class can orchestrate the build of a component"""
 
-    def __init__(self, spec: Spec) -> None:
-        """Initialize a ComponentBuilder from a Spec object"""
+    # Attribs of the spec executed by each stage, they key its hash.
+    # The install stage is keyed by the whole spec as the export
+    # attribs are read by the dependent components.
+    _stage_attribs = {
+        "fetch": ("pre-fetch", "fetch", "post-fetch", "init_fetch_dir"),
+        "build": ("pre-build", "build", "post-build", "init_build_dir"),
+    }
+
+    def __init__(
+        self,
+        spec: Spec,
+        cache: Optional[ArtifactCache] = None,
+        fetch_cache: Optional[FetchCache] = None,
+        verbose: bool = False,
+        label_output: bool = False,
+    ) -> None:
+        """Initialize a ComponentBuilder from a Spec object.
+        The output of the commands is only printed completely if verbose,
+        and it is prefixed with the component/instance if label_output"""
         if not isinstance(spec, Spec):
             raise TypeError(
                 f"A spec must be type Spec, but got '{type(spec).__name__}'"
@@ -128,24 +381,60 @@ class ComponentBuilder:
 
         self._spec = spec
         self._location = f"{spec.repo_location}/{spec.component}/{spec.name}"
+        # Directory where the commands of the current stage are executed.
+        # The process wide current directory is not changed as components
+        # may be built concurrently
+        self._cwd: Optional[Path] = None
+        # Log file and resources used by the current stage
+        self._log: Optional[BinaryIO] = None
+        self._usage: Optional[StageUsage] = None
+        self._verbose = verbose
+        self._label = f"{spec.component}/{spec.name}" if label_output else ""
+        self._cache = cache or ArtifactCache(
+            CacheConfig.INSTALL_DIR, CacheConfig.INSTALL_MAX_SIZE
+        )
+        self._fetch_cache = fetch_cache or FetchCache(
+            CacheConfig.FETCH_DIR, CacheConfig.FETCH_MAX_SIZE, self._run, self._print
+        )
+        self._stage_keys: dict[str, str] = {}
 
         # load previous from info file
         try:
             self._info_file = load_toml(f"{self._location}/hekit.info")
         except FileNotFoundError:
             self._info_file = {"status": {"fetch": "", "build": "", "install": ""}}
+        self._info_file.setdefault("hash", {})
+        self._info_file.setdefault("timings", {})
+        self._info_file.setdefault("sizes", {})
 
     def skip(self) -> bool:
         """Returns skip value"""
         return self._spec.skip
 
+    def _run(
+        self, cmd_and_args: str | list[str], cwd: Optional[PathType] = None
+    ) -> RunOutput:
+        """Run a command writing its output to the log of the current stage"""
+        return run(
+            cmd_and_args,
+            cwd=cwd,
+            log=self._log,
+            verbose=self._verbose,
+            label=self._label,
+            usage=self._usage,
+        )
+
+    def _print(self, *args) -> None:
+        """hekit_print with the label of the component if required"""
+        hekit_print(*args, box_msg=labelled("HEKIT", self._label))
+
     def _try_run(self, attrib: str) -> RunOutput:
         """Try to run the attrib in the spec.
         Do nothing (pass success) if no key in dict.
         """
-        hekit_print(attrib)
+        self._print(attrib)
         try:
-            return run(self._spec[attrib])
+            return self._run(self._spec[attrib], cwd=self._cwd)
         except KeyError:
             return True, 0
 
@@ -160,7 +449,7 @@ class ComponentBuilder:
     def setup(self) -> RunOutput:
         """Create the layout for the component"""
         root = Path(self._location)
-        for dirname in ("fetch", "build", "install"):
+        for dirname in ("fetch", "build", "install", "logs"):
             (root / dirname).mkdir(exist_ok=True, parents=True)
 
         # Save expanded copy on disk
@@ -169,50 +458,157 @@ class ComponentBuilder:
         # Should return successful
         return True, 0
 
+    def _dependency_keys(self) -> list[str]:
+        """Returns the keys of the install stage of the dependencies"""
+        keys = []
+        for dependency in self._spec.dependencies:
+            try:
+                info = load_toml(f"{self._spec.repo_location}/{dependency}/hekit.info")
+                keys.append(info.get("hash", {}).get("install", dependency))
+            except FileNotFoundError:
+                keys.append(dependency)
+        return keys
+
+    def stage_key(self, stage: str) -> str:
+        """Returns the hash of the expanded spec attribs of the stage,
+        chained with the key of the previous stage"""
+        if stage not in self._stage_keys:
+            spec_dict = self._spec.to_toml_dict()[self._spec.component][0]
+            if stage == "fetch":
+                input_keys = []
+            elif stage == "build":
+                input_keys = [self.stage_key("fetch"), *self._dependency_keys()]
+                # Local sources are not fetched, key them by their files
+                src_dir = Path(spec_dict.get("src_dir", "")).expanduser()
+                if spec_dict.get("src_dir") and src_dir.is_dir():
+                    input_keys.append(tree_fingerprint(src_dir))
+            else:
+                input_keys = [self.stage_key("build")]
+            attribs = {
+                k: v
+                for k, v in spec_dict.items()
+                if stage == "install" or k in self._stage_attribs[stage]
+            }
+            self._stage_keys[stage] = stage_key(stage, attribs, input_keys)
+        return self._stage_keys[stage]
+
+    def stage_commands(self, stage: str) -> list[str]:
+        """Returns the commands executed by stage"""
+        spec_dict = self._spec.to_toml_dict()[self._spec.component][0]
+        attribs = (f"pre-{stage}", stage, f"post-{stage}")
+        return [spec_dict[k] for k in attribs if spec_dict.get(k)]
+
+    def recorded_usage(self, stage: str) -> Optional[dict]:
+        """Returns the resources used by the last execution of stage
+        as recorded in the info file, if any"""
+        return self._info_file["timings"].get(stage)
+
     def already_successful(self, stage: str) -> bool:
         """Returns True if stage already recorded in info file
-        as successful"""
-        return self._info_file["status"][stage] == "success"
-
-    def update_info_file(self, stage: str, success: bool) -> None:
+        as successful with the same key.
+        Info files without keys only rely on the status"""
+        recorded_key = self._info_file["hash"].get(stage)
+        return self._info_file["status"][stage] == "success" and (
+            recorded_key is None or recorded_key == self.stage_key(stage)
+        )
+
+    def update_info_file(
+        self, stage: str, success: bool, usage: Optional[StageUsage] = None
+    ) -> None:
         """Updates the hekit.info file"""
         self._info_file["status"][stage] = "success" if success else "failure"
+        self._info_file["hash"][stage] = self.stage_key(stage) if success else ""
+        if usage is not None:
+            self._info_file["timings"][stage] = usage.to_dict()
         dump_toml(f"{self._location}/hekit.info", self._info_file)
+        StatusIndex(self._spec.repo_location).update(
+            self._spec.component, self._spec.name, self._info_file
+        )
+
+    def record_sizes(self, stage: str) -> None:
+        """Record the disk space used by the directory of the stage and by
+        the whole instance. The install stage is measured in the install
+        tree, as its init_install_dir is the build tree by default"""
+        if stage == "install":
+            stage_dir = self._install_dir()
+        else:
+            stage_dir = Path(self._spec[f"init_{stage}_dir"]).expanduser()
+        sizes = disk_usages([stage_dir, self._location], workers=2)
+        self._info_file["sizes"][stage], self._info_file["sizes"]["total"] = sizes
 
     def reset_stage_info_file(self, stage):
         """Reset the stage value that was read from hekit.info file"""
         self._info_file["status"][stage] = ""
+        self._info_file["hash"][stage] = ""
+        self._info_file["timings"].pop(stage, None)
+        self._info_file["sizes"].pop(stage, None)
+
+    def _install_dir(self) -> Path:
+        """Returns the install tree of the instance"""
+        return Path(self._location) / "install"
+
+    def cached_install(self) -> bool:
+        """Returns True if the install stage has to be executed
+        but its tree is in the artifact cache. Components without install
+        command leave their output in the build tree, they are not cached"""
+        if not self._spec["install"] or self.already_successful("install"):
+            return False
+        key = self.stage_key("install")
+        return key in self._cache and is_non_empty_dir(self._cache.path(key))
+
+    def restore_install(self) -> RunOutput:
+        """Copy the install tree from the artifact cache"""
+        key = self.stage_key("install")
+        self._print("restoring install from cache:", self._cache.path(key))
+        self._cache.restore(key, self._install_dir())
+        self.record_sizes("install")
+        self.update_info_file("install", success=True)
+        return True, 0
 
-    def _stage(self, stage: str) -> RunOutput:
-        hekit_print(stage)
+    def _stage(self, stage: str, runner: Optional[Callable] = None) -> RunOutput:
+        self._print(stage)
         if self.already_successful(stage):
             return True, 0
 
         def closure():
-            return run(self._spec[stage])
+            return (runner or self._run)(self._spec[stage], cwd=self._cwd)
 
         fns = [getattr(self, f"pre_{stage}"), closure, getattr(self, f"post_{stage}")]
 
         # The actual directory that is written to
         init_stage_dir = self._spec[f"init_{stage}_dir"]
-        change_directory_to(Path(init_stage_dir).expanduser())
-        hekit_print("current directory:", Path.cwd())
+        self._cwd = Path(init_stage_dir).expanduser().resolve()
+        self._print("current directory:", self._cwd)
 
+        log_path = Path(self._location) / "logs" / f"{stage}.log"
+        self._print("log file:", log_path)
+        self._usage = usage = StageUsage()
+        start = monotonic()
         try:
-            chain_run(fns)
-            self.update_info_file(stage, success=True)
+            with log_path.open("wb") as self._log:
+                chain_run(fns)
+            usage.wall_time = monotonic() - start
+            self.record_sizes(stage)
+            self.update_info_file(stage, success=True, usage=usage)
             return True, 0
         except BuildError as e:
-            self.update_info_file(stage, success=False)
+            usage.wall_time = monotonic() - start
+            usage.exit_code = e.error
+            self.record_sizes(stage)
+            self.update_info_file(stage, success=False, usage=usage)
+            self._print(f"{stage} failed, see the log file:", log_path)
             return False, e.error
+        finally:
+            self._log = None
+            self._usage = None
 
     def pre_fetch(self) -> RunOutput:
         """Any steps after a fetch"""
         return self._try_run("pre-fetch")
 
     def fetch(self) -> RunOutput:
-        """Fetch the source"""
-        return self._stage("fetch")
+        """Fetch the source through the shared fetch cache"""
+        return self._stage("fetch", self._fetch_cache.run)
 
     def post_fetch(self) -> RunOutput:
         """Any steps after a fetch"""
@@ -235,8 +631,12 @@ class ComponentBuilder:
         return self._try_run("pre-install")
 
     def install(self) -> RunOutput:
-        """Installation of the component, ready to use"""
-        return self._stage("install")
+        """Installation of the component, ready to use.
+        The install tree is stored in the artifact cache"""
+        success, return_code = self._stage("install")
+        if success and self._spec["install"] and is_non_empty_dir(self._install_dir()):
+            self._cache.store(self.stage_key("install"), self._install_dir())
+        return success, return_code
 
     def post_install(self) -> RunOutput:
         """Any steps after an install"""
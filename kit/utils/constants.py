@@ -42,6 +42,7 @@ class Constants:  # pylint: disable=too-many-instance-attributes
         "install",
         "build",
         "fetch",
+        "gc",
         "list",
         "new",
         "plugins",
@@ -66,3 +67,22 @@ class PluginsConfig:
     ROOT_DIR: Path = Path("~/.hekit/plugins/").expanduser()
     FILE: Path = ROOT_DIR / "plugins.toml"
     KEY: str = "plugins"
+
+
+@dataclass(frozen=True, init=False)
+class CacheConfig:  # pylint: disable=too-many-instance-attributes
+    """Define the location of the caches shared by all the repos"""
+
+    ROOT_DIR: Path = Path("~/.hekit/cache/").expanduser()
+    INSTALL_DIR: Path = ROOT_DIR / "install"
+    # Size in bytes above which the least recently used trees are evicted
+    INSTALL_MAX_SIZE: int = 20 * 2**30
+    FETCH_DIR: Path = ROOT_DIR / "fetch"
+    # Size in bytes above which the least recently used sources are evicted
+    FETCH_MAX_SIZE: int = 20 * 2**30
+    # Sub-commands and directory listings offered by tab completion
+    COMPLETION_FILE: Path = ROOT_DIR / "completion.json"
+    # Prime factors of the numbers factorized by hekit algebras
+    FACTORS_FILE: Path = ROOT_DIR / "factors.json"
+    # Size in bytes above which the least recently used factors are evicted
+    FACTORS_MAX_SIZE: int = 16 * 2**20
@@ -0,0 +1,91 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module indexes the dependencies between the instances installed in
+the repo, as recorded in their hekit.spec files"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+from kit.utils.files import list_dirs
+from kit.utils.spec import read_spec
+from kit.utils.typing import PathType
+
+# Number of threads reading the hekit.spec files
+_SCAN_WORKERS = 16
+
+
+def installed_instances(repo_location: PathType) -> list[str]:
+    """Return the sorted component/instance of the instances in the repo.
+    Hidden directories, as the trash, are not components"""
+    repo_location = Path(repo_location)
+    return [
+        f"{component}/{instance}"
+        for component in list_dirs(repo_location)
+        if not component.startswith(".")
+        for instance in list_dirs(repo_location / component)
+    ]
+
+
+def read_installed_spec(repo_location: PathType, key: str) -> dict:
+    """Return the hekit.spec of an instance, empty if it was not written"""
+    try:
+        component, instance = key.split("/", 1)
+        return read_spec(component, instance, repo_location)
+    except FileNotFoundError:
+        return {}
+
+
+class DependencyIndex:
+    """Dependencies and dependents of the installed instances,
+    keyed by component/instance.
+
+    The dependencies of an instance are given in its recipe as values
+    component/instance, referenced as $%key%/attribute$. The references are
+    expanded in the hekit.spec, but the values are kept, so any value of an
+    installed spec naming another installed instance is a dependency"""
+
+    def __init__(self, specs: dict[str, dict]):
+        self.dependencies: dict[str, set[str]] = {}
+        self.dependents: dict[str, set[str]] = {key: set() for key in specs}
+        for key, spec in specs.items():
+            deps = {
+                value
+                for value in spec.values()
+                if isinstance(value, str) and value in specs and value != key
+            }
+            self.dependencies[key] = deps
+            for dep in deps:
+                self.dependents[dep].add(key)
+
+    @classmethod
+    def from_repo(
+        cls, repo_location: PathType, workers: int = _SCAN_WORKERS
+    ) -> DependencyIndex:
+        """Build the index reading the hekit.spec files concurrently"""
+        keys = installed_instances(repo_location)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            specs = executor.map(lambda k: read_installed_spec(repo_location, k), keys)
+            return cls(dict(zip(keys, specs)))
+
+    def required_by(self, keys: Iterable[str]) -> dict[str, list[str]]:
+        """Return the sorted dependents of each of keys, leaving out
+        those in keys, as they are removed together"""
+        keys = set(keys)
+        required = {
+            key: sorted(self.dependents.get(key, set()) - keys) for key in sorted(keys)
+        }
+        return {key: dependents for key, dependents in required.items() if dependents}
+
+    def reachable(self, roots: Iterable[str]) -> set[str]:
+        """Return the installed roots and all their dependencies"""
+        pending = [root for root in roots if root in self.dependencies]
+        reached = set(pending)
+        while pending:
+            for dep in self.dependencies[pending.pop()] - reached:
+                reached.add(dep)
+                pending.append(dep)
+        return reached
@@ -0,0 +1,79 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module measures the disk space used by directory trees"""
+
+from concurrent.futures import ThreadPoolExecutor
+from os import scandir
+from pathlib import Path
+from typing import Iterable
+
+from kit.utils.files import load_toml
+from kit.utils.typing import PathType
+
+# Number of threads measuring trees. The walk is bound by the latency of
+# the stat calls, mostly on network filesystems, rather than by the CPU
+_DU_WORKERS = 16
+
+
+def disk_usage(path: PathType) -> int:
+    """Return the bytes allocated on disk by a directory tree, as du.
+    Symbolic links are not followed and hard links are counted once"""
+    total = 0
+    seen: set[tuple[int, int]] = set()
+    pending = [str(path)]
+    while pending:
+        try:
+            entries = scandir(pending.pop())
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if stat.st_nlink > 1:
+                    if (stat.st_dev, stat.st_ino) in seen:
+                        continue
+                    seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_blocks * 512
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+    return total
+
+
+def disk_usages(paths: Iterable[PathType], workers: int = _DU_WORKERS) -> list[int]:
+    """Return the disk usage of each path, measured concurrently"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(disk_usage, paths))
+
+
+def instance_sizes(instance_dir: PathType) -> dict[str, int]:
+    """Return the disk usage of the directory of each stage of an instance,
+    as given in its hekit.spec, and of the whole instance as total. The
+    install stage is measured in the install tree of the instance, as its
+    init_install_dir is the build tree by default"""
+    instance_dir = Path(instance_dir)
+    stage_dirs = {"fetch": "fetch", "build": "build"}
+    try:
+        (instances,) = load_toml(instance_dir / "hekit.spec").values()
+        spec = instances[0]
+    except (FileNotFoundError, ValueError, IndexError):
+        spec = {}
+    paths = [
+        instance_dir / spec.get(f"init_{stage}_dir", default)
+        for stage, default in stage_dirs.items()
+    ]
+    sizes = map(disk_usage, [*paths, instance_dir / "install", instance_dir])
+    return dict(zip([*stage_dirs, "install", "total"], sizes))
+
+
+def human_size(size: int) -> str:
+    """Return a size in bytes with a binary unit, as 1.5G"""
+    value = float(size)
+    for unit in ("B", "K", "M", "G"):
+        if value < 1024:
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}T"
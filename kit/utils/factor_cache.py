@@ -0,0 +1,114 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module caches the prime factors of the numbers factorized by hekit
+algebras, so that searches over overlapping ranges factorize them once"""
+
+import json
+from contextlib import suppress
+from pathlib import Path
+from typing import Callable, Iterable
+
+from kit.utils.constants import CacheConfig
+from kit.utils.files import dump_json
+from kit.utils.typing import PathType
+
+# Factorizer of numbers, as factorize_numbers
+Factorize = Callable[[Iterable[int]], Iterable[tuple[int, ...]]]
+
+
+def entry_size(key: str, factors: list[str]) -> int:
+    """Return the approximate bytes taken by an entry in the file"""
+    return len(key) + sum(len(factor) + 4 for factor in factors) + 6
+
+
+class FactorCache:
+    """JSON file with the prime factors of numbers, both written in
+    hexadecimal, as Python limits the decimal digits of the integers it
+    converts. The entries are kept from the least to the most recently used,
+    and the least recently used are evicted once the entries take more than
+    max_size bytes"""
+
+    version = 1
+
+    def __init__(
+        self,
+        path: PathType = CacheConfig.FACTORS_FILE,
+        max_size: int = CacheConfig.FACTORS_MAX_SIZE,
+    ) -> None:
+        self._path = Path(path)
+        self._max_size = max_size
+        self._modified = False
+        try:
+            with self._path.open(encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != self.version:
+                raise ValueError("Outdated factor cache")
+            self._factors: dict[str, list[str]] = data["factors"]
+        except (OSError, ValueError, AttributeError, KeyError):
+            self._factors = {}
+        self._size = sum(entry_size(k, v) for k, v in self._factors.items())
+
+    @property
+    def path(self) -> Path:
+        """Return the location of the cache"""
+        return self._path
+
+    @property
+    def size(self) -> int:
+        """Return the approximate bytes taken by the entries"""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._factors)
+
+    def __contains__(self, number: int) -> bool:
+        return f"{number:x}" in self._factors
+
+    def get(self, number: int) -> tuple[int, ...]:
+        """Return the prime factors of number, marking it as the most
+        recently used. Raise KeyError if it is not cached. The new order
+        is written with the next additions, so reads alone never rewrite
+        the file"""
+        key = f"{number:x}"
+        factors = self._factors.pop(key)
+        self._factors[key] = factors
+        return tuple(int(factor, 16) for factor in factors)
+
+    def add(self, number: int, factors: Iterable[int]) -> None:
+        """Cache the prime factors of number, evicting the
+        least recently used entries if the cache is full"""
+        key = f"{number:x}"
+        if key in self._factors:
+            self._size -= entry_size(key, self._factors.pop(key))
+        self._factors[key] = [f"{factor:x}" for factor in factors]
+        self._size += entry_size(key, self._factors[key])
+        while self._size > self._max_size:
+            oldest = next(iter(self._factors))
+            self._size -= entry_size(oldest, self._factors.pop(oldest))
+        self._modified = True
+
+    def factorize(
+        self, numbers: Iterable[int], factorize: Factorize
+    ) -> list[tuple[int, ...]]:
+        """Return the prime factors of each number, calling factorize only
+        for those not cached. Each factorization is cached when computed,
+        so the work done is kept if factorize fails on a later number"""
+        numbers = list(numbers)
+        found = {n: self.get(n) for n in set(numbers) if n in self}
+        missing = sorted(set(numbers) - found.keys())
+        if missing:
+            for number, factors in zip(missing, factorize(missing)):
+                found[number] = tuple(factors)
+                self.add(number, found[number])
+        return [found[number] for number in numbers]
+
+    def save(self) -> None:
+        """Write the cache if it was modified. A cache that
+        cannot be written is silently skipped"""
+        if not self._modified:
+            return
+        with suppress(OSError):
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            dump_json(self._path, {"version": self.version, "factors": self._factors})
+            self._modified = False
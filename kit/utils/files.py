@@ -3,12 +3,20 @@
 
 """This module provides functions to list files and directories."""
 
-from os import walk
+import json
+from os import getpid, replace, walk
 from enum import Enum
 from pathlib import Path
+from threading import get_ident
 from typing import Any, Callable, Optional
 
-from toml import load, dump
+from toml import dump
+
+try:
+    # Faster parser in the standard library since Python 3.11
+    from tomllib import loads
+except ImportError:  # pragma: no cover
+    from toml import loads  # type: ignore[assignment]
 
 from kit.utils.typing import PathType
 
@@ -54,7 +62,8 @@ def create_default_workspace(dir_path: str = "~") -> Path:
 
 
 def load_toml(file_name: PathType) -> TomlDict:
-    """Load a toml file and return its content as a dict"""
+    """Load a toml file and return its content as a dict.
+    The caller owns the dict, it can be modified"""
     file_path = Path(file_name).expanduser()
 
     if not file_exists(file_path):
@@ -64,17 +73,27 @@ def load_toml(file_name: PathType) -> TomlDict:
     if file_path.is_symlink():
         raise TypeError(f"File {file_path.name} cannot be a symlink")
 
-    return load(file_path)
+    return loads(file_path.read_bytes().decode("utf-8"))
 
 
 def dump_toml(file_name: PathType, content: TomlDict) -> None:
     """Write a TOML file"""
     file_path = Path(file_name).expanduser()
-
     with file_path.open("w", encoding="utf-8") as f:
         dump(content, f)
 
 
+def dump_json(file_name: PathType, content: Any) -> None:
+    """Write a JSON file atomically, through a temporary file that replaces
+    it, so that readers never see it partially written"""
+    file_path = Path(file_name).expanduser()
+    tmp_path = file_path.with_name(f".{file_path.name}.{getpid()}.{get_ident()}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        # dumps encodes in C, dump streams through the Python encoder
+        f.write(json.dumps(content))
+    replace(tmp_path, file_path)
+
+
 def dash_to_underscore(name: str) -> str:
     """Return string with dashes changed to underscores."""
     return name.replace("-", "_")
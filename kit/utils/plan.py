@@ -0,0 +1,172 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module reports what installing a recipe file would execute,
+without executing any command"""
+
+from typing import Iterator
+
+from kit.utils.component_builder import ComponentBuilder, validate_install_args
+from kit.utils.spec import (
+    RecipeArgDict,
+    Spec,
+    get_dependency_graph,
+    references,
+    spec_cache,
+    _USER_REF,
+)
+from kit.utils.tsort import tsort
+
+_STAGES = ("fetch", "build", "install")
+
+
+def unresolved_user_args(toml_specs: dict, recipe_arg_dict: RecipeArgDict) -> list:
+    """Returns the sorted values written by the user in a recipe
+    that are not in recipe_arg_dict"""
+    user_args = {
+        arg
+        for instances_list in toml_specs.values()
+        for instance in instances_list
+        for value in instance.values()
+        for (arg,) in references(value, _USER_REF)
+    }
+    return sorted(user_args - recipe_arg_dict.keys())
+
+
+def expand_specs(
+    toml_specs: dict,
+    graph: dict[str, list[str]],
+    repo_location: str,
+    recipe_args: RecipeArgDict,
+) -> Iterator[Spec]:
+    """Yield the specs of a recipe in topological order. The dependencies
+    defined in the recipe are resolved from their expanded specs, as they
+    are not written to the repo yet"""
+    known_specs: dict[str, dict] = {}
+    for component in tsort(graph):
+        for spec in Spec.from_toml_component(
+            toml_specs, component, repo_location, recipe_args, known_specs
+        ):
+            known_specs[f"{component}/{spec.name}"] = spec.to_toml_dict()[component][0]
+            yield spec
+
+
+def plan_stages(
+    component: ComponentBuilder, upto_stage: str, force: bool, rebuilt_deps: bool
+) -> dict[str, str]:
+    """Returns the action for each stage of a component up to upto_stage:
+    'done' if already successful, 'cached' if restored from the artifact
+    cache or 'run'. rebuilt_deps tells if any dependency will be installed"""
+    the_stages = _STAGES[: _STAGES.index(upto_stage) + 1]
+    cached = not force and not rebuilt_deps and component.cached_install()
+    if upto_stage == "install" and cached:
+        return dict.fromkeys(the_stages, "cached")
+
+    actions = {}
+    for stage in the_stages:
+        if (
+            (force and stage == upto_stage)
+            or (rebuilt_deps and stage != "fetch")
+            or not component.already_successful(stage)
+        ):
+            actions[stage] = "run"
+        else:
+            actions[stage] = "done"
+    return actions
+
+
+def print_stages_plan(
+    component: ComponentBuilder, actions: dict[str, str]
+) -> tuple[float, int]:
+    """Print the action for each stage and the commands of the stages
+    to run. Returns the time estimated from the recorded timings and
+    the number of stages to run without recorded timings"""
+    estimate, unknown = 0.0, 0
+    for stage, action in actions.items():
+        usage = component.recorded_usage(stage)
+        if action != "run":
+            print(f"  {stage:10} {action}")
+            continue
+        if usage is None:
+            unknown += 1
+            print(f"  {stage:10} {action}")
+        else:
+            estimate += usage["wall_time"]
+            print(f"  {stage:10} {action:6} ~{usage['wall_time']:.1f}s")
+        for command in component.stage_commands(stage):
+            print(f"    $ {command}")
+    return estimate, unknown
+
+
+def critical_path(
+    graph: dict[str, list[str]], weights: dict[str, float]
+) -> tuple[list[str], float]:
+    """Returns the path of components with the largest total weight
+    in the dependency graph, and its weight"""
+    finish: dict[str, float] = {}
+    previous: dict[str, str] = {}
+    for component in tsort(graph):
+        if component not in weights:
+            continue
+        start = 0.0
+        for dependency in graph.get(component, ()):
+            if dependency in finish and finish[dependency] > start:
+                start = finish[dependency]
+                previous[component] = dependency
+        finish[component] = start + weights[component]
+
+    if not finish:
+        return [], 0.0
+    last = max(finish, key=lambda c: finish[c])
+    path = [last]
+    while path[-1] in previous:
+        path.append(previous[path[-1]])
+    return path[::-1], finish[last]
+
+
+def plan_components_from_recipe_file(  # pylint: disable=too-many-locals
+    recipe_file: str,
+    upto_stage: str,
+    repo_location: str,
+    force: bool,
+    recipe_args: RecipeArgDict,
+) -> None:
+    """Print the stages that installing the components of a recipe file
+    upto a given stage would execute, their commands and the estimated
+    critical path, without executing them or prompting the user. The
+    input is validated as by install"""
+    validate_install_args(recipe_file, upto_stage)
+    toml_specs = spec_cache.load(recipe_file)
+    graph = get_dependency_graph(toml_specs)
+
+    # Values not given by the user are left as written in the recipe
+    missing_args = unresolved_user_args(toml_specs, recipe_args)
+    recipe_args = {**recipe_args, **{k: f"!{k}!" for k in missing_args}}
+
+    installed: set[str] = set()
+    weights: dict[str, float] = {}
+    no_timings = 0
+    for spec in expand_specs(toml_specs, graph, repo_location, recipe_args):
+        comp_label = f"{spec.component}/{spec.name}"
+        print(comp_label)
+        if spec.skip:
+            print(f"  {'skip':10}")
+            continue
+
+        component = ComponentBuilder(spec)
+        rebuilt_deps = any(dep in installed for dep in spec.dependencies)
+        actions = plan_stages(component, upto_stage, force, rebuilt_deps)
+        if actions.get("install", "done") != "done":
+            installed.add(comp_label)
+
+        estimate, unknown = print_stages_plan(component, actions)
+        weights[spec.component] = weights.get(spec.component, 0.0) + estimate
+        no_timings += unknown
+
+    path, estimate = critical_path(graph, weights)
+    if estimate > 0:
+        print(f"critical path: {' -> '.join(path)} (~{estimate:.1f}s)")
+    if no_timings:
+        print(f"stages to run without recorded timings: {no_timings}")
+    if missing_args:
+        print(f"recipe arguments not given: {', '.join(missing_args)}")
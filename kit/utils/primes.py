@@ -3,58 +3,440 @@
 
 """Utils for computing things related to primes"""
 
+from contextlib import suppress
+from functools import lru_cache
+from itertools import compress, islice
+from math import gcd, isqrt
+from mmap import mmap, ACCESS_READ
+from os import getpid, replace
+from pathlib import Path
+from random import Random
+from struct import Struct
 from sys import stdout
-from subprocess import CalledProcessError, run, PIPE  # nosec B404
-from typing import Generator, Iterable
+from time import monotonic
+from typing import Generator, Iterable, Iterator, Optional, Union
 
+from kit.utils.typing import PathType
 
-def parse_factor_line(line: str) -> tuple[int, tuple[int, ...]]:
-    """'num: f1 f2 f3' -> (num, (f1, f2, f3))"""
-    head, *tail = line.split()  # ['key:', 'v1', 'v2' , ...]
-    if head[-1] != ":":
-        raise ValueError(f"{line} does not have valid key format")
-    key = int(head[:-1])  # exclude last char
-    value = tuple(map(int, tail))
-    return key, value
+# Numbers sieved at once, bounding the memory used to sieve a range
+_SEGMENT_SIZE = 2**20
 
+# Largest number sieved for primes, as the primes up to its square root
+# are held in memory
+MAX_PRIMES_STOP = 2**48
+
+# Factors found by trial division before the probabilistic methods
+_TRIAL_LIMIT = 2**16
+# Bases of the Miller-Rabin test
+_MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+# Iterations of Pollard's rho between gcds, and before trying ECM
+_RHO_BLOCK = 128
+_RHO_ITERATIONS = 2**16
+# Stage 1 bound and number of curves of each round of ECM, for factors of
+# about 15, 20, 25 and 30 digits
+_ECM_BOUNDS = ((2_000, 25), (11_000, 90), (50_000, 300), (250_000, 700))
+
+# Location of the prime table, and the largest number it can hold,
+# for which the file takes 256 MB
+PRIMES_TABLE_FILE = Path("~/.hekit/primes.bin").expanduser()
+MAX_PRIMES_TABLE = 2**32 - 1
+
+# Digits of flags of value 0 and 1, and the flags of the bits of a byte
+_FLAGS_TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+_EXPANDED_BITS = [bytes((byte >> bit) & 1 for bit in range(8)) for byte in range(256)]
 
-def compute_prime_factors(
-    numbers: Iterable[int], factor_util: str = "factor"
-) -> Generator:
-    """Return generator. Keys m, Value prime factors.
-    Process out to factor"""
 
+def factorize_numbers(
+    numbers: Iterable[int], timeout: Optional[float] = None, use_ecm: bool = False
+) -> Generator:
+    """Return generator of the prime factors of each number, factorizing
+    in process. Each number is given timeout seconds, and ECM is used
+    if use_ecm"""
     numbers = list(numbers)
     if len(numbers) == 0:
         raise ValueError("Input numbers is empty")
+    if any(number < 0 for number in numbers):
+        raise ValueError(f"A negative number was found in the input: {numbers}")
+
+    return (factor_integer(number, timeout, use_ecm) for number in numbers)
+
+
+def factor_integer(
+    n: int, timeout: Optional[float] = None, use_ecm: bool = False
+) -> tuple[int, ...]:
+    """Return the sorted prime factors of n, none for 0 and 1. The small
+    factors are found by trial division and the rest with Brent's variant
+    of Pollard's rho and, if use_ecm, the elliptic curve method. Raise
+    TimeoutError if it takes longer than timeout seconds"""
+    if not isinstance(n, int):
+        raise TypeError(f"Cannot factorize '{n}', it is not an integer")
+    if n < 0:
+        raise ValueError(f"Cannot factorize the negative number {n}")
+    deadline = None if timeout is None else monotonic() + timeout
+
+    factors = []
+    for p in trial_primes():
+        if p * p > n:
+            break
+        while n % p == 0:
+            factors.append(p)
+            n //= p
+
+    pending = [n] if n > 1 else []
+    while pending:
+        m = pending.pop()
+        # The cofactors left by trial division below its limit squared are prime
+        if m < _TRIAL_LIMIT**2 or is_probable_prime(m):
+            factors.append(m)
+            continue
+        divisor = find_divisor(m, deadline, use_ecm)
+        pending.extend((divisor, m // divisor))
+    return tuple(sorted(factors))
+
+
+@lru_cache(maxsize=None)
+def trial_primes() -> tuple[int, ...]:
+    """Return the primes tried by division"""
+    return tuple(small_primes(_TRIAL_LIMIT))
+
+
+def is_probable_prime(n: int) -> bool:
+    """Miller-Rabin test with the first prime bases, which is
+    deterministic for n below 3.3e24"""
+    if n < 2:
+        return False
+    for p in _MILLER_RABIN_BASES:
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for a in _MILLER_RABIN_BASES:
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def check_deadline(deadline: Optional[float], n: int) -> None:
+    """Raise TimeoutError if the deadline to factorize n passed"""
+    if deadline is not None and monotonic() > deadline:
+        raise TimeoutError(f"Factorization of {n} timed out")
+
+
+def find_divisor(n: int, deadline: Optional[float], use_ecm: bool) -> int:
+    """Return a non-trivial divisor of the composite n. If use_ecm, the
+    elliptic curve method is tried when Pollard's rho does not find a
+    divisor after a number of iterations, with increasing bounds"""
+    if is_square(n):
+        return isqrt(n)
+    max_iterations = _RHO_ITERATIONS if use_ecm else None
+    divisor = pollard_brent(n, deadline, max_iterations)
+    for b1, curves in _ECM_BOUNDS if use_ecm else ():
+        if divisor is not None:
+            break
+        divisor = ecm(n, deadline, b1, curves)
+    while divisor is None:
+        divisor = pollard_brent(n, deadline)
+    return divisor
+
+
+def is_square(n: int) -> bool:
+    """Return True if n is a perfect square"""
+    return isqrt(n) ** 2 == n
+
+
+def pollard_brent(
+    n: int, deadline: Optional[float] = None, max_iterations: Optional[int] = None
+) -> Optional[int]:
+    """Return a non-trivial divisor of the odd composite n with Brent's
+    variant of Pollard's rho, None if not found within max_iterations.
+    The products of differences are accumulated to compute one gcd per
+    block of iterations"""
+    rng = Random(n)  # nosec B311, deterministic for each n
+    iterations = 0
+    while True:
+        y, c = rng.randrange(1, n), rng.randrange(1, n)
+        g = r = q = 1
+        x = ys = y
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(_RHO_BLOCK, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = gcd(q, n)
+                k += _RHO_BLOCK
+            iterations += r
+            r *= 2
+            check_deadline(deadline, n)
+            if max_iterations is not None and iterations > max_iterations:
+                return None
+        if g == n:
+            # The block overshot, step again from its start one at a time
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = gcd(abs(x - ys), n)
+        if g != n:
+            return g
+
+
+def ecm(n: int, deadline: Optional[float], b1: int, curves: int) -> Optional[int]:
+    """Return a non-trivial divisor of the composite n with the first stage
+    of Lenstra's elliptic curve method on Montgomery curves with Suyama's
+    parametrization, None if not found with that number of curves"""
+    rng = Random(n)  # nosec B311, deterministic for each n
+    prime_powers = largest_prime_powers(b1)
+    for _ in range(curves):
+        sigma = rng.randrange(6, n - 1)
+        u, v = (sigma * sigma - 5) % n, 4 * sigma % n
+        x, z = pow(u, 3, n), pow(v, 3, n)
+        denominator = 16 * pow(u, 3, n) * v % n
+        g = gcd(denominator, n)
+        if 1 < g < n:
+            return g
+        if g == n:
+            continue
+        # (A + 2) / 4 of the curve By^2 = x^3 + Ax^2 + x
+        a24 = pow(v - u, 3, n) * (3 * u + v) * pow(denominator, -1, n) % n
+        for power in prime_powers:
+            x, z = montgomery_ladder(power, x, z, a24, n)
+        g = gcd(z, n)
+        if 1 < g < n:
+            return g
+        check_deadline(deadline, n)
+    return None
+
 
-    command_and_args = [factor_util, *map(str, numbers)]
-    try:
-        out = run(command_and_args, stdout=PIPE, check=True)  # nosec B603
-    except CalledProcessError as error:
-        # Was it a negative number on the input?
-        if any(number < 0 for number in numbers):
-            raise ValueError(
-                f"A negative number was found in the input: {numbers}"
-            ) from error
-        raise error
+def largest_prime_powers(bound: int) -> list[int]:
+    """Return the largest power up to bound of each prime up to bound"""
+    powers = []
+    for p in small_primes(bound):
+        power = p
+        while power * p <= bound:
+            power *= p
+        powers.append(power)
+    return powers
 
-    factor_lines = out.stdout.decode("ascii").strip().split("\n")
 
-    # We only want the value a.k.a. the primes factors
-    # A generator here does not save memory, but makes the parsing lazy
-    return (parse_factor_line(line)[1] for line in factor_lines)
+def montgomery_ladder(k: int, x: int, z: int, a24: int, n: int) -> tuple[int, int]:
+    """Return the projective x coordinate of k times the point (x : z)
+    of a Montgomery curve modulo n"""
+
+    def double(x: int, z: int) -> tuple[int, int]:
+        s, d = (x + z) ** 2 % n, (x - z) ** 2 % n
+        t = s - d
+        return s * d % n, t * (d + a24 * t) % n
+
+    def add(x1: int, z1: int, x2: int, z2: int) -> tuple[int, int]:
+        u, v = (x1 - z1) * (x2 + z2), (x1 + z1) * (x2 - z2)
+        return z * (u + v) ** 2 % n, x * (u - v) ** 2 % n
+
+    x1, z1 = x, z
+    x2, z2 = double(x, z)
+    for bit in bin(k)[3:]:
+        if bit == "1":
+            x1, z1 = add(x1, z1, x2, z2)
+            x2, z2 = double(x2, z2)
+        else:
+            x2, z2 = add(x1, z1, x2, z2)
+            x1, z1 = double(x1, z1)
+    return x1, z1
+
+
+def small_primes(limit: int) -> list[int]:
+    """Return the primes up to limit inclusive, with a sieve of Eratosthenes"""
+    if limit < 2:
+        return []
+    sieve = bytearray([1]) * (limit + 1)
+    sieve[:2] = b"\x00\x00"
+    for p in range(2, isqrt(limit) + 1):
+        if sieve[p]:
+            sieve[p * p :: p] = bytes(len(range(p * p, limit + 1, p)))
+    return list(compress(range(limit + 1), sieve))
+
+
+def odd_sieve_segments(
+    start: int, stop: int, segment_size: int = _SEGMENT_SIZE
+) -> Iterator[tuple[int, bytearray]]:
+    """Yield the segments of a segmented sieve of Eratosthenes over the odd
+    numbers from start to stop inclusive, as the first number of the
+    segment and a flag per odd number set if it is prime. Only one segment
+    of segment_size odd numbers and the primes up to the square root of
+    stop are held in memory"""
+    odd_primes = small_primes(isqrt(stop))[1:]
+    # The multiples of each prime are crossed out at once, copying from
+    # a buffer of zeros that is sliced without copying
+    zeros = memoryview(bytes(segment_size))
+    for low in range(start | 1, stop + 1, 2 * segment_size):
+        high = min(low + 2 * segment_size, stop + 1)
+        size = (high - low + 1) // 2
+        segment = bytearray([1]) * size
+        for p in odd_primes:
+            if p * p >= high:
+                break
+            first = max(p * p, -(-low // p) * p)
+            first = (first + p if first % 2 == 0 else first) - low
+            index = first // 2
+            if index < size:
+                segment[index::p] = zeros[: (size - 1 - index) // p + 1]
+        if low == 1:
+            segment[0] = 0
+        yield low, segment
+
+
+def primes_in_range(
+    start: int, stop: int, segment_size: int = _SEGMENT_SIZE
+) -> Iterator[int]:
+    """Yield the primes from start to stop inclusive"""
+    if start <= 2 <= stop:
+        yield 2
+    for low, segment in odd_sieve_segments(max(start, 3), stop, segment_size):
+        yield from compress(range(low, low + 2 * len(segment), 2), segment)
 
 
 def write_primes(start: int, stop: int, outfile=stdout) -> None:
     """Writes to outfile a list of primes from start to stop values inclusive"""
     if start > stop:
         raise ValueError(f"start '{start}' should not be larger than stop '{stop}'")
-    numbers = range(start, stop + 1)
-    prime_factors = compute_prime_factors(numbers)
-    if prime_factors is None:
-        raise ValueError(
-            f"No prime factors were found for between '{start}' and '{stop}', inclusively"
+    if start < 0:
+        raise ValueError(f"start '{start}' should not be negative")
+    if stop > MAX_PRIMES_STOP:
+        raise ValueError(f"stop '{stop}' should not be larger than {MAX_PRIMES_STOP}")
+
+    # The primes are written a segment at a time, so the output
+    # starts right away and the memory used is bounded
+    primes = primes_in_range(start, stop)
+    written = False
+    while chunk := list(islice(primes, _SEGMENT_SIZE)):
+        outfile.write("\n".join(map(str, chunk)) + "\n")
+        written = True
+    if not written:
+        outfile.write("\n")
+
+
+def pack_flags(flags: Union[bytes, bytearray]) -> bytes:
+    """Pack a multiple of 8 flags of value 0 or 1 into bytes,
+    the first flag in the lowest bit of the first byte"""
+    if not flags:
+        return b""
+    # Parsing a base 2 string is linear, and runs in C
+    bits = flags.translate(_FLAGS_TO_DIGITS)[::-1]
+    return int(bits, 2).to_bytes(len(flags) // 8, "little")
+
+
+class PrimeTable:
+    """Table of primes in a binary file with a bit per odd number, set if it
+    is prime. The file is memory-mapped, so it is not parsed when loaded,
+    and it is extended with a sieve when a larger number is requested.
+
+    The file starts with a header with a magic string, the version of the
+    format and the largest number in the table. A file with another header
+    is rebuilt"""
+
+    magic = b"HEKITPRM"
+    version = 1
+    _header = Struct("<8sIQ")
+
+    def __init__(
+        self,
+        path: PathType = PRIMES_TABLE_FILE,
+        limit: int = 2**20,
+        max_limit: int = MAX_PRIMES_TABLE,
+    ) -> None:
+        self._path = Path(path)
+        self._max_limit = max_limit
+        self._bits: Union[mmap, bytes] = b""
+        self.limit = 0
+        with suppress(OSError, ValueError):
+            self._load()
+        if limit > self.limit:
+            self.extend(limit)
+
+    def _load(self) -> None:
+        with self._path.open("rb") as f:
+            data = mmap(f.fileno(), 0, access=ACCESS_READ)
+        magic, version, limit = self._header.unpack_from(data)
+        if (magic, version) != (self.magic, self.version):
+            raise ValueError(f"Outdated prime table '{self._path}'")
+        if len(data) != self._header.size + (limit + 1) // 16:
+            raise ValueError(f"Truncated prime table '{self._path}'")
+        self._bits = data
+        self.limit = limit
+
+    def extend(self, n: int) -> None:
+        """Extend the table up to n at least, doubling it to amortize
+        the extensions, and replace its file atomically"""
+        if n > self._max_limit:
+            raise ValueError(f"Cannot process number higher than {self._max_limit}")
+        # A byte holds the bits of 16 numbers
+        limit = min(max(n, 2 * self.limit), self._max_limit) | 15
+        chunks = [bytes(self._bits[self._header.size :])]
+        chunks.extend(
+            pack_flags(segment)
+            for _, segment in odd_sieve_segments(self.limit + 1, limit)
+        )
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(f"{self._path.name}.{getpid()}.tmp")
+        with tmp_path.open("wb") as f:
+            f.write(self._header.pack(self.magic, self.version, limit))
+            f.writelines(chunks)
+        replace(tmp_path, self._path)
+        self._load()
+
+    def _require(self, n: int) -> None:
+        if n > self._max_limit:
+            raise ValueError(f"Cannot process number higher than {self._max_limit}")
+        if n > self.limit:
+            self.extend(n)
+
+    def is_prime(self, n: int) -> bool:
+        """Return True if n is prime, extending the table if needed"""
+        if n < 3 or n % 2 == 0:
+            return n == 2
+        self._require(n)
+        byte = self._bits[self._header.size + (n >> 4)]
+        return (byte >> ((n >> 1) & 7)) & 1 == 1
+
+    def primes_in_range(self, numbers: range) -> tuple[int, ...]:
+        """Return the sorted primes in a range of numbers,
+        extending the table if needed"""
+        if not numbers:
+            return ()
+        lowest, highest = sorted((numbers[0], numbers[-1]))
+        lowest = max(lowest, 2)
+        self._require(highest)
+        if lowest > highest:
+            return ()
+
+        # The bits of the bytes covering the range are expanded to
+        # a flag per odd number, which selects the odd primes
+        first_odd = max(lowest | 1, 3)
+        first, last = first_odd >> 4, highest >> 4
+        offset = self._header.size
+        flags = b"".join(
+            map(
+                _EXPANDED_BITS.__getitem__,
+                self._bits[offset + first : offset + last + 1],
+            )
         )
-    primes = [factors[0] for factors in prime_factors if len(factors) == 1]
-    print("\n".join(map(str, primes)), file=outfile)
+        index = (first_odd - 16 * first) // 2
+        odd_numbers = range(first_odd, highest + 1, 2)
+        primes = list(compress(odd_numbers, flags[index : index + len(odd_numbers)]))
+        if lowest == 2:
+            primes.insert(0, 2)
+        if numbers.step != 1:
+            primes = [p for p in primes if p in numbers]
+        return tuple(primes)
@@ -5,133 +5,231 @@
 
 from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
-from re import findall
+from re import Pattern, compile as compile_regex
 from dataclasses import dataclass
+from typing import Callable, Optional
 
 from kit.utils.files import dump_toml, load_toml
 from kit.utils.tsort import tsort
 from kit.utils.typing import PathType
 
-
 RecipeArgDict = dict[str, str]
 
 
-def read_spec(component: str, instance: str, repo_location: PathType) -> str:
-    """Return hekit.spec file as a dict"""
-    path = Path(repo_location) / component / instance / "hekit.spec"
-    spec = load_toml(path)
-    # There should only be one instance
-    return spec[component][0]
+class SpecCache:
+    """Spec and recipe files parsed during a run, keyed by path. This is the
+    only cache of parsed TOML files, load_toml parses every time. An entry
+    is used while the modification and change times, size and inode of the
+    file are unchanged. The dicts returned are shared and must not be
+    modified"""
 
+    def __init__(self) -> None:
+        self._entries: dict[Path, tuple[tuple[int, ...], dict]] = {}
 
-def fill_user_string_dict(d: dict, recipe_arg_dict: RecipeArgDict) -> dict:
-    """Returns a dict with str values written by the user.
-    NB. Only works for flat str value dict."""
+    @staticmethod
+    def _stamp(path: Path) -> tuple[int, ...]:
+        stat = path.lstat()
+        return stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size, stat.st_ino
 
-    def fill_user_str(s: str | list) -> str | list:
-        """s can be a string or a list of strings"""
-        if isinstance(s, str):
-            symbols = findall(r"(!(.*?)!)", s)
-            if not symbols:
-                return s
+    def load(self, filename: PathType) -> dict:
+        """Return the content of a TOML file, parsed once while unchanged"""
+        path = Path(filename).expanduser().absolute()
+        try:
+            stamp = self._stamp(path)
+        except FileNotFoundError:
+            return load_toml(path)  # Raises with the usual message
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        content = load_toml(path)
+        self._entries[path] = (stamp, content)
+        return content
 
-            new_s = s
-            for symbol, k in symbols:
-                try:
-                    value = recipe_arg_dict[k]
-                except KeyError:
-                    value = input(f"Please enter {k}: ")
-                    # Save current value in case the same key
-                    # is needed in other place
-                    recipe_arg_dict[k] = value
+    def dump(self, filename: PathType, content: dict) -> None:
+        """Write a TOML file and keep its content"""
+        path = Path(filename).expanduser().absolute()
+        dump_toml(path, content)
+        self._entries[path] = (self._stamp(path), content)
 
-                new_s = new_s.replace(symbol, value)
+    def clear(self) -> None:
+        """Forget all the entries"""
+        self._entries.clear()
 
-            return new_s
 
-        if isinstance(s, list):
-            return [fill_user_str(e) for e in s]
+# Shared by all the readers and writers of specs of a run
+spec_cache = SpecCache()
 
-        # Not str or list
-        return s
 
-    return {k: fill_user_str(v) for k, v in d.items()}
+def read_spec(component: str, instance: str, repo_location: PathType) -> dict:
+    """Return hekit.spec file as a dict"""
+    path = Path(repo_location) / component / instance / "hekit.spec"
+    spec = spec_cache.load(path)
+    # There should only be one instance
+    return spec[component][0]
 
 
-def fill_self_ref_string_dict(d: dict, repo_path: PathType) -> dict:
-    """Returns a dict with str values.
-    NB. Only works for flat str value dict."""
+# Patterns of the substitutions, the groups are the parts of the reference
+_USER_REF = compile_regex(r"!(.*?)!")
+_SELF_REF = compile_regex(r"%(.*?)%")
+_DEP_REF = compile_regex(r"\$(.*?)/(.*?)/(.*?)\$")
+_DEP_KEY_REF = compile_regex(r"\$%(.*?)%/.*\$")
+
+# Literal strings and groups of the references of a template
+Segments = tuple[str | tuple[str, ...], ...]
+
+
+@lru_cache(maxsize=4096)
+def compile_template(template: str, pattern: Pattern) -> Segments:
+    """Returns the template split in literal strings and the groups of
+    the references matching pattern. Each template is only parsed once"""
+    segments: list[str | tuple[str, ...]] = []
+    pos = 0
+    for match in pattern.finditer(template):
+        if match.start() > pos:
+            segments.append(template[pos : match.start()])
+        segments.append(match.groups())
+        pos = match.end()
+    if pos < len(template):
+        segments.append(template[pos:])
+    return tuple(segments)
+
+
+def references(value, pattern: Pattern) -> list[tuple[str, ...]]:
+    """Returns the groups of the references matching pattern in value.
+    value can be a string or a list of strings"""
+    if isinstance(value, str):
+        return [
+            segment
+            for segment in compile_template(value, pattern)
+            if not isinstance(segment, str)
+        ]
+
+    if isinstance(value, list):
+        return [ref for e in value for ref in references(e, pattern)]
+
+    # Not str or list
+    return []
+
+
+def substitute(value, pattern: Pattern, resolve: Callable[..., str]):
+    """Returns value with the references matching pattern replaced by
+    resolve called with their groups. value can be a string or a list
+    of strings, other values are returned as they are"""
+
+    def resolve_str(groups: tuple[str, ...]) -> str:
+        replacement = resolve(*groups)
+        if not isinstance(replacement, str):
+            raise TypeError(
+                f"replacement for '{'/'.join(groups)}' must be str, "
+                f"not {type(replacement).__name__}"
+            )
+        return replacement
+
+    if isinstance(value, str):
+        segments = compile_template(value, pattern)
+        if all(isinstance(segment, str) for segment in segments):
+            return value
+        return "".join(
+            segment if isinstance(segment, str) else resolve_str(segment)
+            for segment in segments
+        )
 
-    def fill_str(s: str) -> str:
-        """s can be a string or a list of strings"""
-        if isinstance(s, str):
-            symbols = findall(r"(%(.*?)%)", s)
-            if not symbols:
-                return s
+    if isinstance(value, list):
+        return [substitute(e, pattern, resolve) for e in value]
 
-            new_s = s
-            for symbol, k in symbols:
-                new_s = new_s.replace(symbol, fill_str(d[k]))
+    # Not str or list
+    return value
 
-            return new_s
 
-        if isinstance(s, list):
-            return [fill_str(e) for e in s]
+def fill_user_string_dict(d: dict, recipe_arg_dict: RecipeArgDict) -> dict:
+    """Returns a dict with str values written by the user.
+    NB. Only works for flat str value dict."""
+
+    def resolve_user_arg(k: str) -> str:
+        if k not in recipe_arg_dict:
+            # Save current value in case the same key
+            # is needed in other place
+            recipe_arg_dict[k] = input(f"Please enter {k}: ")
+        return recipe_arg_dict[k]
 
-        # Not str or list
-        return s
+    return {k: substitute(v, _USER_REF, resolve_user_arg) for k, v in d.items()}
 
-    def fill_dep_str(s: str) -> str:
-        """s can be a string or a list of strings"""
-        if isinstance(s, str):
-            symbols = findall(r"(\$(.*?)/(.*?)/(.*?)\$)", s)
-            if not symbols:
-                return s
 
-            new_s = s
-            for symbol, comp, name, k in symbols:
-                # Assume finalized spec is already expanded
-                # The dependency has already been installed
-                sub = read_spec(comp, name, repo_path)
-                new_s = new_s.replace(symbol, sub[k])
+def fill_user_args(toml_specs: dict, recipe_arg_dict: RecipeArgDict) -> None:
+    """Prompt for all the values written by the user in a recipe that
+    are not in recipe_arg_dict, and add them to it"""
+    for instances_list in toml_specs.values():
+        for instance in instances_list:
+            fill_user_string_dict(instance, recipe_arg_dict)
 
-            return new_s
 
-        if isinstance(s, list):
-            return [fill_dep_str(e) for e in s]
+def fill_self_ref_string_dict(
+    d: dict, repo_path: PathType, known_specs: Optional[dict[str, dict]] = None
+) -> dict:
+    """Returns a dict with str values. The specs of the dependencies are
+    taken from known_specs, keyed by component/instance, if given there,
+    otherwise they are read from the repo.
+    NB. Only works for flat str value dict."""
+    # Each value is expanded once, after the values it references.
+    # The keys being expanded form a path, a key found again is a cycle
+    expanded: dict = {}
+
+    def resolve_self_ref(k: str) -> str:
+        path = [] if k in expanded else [k]
+        while path:
+            top = path[-1]
+            pending = [r for (r,) in references(d[top], _SELF_REF) if r not in expanded]
+            if not pending:
+                expanded[top] = substitute(d[top], _SELF_REF, expanded.__getitem__)
+                path.pop()
+            elif pending[0] in path:
+                cycle = [*path[path.index(pending[0]) :], pending[0]]
+                raise InvalidSpecError(f"cycle in references: {' -> '.join(cycle)}")
+            else:
+                path.append(pending[0])
+        return expanded[k]
+
+    dep_specs: dict[str, dict] = {**(known_specs or {})}
+
+    def resolve_dep_ref(comp: str, name: str, k: str) -> str:
+        # Assume finalized spec is already expanded
+        # The dependency has already been installed
+        if f"{comp}/{name}" not in dep_specs:
+            dep_specs[f"{comp}/{name}"] = read_spec(comp, name, repo_path)
+        return dep_specs[f"{comp}/{name}"][k]
+
+    return {
+        k: substitute(resolve_self_ref(k), _DEP_REF, resolve_dep_ref) for k in d.keys()
+    }
 
-        # Not str or list
-        return s
 
-    return {k: fill_dep_str(fill_str(v)) for k, v in d.items()}
+def get_dependency_keys(instance: dict) -> list[str]:
+    """Returns the keys of an instance whose values are the
+    component/instance of its dependencies"""
+    return [k for v in instance.values() for (k,) in references(v, _DEP_KEY_REF)]
 
 
 def get_dependencies(instances_list: list) -> list[str]:
     """Returns a list of dependencies defined
     and used in the recipe file"""
-    dependency_list: list[str] = []
-
-    def fill_dependencies_list(s: str, d: dict) -> None:
-        """s can be a string or a list of strings"""
-        if isinstance(s, str):
-            symbols = findall(r"(\$%(.*?)%/.*\$)", s)
-            if not symbols:
-                return
-
-            # Assume dependencies are define as:
-            # component/instance
-            dependency_list.extend(d[k].split("/")[0] for _, k in symbols)
-
-        elif isinstance(s, list):
-            for e in s:
-                fill_dependencies_list(e, d)
-
-    for instance in instances_list:
-        for v in instance.values():
-            fill_dependencies_list(v, instance)
-
-    return dependency_list
+    # Assume dependencies are define as:
+    # component/instance
+    return [
+        instance[k].split("/")[0]
+        for instance in instances_list
+        for k in get_dependency_keys(instance)
+    ]
+
+
+def get_dependency_graph(toml_specs: dict) -> dict[str, list[str]]:
+    """Returns a dict with the components of the recipe as keys
+    and the components they depend on as values"""
+    return {
+        component: get_dependencies(instances_list)
+        for component, instances_list in toml_specs.items()
+    }
 
 
 def fill_rloc_paths(d: dict[str, str], repo_location: PathType) -> dict[str, str]:
@@ -154,6 +252,8 @@ class Spec:
     component: str
     _instance_spec: dict
     repo_location: PathType
+    # component/instance of the dependencies
+    dependencies: tuple[str, ...] = ()
 
     # Keys will act as property methods
     # Values will be used as defaults in Spec obj creation
@@ -185,33 +285,47 @@ class Spec:
         """Generator yield Spec objects.
         Process spec file: perform substitutions and expand paths."""
         # load the recipe file
-        toml_specs = load_toml(filename)
+        toml_specs = spec_cache.load(filename)
 
-        # create dependency graph
-        dependency_dict = {
-            component: get_dependencies(instances_list)
-            for component, instances_list in toml_specs.items()
-        }
-
-        # apply topological sorting
-        sorted_components = tsort(dependency_dict)
+        # apply topological sorting on the dependency graph
+        sorted_components = tsort(get_dependency_graph(toml_specs))
 
         # create specs
         for component in sorted_components:
-            # Some dependencies for the components of the current toml file
-            # could be defined in a separated toml file. Therefore, SW
-            # will only install the components in the current toml file
-            # TODO: Add case to check that dependency is already installed
-            if component not in toml_specs:
-                continue
-            for instance_spec in toml_specs[component]:
-                yield cls.from_instance_spec(
-                    component, instance_spec, rloc, recipe_arg_dict
-                )
+            yield from cls.from_toml_component(
+                toml_specs, component, rloc, recipe_arg_dict
+            )
+
+    @classmethod
+    def from_toml_component(
+        cls,
+        toml_specs: dict,
+        component: str,
+        rloc: PathType,
+        recipe_arg_dict: RecipeArgDict,
+        known_specs: Optional[dict[str, dict]] = None,
+    ):
+        """Generator yield Spec objects for the instances of a component
+        in an already loaded recipe file. The specs of the dependencies
+        are taken from known_specs if given there"""
+        # Some dependencies for the components of the current toml file
+        # could be defined in a separated toml file. Therefore, SW
+        # will only install the components in the current toml file
+        # TODO: Add case to check that dependency is already installed
+        if component not in toml_specs:
+            return
+        for instance_spec in toml_specs[component]:
+            yield cls.from_instance_spec(
+                component, instance_spec, rloc, recipe_arg_dict, known_specs
+            )
 
     @staticmethod
     def _expand_instance(
-        component: str, instance: dict, rloc: PathType, recipe_arg_dict: RecipeArgDict
+        component: str,
+        instance: dict,
+        rloc: PathType,
+        recipe_arg_dict: RecipeArgDict,
+        known_specs: Optional[dict[str, dict]] = None,
     ):
         """Expansion operations"""
         # substitution from user must come before rloc expansion
@@ -221,7 +335,7 @@ class Spec:
             instance_name = instance["name"]
             instance = fill_rloc_paths(instance, f"{rloc}/{component}/{instance_name}")
         # Substitution must come after rloc expansion
-        instance = fill_self_ref_string_dict(instance, rloc)
+        instance = fill_self_ref_string_dict(instance, rloc, known_specs)
         return instance
 
     @classmethod
@@ -242,21 +356,6 @@ class Spec:
             if not isinstance(for_test, str):
                 raise InvalidSpecError(f"'{attrib}' is not a string")
 
-    @staticmethod
-    def _validate_unique_instance(
-        component: str, instance: dict, rloc: PathType
-    ) -> None:
-        # load previous spec from info file
-        try:
-            instance_name = instance["name"]
-            previous_instance = read_spec(component, instance_name, rloc)
-            if previous_instance != instance:
-                raise InvalidSpecError(
-                    f"{component}/{instance_name} is already present but it was executed with different options"
-                )
-        except FileNotFoundError:
-            pass
-
     # Factory given parsed TOML python dict
     @classmethod
     def from_instance_spec(
@@ -265,6 +364,7 @@ class Spec:
         instance_spec: dict,
         rloc: PathType,
         recipe_arg_dict: RecipeArgDict,
+        known_specs: Optional[dict[str, dict]] = None,
     ) -> Spec:
         """Expand paths.
         Populate the fixed attribs and place others in dictionary."""
@@ -272,10 +372,17 @@ class Spec:
         # Add some defaults and override with input instance spec
         instance_spec_with_defaults = {**cls._fixed_attribs, **instance_spec}
         expanded_instance_spec = cls._expand_instance(
-            component, instance_spec_with_defaults, rloc, recipe_arg_dict
+            component, instance_spec_with_defaults, rloc, recipe_arg_dict, known_specs
+        )
+        dependencies = tuple(
+            sorted(
+                {
+                    expanded_instance_spec[k]
+                    for k in get_dependency_keys(instance_spec_with_defaults)
+                }
+            )
         )
-        cls._validate_unique_instance(component, expanded_instance_spec, rloc)
-        return cls(component, expanded_instance_spec, rloc)
+        return cls(component, expanded_instance_spec, rloc, dependencies)
 
     def to_toml_dict(self) -> dict:
         """Transform to TOML structure as a Python dict"""
@@ -286,7 +393,7 @@ class Spec:
     def to_toml_file(self, filename: PathType) -> None:
         """Write spec object to toml file"""
         obj_as_dict = self.to_toml_dict()
-        dump_toml(filename, obj_as_dict)
+        spec_cache.dump(filename, obj_as_dict)
 
     def __getitem__(self, key: str):
         """Return value from key.
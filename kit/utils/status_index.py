@@ -0,0 +1,107 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module handles the index of the status of the instances of a repo"""
+
+import json
+from contextlib import contextmanager
+from fcntl import flock, LOCK_EX, LOCK_SH
+from pathlib import Path
+from typing import Iterator, Optional
+
+from kit.utils.files import dump_json
+from kit.utils.typing import PathType
+
+# The info file tables copied to the index, and the error
+# of the instances whose info file could not be read
+_INDEXED_TABLES = ("status", "timings", "sizes", "error")
+
+
+class StatusIndex:
+    """Single file under the repo location with the status of every
+    instance, so that listing the repo is one read. It is updated under
+    a lock shared between processes and replaced atomically"""
+
+    filename = ".status_index.json"
+    version = 1
+
+    def __init__(self, repo_location: PathType) -> None:
+        self._path = Path(repo_location).expanduser() / self.filename
+
+    @property
+    def path(self) -> Path:
+        """Return the location of the index"""
+        return self._path
+
+    @contextmanager
+    def _lock(self, exclusive: bool) -> Iterator[None]:
+        with self._path.with_name(f"{self.filename}.lock").open(
+            "a", encoding="utf-8"
+        ) as lock_file:
+            flock(lock_file, LOCK_EX if exclusive else LOCK_SH)
+            yield
+
+    def _read(self) -> Optional[dict[str, dict]]:
+        try:
+            with self._path.open(encoding="utf-8") as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if index.get("version") != self.version:
+            return None
+        return index["instances"]
+
+    def _write(self, instances: dict[str, dict]) -> None:
+        dump_json(self._path, {"version": self.version, "instances": instances})
+
+    def load(self) -> Optional[dict[str, dict]]:
+        """Return the indexed info of the instances keyed by
+        component/instance, or None if there is no valid index"""
+        if not self._path.parent.is_dir():
+            return None
+        with self._lock(exclusive=False):
+            return self._read()
+
+    def update(self, component: str, instance: str, info: dict) -> None:
+        """Record the info file of an instance"""
+        if not self._path.parent.is_dir():
+            return
+        with self._lock(exclusive=True):
+            instances = self._read()
+            if instances is None:
+                # A full rescan is required to build the index
+                return
+            instances[f"{component}/{instance}"] = {
+                k: info[k] for k in _INDEXED_TABLES if k in info
+            }
+            self._write(instances)
+
+    def remove(self, component: str, instance: str = "") -> None:
+        """Remove an instance, or all the instances of a component"""
+        if not self._path.parent.is_dir():
+            return
+        with self._lock(exclusive=True):
+            instances = self._read()
+            if instances is None:
+                return
+            prefix = f"{component}/{instance}" if instance else f"{component}/"
+            self._write(
+                {
+                    k: v
+                    for k, v in instances.items()
+                    if not (k == prefix or (not instance and k.startswith(prefix)))
+                }
+            )
+
+    def rebuild(self, infos: dict[str, dict]) -> None:
+        """Replace the index with the info files of all the instances,
+        keyed by component/instance"""
+        if not self._path.parent.is_dir():
+            return
+        with self._lock(exclusive=True):
+            self._write(
+                {
+                    key: {k: info[k] for k in _INDEXED_TABLES if k in info}
+                    for key, info in infos.items()
+                }
+            )
@@ -1,33 +1,159 @@
 # Copyright (C) 2022 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
-""" This module provides utility functions for importing and registering subparsers.
-"""
+"""This module provides utility functions for importing and registering subparsers."""
+
 from argparse import ArgumentParser
+from os import environ
 from pathlib import Path
-from sys import modules
+from sys import argv, modules
 from importlib import import_module
 from importlib.util import spec_from_file_location, module_from_spec
+from typing import NamedTuple, Optional
 
-from kit.utils.constants import Constants, PluginsConfig, PluginState
+from kit.utils.completion_cache import CompletionCache, PluginCommands
+from kit.utils.constants import PluginsConfig, PluginState
 from kit.utils.typing import PathType
 from kit.utils.files import files_in_dir, load_toml, dash_to_underscore
 
-
 ParserDict = dict[str, ArgumentParser]
 
 
-def register_subparser(subparsers) -> None:
-    """Register surparsers"""
-    for func in get_subparsers_kit(
-        ["commands", "tools"], Constants.HEKIT_ROOT_DIR / "kit"
-    ):
+class Manifest(NamedTuple):
+    """Sub-command of hekit: the module with the function
+    that creates its parser, and its description"""
+
+    module: str
+    function: str
+    description: str
+
+
+# The sub-commands of hekit. The module of a sub-command is only imported
+# when it is executed, the rest are known by their manifest
+KIT_MANIFESTS: dict[str, Manifest] = {
+    "check-dependencies": Manifest(
+        "kit.commands.check_deps",
+        "set_check_dep_subparser",
+        "checks system dependencies",
+    ),
+    "docker-build": Manifest(
+        "kit.commands.docker_build",
+        "set_docker_subparser",
+        "docker build of the toolkit",
+    ),
+    "gc": Manifest(
+        "kit.commands.gc",
+        "set_gc_subparser",
+        "lists and removes the instances not used by the recipes",
+    ),
+    "init": Manifest("kit.commands.init", "set_init_subparser", "initialize hekit"),
+    "install": Manifest(
+        "kit.commands.install", "set_install_subparser", "install components"
+    ),
+    "build": Manifest(
+        "kit.commands.install", "set_install_subparser", "build components"
+    ),
+    "fetch": Manifest(
+        "kit.commands.install", "set_install_subparser", "fetch components"
+    ),
+    "list": Manifest(
+        "kit.commands.list_cmd", "set_list_subparser", "lists installed components"
+    ),
+    "new": Manifest("kit.commands.new", "set_new_subparser", "create a new project"),
+    "plugins": Manifest(
+        "kit.commands.plugin", "set_plugin_subparser", "handle third party plugins"
+    ),
+    "remove": Manifest(
+        "kit.commands.remove", "set_remove_subparser", "removes/uninstalls components"
+    ),
+    "algebras": Manifest(
+        "kit.tools.algebras",
+        "set_gen_algebras_subparser",
+        "generate ZZ_p[x]/phi(X) algebras",
+    ),
+    "gen-primes": Manifest(
+        "kit.tools.gen_primes",
+        "set_gen_primes_subparser",
+        "generate primes in range [n, m] where n, m are positive integers",
+    ),
+}
+
+
+def command_line_args() -> list[str]:
+    """Return the arguments of hekit, or the words
+    of the line being completed if run by argcomplete"""
+    if "_ARGCOMPLETE" in environ:
+        return environ.get("COMP_LINE", "").split()[1:]
+    return argv[1:]
+
+
+def requested_command(args: list[str]) -> Optional[str]:
+    """Return the sub-command in the arguments of hekit,
+    the first one that is neither an option nor its value"""
+    args_iter = iter(args)
+    for arg in args_iter:
+        if arg == "--config":
+            next(args_iter, None)
+        elif not arg.startswith("-"):
+            return arg
+    return None
+
+
+def register_subparser(subparsers, args: Optional[list[str]] = None) -> None:
+    """Register the parser of the sub-command requested in args, and the
+    other sub-commands of hekit by the name and description of their
+    manifest. The enabled plugins are registered by their manifest in the
+    plugin config file too, importing only the requested one. The plugins
+    without a manifest are imported unless a hekit sub-command is requested,
+    or the line is being completed and none of them is requested"""
+    command = requested_command(command_line_args() if args is None else args)
+    if command in KIT_MANIFESTS:
+        manifest = KIT_MANIFESTS[command]
+        getattr(import_module(manifest.module), manifest.function)(subparsers)
+
+    for name, manifest in KIT_MANIFESTS.items():
+        if name not in subparsers.choices:
+            subparsers.add_parser(name, description=manifest.description)
+
+    if command in KIT_MANIFESTS:
+        return
+
+    # The plugins recorded by 'hekit plugins refresh' are only imported
+    # when their sub-command is requested
+    manifests, start_files = get_plugins_manifests()
+    for name, manifest in manifests.items():
+        if name == command:
+            module = import_from_source_file(
+                Path(manifest.module).stem, manifest.module
+            )
+            getattr(module, manifest.function)(subparsers)
+        else:
+            subparsers.add_parser(name, description=manifest.description)
+    if not start_files:
+        return
+
+    # While completing, the plugins without a recorded manifest are only
+    # imported to complete the arguments of their sub-commands, otherwise
+    # they are known by the names and descriptions in the completion cache
+    if "_ARGCOMPLETE" in environ:
+        cache = CompletionCache()
+        commands = cache.plugin_commands(lambda: plugin_commands(start_files))
+        cache.save()
+        if command not in commands:
+            for name, description in commands.items():
+                subparsers.add_parser(name, description=description)
+            return
+
+    for func in get_subparsers_plugins(start_files, PluginsConfig.ROOT_DIR):
         func(subparsers)
 
-    for func in get_subparsers_plugins(
-        get_plugins_start_files(), PluginsConfig.ROOT_DIR
-    ):
+
+def plugin_commands(start_files: dict[str, str]) -> PluginCommands:
+    """Return the name and description of the sub-commands of the plugins"""
+    subparsers = ArgumentParser(prog="tmp").add_subparsers()
+    for func in get_subparsers_plugins(start_files, PluginsConfig.ROOT_DIR):
         func(subparsers)
+    return {name: parser.description for name, parser in subparsers.choices.items()}
 
 
 def import_from_source_file(module_name, file_path):
@@ -60,6 +186,22 @@ def get_subparsers_plugins(
         yield from funcs
 
 
+def get_plugin_manifests(
+    plugin_name: str, start_file: str, plugin_root: PathType = PluginsConfig.ROOT_DIR
+) -> dict[str, Manifest]:
+    """Import a plugin and return the manifest of each sub-command it
+    defines, with the path of its start file as module"""
+    manifests = {}
+    for func in get_subparsers_plugins({plugin_name: start_file}, plugin_root):
+        # Create a parser to get the argument name
+        tmp_subparsers = ArgumentParser(prog="tmp").add_subparsers()
+        func(tmp_subparsers)
+        module = f"{plugin_root}/{dash_to_underscore(plugin_name)}/{start_file}"
+        for name, parser in tmp_subparsers.choices.items():
+            manifests[name] = Manifest(module, func.__name__, parser.description or "")
+    return manifests
+
+
 def get_plugin_arg_choices(
     plugin_name: str,
     plugin_root: PathType = PluginsConfig.ROOT_DIR,
@@ -70,19 +212,38 @@ def get_plugin_arg_choices(
         plugin_dirname = dash_to_underscore(plugin_name)
         toml_file = f"{plugin_root}/{plugin_dirname}/plugin.toml"
         plugin_config = load_toml(toml_file)["plugin"]
-        plugin_start = {plugin_config["name"]: plugin_config["start"]}
-
-        # Get the function that defines the plugin arguments
-        func = next(get_subparsers_plugins(plugin_start, plugin_root))
+        return list(
+            get_plugin_manifests(
+                plugin_config["name"], plugin_config["start"], plugin_root
+            )
+        )
+    except (FileNotFoundError, KeyError):
+        return []
 
-        # Create a parser to get the argument name
-        tmp_parser = ArgumentParser(prog="tmp")
-        subparsers = tmp_parser.add_subparsers()
-        func(subparsers)
 
-        return list(subparsers.choices.keys())
+def get_plugins_manifests(
+    source_file: Path = PluginsConfig.FILE,
+    plugin_root: PathType = PluginsConfig.ROOT_DIR,
+) -> tuple[dict[str, Manifest], dict[str, str]]:
+    """Return the manifests of the enabled plugins recorded in the plugin
+    config file, keyed by sub-command, and the start files of the enabled
+    plugins recorded without manifest"""
+    manifests, start_files = {}, {}
+    try:
+        plugin_config = load_toml(source_file)[PluginsConfig.KEY]
+        for name, settings in plugin_config.items():
+            if settings["state"] != PluginState.ENABLE:
+                continue
+            if "command" in settings and "function" in settings:
+                module = f"{plugin_root}/{dash_to_underscore(name)}/{settings['start']}"
+                manifests[settings["command"]] = Manifest(
+                    module, settings["function"], settings.get("description", "")
+                )
+            else:
+                start_files[name] = settings["start"]
     except (FileNotFoundError, KeyError):
-        return []
+        pass
+    return manifests, start_files
 
 
 def get_plugins_start_files(source_file: Path = PluginsConfig.FILE) -> dict[str, str]:
@@ -5,10 +5,10 @@
 
 from pathlib import Path
 
+from kit.utils.completion_cache import CompletionCache
 from kit.utils.constants import PluginsConfig, PluginState
 from kit.utils.config import load_config, load_toml
-from kit.utils.files import list_dirs
-
+from kit.utils.typing import PathType
 
 try:
     # Tab completion is an optional feature, this means that
@@ -27,12 +27,21 @@ def enable_tab_completion(parser):
     autocomplete(parser)
 
 
+def cached_dirs(path: PathType) -> list[str]:
+    """Return the directories in path from the completion cache,
+    as completion runs again for every key press"""
+    cache = CompletionCache()
+    dirs = cache.list_dirs(path)
+    cache.save()
+    return dirs
+
+
 def components_completer(
     prefix, parsed_args, **kwargs  # pylint: disable=unused-argument
 ) -> list[str]:
     """Returns the components that were installed with the hekit"""
     config = load_config(parsed_args.config)
-    return list_dirs(config.repo_location)
+    return [c for c in cached_dirs(config.repo_location) if not c.startswith(".")]
 
 
 def instances_completer(
@@ -42,7 +51,7 @@ def instances_completer(
     was installed with the hekit"""
     config = load_config(parsed_args.config)
     comp_name_path = f"{config.repo_location}/{parsed_args.component}"
-    return list_dirs(comp_name_path)
+    return cached_dirs(comp_name_path)
 
 
 def get_plugins_by_state(
@@ -0,0 +1,94 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module moves removed components into the trash of the repo,
+from where they are deleted without blocking hekit"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from itertools import chain
+from os import listdir, rename
+from pathlib import Path
+from shutil import rmtree
+from subprocess import DEVNULL, Popen  # nosec B404
+from uuid import uuid4
+
+from kit.utils.typing import PathType
+
+
+def delete(path: Path) -> None:
+    """Delete a file or a directory tree, ignoring entries
+    deleted concurrently by another process"""
+    if path.is_dir() and not path.is_symlink():
+        rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def children(path: Path) -> list[Path]:
+    """Return the entries of a directory, none if it is
+    not a directory or it was deleted concurrently"""
+    if path.is_symlink():
+        return []
+    try:
+        return list(path.iterdir())
+    except OSError:
+        return []
+
+
+class Trash:
+    """Directory under the repo location holding the components and instances
+    being removed. Renaming a directory into the trash is atomic, so the repo
+    is never left with a partially deleted instance"""
+
+    dirname = ".trash"
+
+    def __init__(self, repo_location: PathType):
+        self._path = Path(repo_location) / self.dirname
+
+    @property
+    def path(self) -> Path:
+        """Return the path of the trash"""
+        return self._path
+
+    def move(self, path: PathType) -> Path:
+        """Move path into the trash and return its new location.
+        Raise FileNotFoundError if path does not exist"""
+        path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(path)
+        self._path.mkdir(exist_ok=True)
+        trashed = self._path / f"{path.name}-{uuid4().hex}"
+        rename(path, trashed)
+        return trashed
+
+    @staticmethod
+    def delete_in_background(*paths: Path) -> None:
+        """Delete paths in a detached process that outlives hekit"""
+        if paths:
+            # pylint: disable-next=consider-using-with
+            Popen(  # nosec B603 B607
+                ["rm", "-rf", "--", *map(str, paths)],
+                stdin=DEVNULL,
+                stdout=DEVNULL,
+                stderr=DEVNULL,
+                start_new_session=True,
+            )
+
+    def purge(self, workers: int = 8) -> int:
+        """Delete the content of the trash on a pool of threads,
+        return the number of entries deleted"""
+        try:
+            entries = [self._path / entry for entry in listdir(self._path)]
+        except FileNotFoundError:
+            return 0
+
+        # Large build trees are deleted faster by deleting
+        # their top-level children concurrently
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(delete, chain.from_iterable(map(children, entries))))
+            list(executor.map(delete, entries))
+
+        with suppress(OSError):
+            self._path.rmdir()
+        return len(entries)
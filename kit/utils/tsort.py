@@ -3,7 +3,7 @@
 
 """Module providing a topological sort"""
 
-from typing import Set, Any
+from typing import Any, Hashable, Iterator
 
 
 class CycleError(Exception):
@@ -14,22 +14,113 @@ def tsort(G: dict):
     """Topological sort of graph G"""
     # Following Python 3.9 TopologicalSorter.static_order();
     # The dict values are the nodes pointing to the keys.
+    # Iterative depth first search, nodes on the current path
+    # are tracked in a set to detect cycles in constant time.
+    visited: set[Any] = set()
 
-    def dfs(node, path):
-        """Recursive generator. Depth first search."""
-        if len(path) > 1 and path[0] == path[-1]:
-            raise CycleError(f"cycle:{path}")
-        if node in visited:
+    for root in G.keys():
+        if root in visited:
+            continue
+        visited.add(root)
+        path = [root]
+        on_path = {root}
+        stack = [iter(G.get(root, ()))]
+        while stack:
+            for next_node in stack[-1]:
+                if next_node in on_path:
+                    cycle = [*path[path.index(next_node) :], next_node]
+                    raise CycleError(f"cycle:{cycle}")
+                if next_node not in visited:
+                    visited.add(next_node)
+                    path.append(next_node)
+                    on_path.add(next_node)
+                    stack.append(iter(G.get(next_node, ())))
+                    break
+            else:
+                # All the nodes pointing to the top node were yielded
+                stack.pop()
+                node = path.pop()
+                on_path.remove(node)
+                yield node
+
+
+class TopologicalSorter:
+    """Kahn's algorithm over graph G, where the dict values are the nodes
+    pointing to the keys. Following Python 3.9 TopologicalSorter, nodes
+    whose predecessors are all done are handed out together by get_ready"""
+
+    def __init__(self, G: dict) -> None:
+        """Build the graph and raise CycleError if G is not a DAG"""
+        self._successors: dict[Hashable, list[Hashable]] = {}
+        self._npredecessors: dict[Hashable, int] = {}
+        for node, predecessors in G.items():
+            self._npredecessors.setdefault(node, 0)
+            for pred in predecessors:
+                self._npredecessors.setdefault(pred, 0)
+                self._npredecessors[node] += 1
+                self._successors.setdefault(pred, []).append(node)
+
+        self._ready = [n for n, count in self._npredecessors.items() if count == 0]
+        self._nfinished = 0
+        self._check_for_cycles()
+
+    def _check_for_cycles(self) -> None:
+        """Run the algorithm on a copy of the counters. The nodes
+        that are never released are in a cycle or after one"""
+        npredecessors = self._npredecessors.copy()
+        queue = list(self._ready)
+        for node in queue:
+            for succ in self._successors.get(node, ()):
+                npredecessors[succ] -= 1
+                if npredecessors[succ] == 0:
+                    queue.append(succ)
+
+        if len(queue) == len(npredecessors):
             return
-        visited.add(node)
-        try:
-            for next_node in G[node]:
-                yield from dfs(next_node, [*path, next_node])
-        except KeyError:
-            pass
-        yield node
-
-    visited: Set[Any] = set()
-
-    for node in G.keys():
-        yield from dfs(node, [node])
+
+        # Every blocked node has a blocked predecessor, follow them back
+        predecessor = {
+            succ: node
+            for node, succs in self._successors.items()
+            if npredecessors[node] > 0
+            for succ in succs
+        }
+        node = next(n for n, count in npredecessors.items() if count > 0)
+        seen: dict[Hashable, int] = {}
+        path: list[Hashable] = []
+        while node not in seen:
+            seen[node] = len(path)
+            path.append(node)
+            node = predecessor[node]
+        cycle = [*path[seen[node] :], node]
+        raise CycleError(f"cycle:{cycle}")
+
+    def get_ready(self) -> tuple:
+        """Return all the nodes whose predecessors are done
+        and that were not returned before"""
+        ready, self._ready = tuple(self._ready), []
+        return ready
+
+    def done(self, *nodes: Hashable) -> None:
+        """Mark nodes as processed, releasing their successors"""
+        for node in nodes:
+            self._nfinished += 1
+            for succ in self._successors.get(node, ()):
+                self._npredecessors[succ] -= 1
+                if self._npredecessors[succ] == 0:
+                    self._ready.append(succ)
+
+    def is_active(self) -> bool:
+        """Return True while there are nodes not marked as done"""
+        return self._nfinished < len(self._npredecessors)
+
+
+def waves(G: dict) -> Iterator[tuple]:
+    """Yield tuples of nodes of graph G without mutual dependencies.
+    The nodes of a wave only depend on the nodes of previous waves"""
+    sorter = TopologicalSorter(G)
+    ready = sorter.get_ready()
+    while ready:
+        yield ready
+        sorter.done(*ready)
+        ready = sorter.get_ready()
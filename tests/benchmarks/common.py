@@ -0,0 +1,56 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""Utilities used by the benchmarks"""
+
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+from typing import Callable
+
+from kit.utils.files import dump_toml
+
+
+def make_repo(path: Path, ncomponents: int, ninstances: int) -> Path:
+    """Create a repo of ncomponents with ninstances each, with the
+    hekit.info and hekit.spec files of successful installs"""
+    usage = {"wall_time": 1.5, "user_time": 1.2, "sys_time": 0.1, "max_rss": 4096}
+    for comp in range(ncomponents):
+        for inst in range(ninstances):
+            root = path / f"comp{comp}" / f"v{inst}"
+            root.mkdir(parents=True)
+            spec = {
+                "name": f"v{inst}",
+                "fetch": f"git clone https://example.com/comp{comp}.git",
+                "build": f"cmake --build {root}/build -j",
+                "install": f"cmake --install {root}/build",
+                "export_install_dir": f"{root}/install",
+            }
+            dump_toml(root / "hekit.spec", {f"comp{comp}": [spec]})
+            dump_toml(
+                root / "hekit.info",
+                {
+                    "status": dict.fromkeys(("fetch", "build", "install"), "success"),
+                    "hash": dict.fromkeys(("fetch", "build", "install"), "0" * 64),
+                    "timings": {
+                        stage: {**usage, "exit_code": 0}
+                        for stage in ("fetch", "build", "install")
+                    },
+                },
+            )
+    return path
+
+
+def timeit(fn: Callable, repeat: int = 5) -> float:
+    """Return the median time of fn in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        times.append(perf_counter() - start)
+    return median(times)
+
+
+def report(name: str, seconds: float) -> None:
+    """Print the time of a benchmark"""
+    print(f"{name:50} {seconds * 1000:10.2f} ms")
@@ -0,0 +1,71 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""Scan time of hekit list on a repo of 1,000 instances, serial and
+concurrent, with an optional latency added to every directory listing and
+file read to emulate a network filesystem.
+Run from the root of the repo with: python -m tests.benchmarks.list_scan"""
+
+import argparse
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest.mock import patch
+
+import kit.commands.list_cmd
+import kit.utils.files
+from kit.commands.list_cmd import list_components
+from kit.utils.files import dump_toml
+from tests.benchmarks.common import make_repo, report, timeit
+
+
+def with_latency(fn, latency):
+    """Return fn delayed by latency seconds"""
+
+    def delayed(*args, **kwargs):
+        sleep(latency)
+        return fn(*args, **kwargs)
+
+    return delayed
+
+
+def main() -> None:
+    """Compare the scan with one thread and with the thread pool"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--latency", type=float, default=0.002, help="seconds added to each I/O"
+    )
+    latency = parser.parse_args().latency
+
+    with TemporaryDirectory() as tmp:
+        repo = make_repo(Path(tmp) / "repo", 20, 50)
+        config_file = Path(tmp) / "default.config"
+        dump_toml(config_file, {"repo_location": str(repo)})
+        args = argparse.Namespace(
+            rescan=True,
+            timings=False,
+            format="text",
+            status=None,
+            component=None,
+            stream=False,
+            size=False,
+        )
+
+        def scan():
+            args.config = str(config_file)
+            with redirect_stdout(StringIO()):
+                list_components(args)
+
+        list_cmd, files = kit.commands.list_cmd, kit.utils.files
+        with patch.object(
+            list_cmd, "list_dirs", with_latency(list_cmd.list_dirs, latency)
+        ), patch.object(files, "loads", with_latency(files.loads, latency)):
+            with patch.object(list_cmd, "_SCAN_WORKERS", 1):
+                report("1000 instances scan serial", timeit(scan, 3))
+            report("1000 instances scan concurrent", timeit(scan, 3))
+
+
+if __name__ == "__main__":
+    main()
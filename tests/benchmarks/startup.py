@@ -0,0 +1,50 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""Startup time of hekit: a new interpreter parsing the command line of
+a sub-command, with the lazy registry and importing every sub-command.
+Run from the root of the repo with: python -m tests.benchmarks.startup"""
+
+import sys
+from pathlib import Path
+from subprocess import DEVNULL, run  # nosec B404
+
+from tests.benchmarks.common import report, timeit
+
+ROOT = Path(__file__).resolve().parents[2]
+
+LAZY = """
+import sys
+sys.argv = ["hekit", *sys.argv[1:]]
+from kit.hekit import parse_cmdline
+parse_cmdline()
+"""
+
+EAGER = """
+from argparse import ArgumentParser
+from kit.utils.constants import Constants
+from kit.utils.subparsers import get_subparsers_kit
+subparsers = ArgumentParser(prog="hekit").add_subparsers()
+for func in get_subparsers_kit(["commands", "tools"], Constants.HEKIT_ROOT_DIR / "kit"):
+    func(subparsers)
+"""
+
+
+def python(code: str, *args: str) -> None:
+    """Run code in a new interpreter"""
+    run(  # nosec B603
+        [sys.executable, "-c", code, *args], cwd=ROOT, stdout=DEVNULL, check=False
+    )
+
+
+def main() -> None:
+    """Compare the startup of hekit list and hekit -h with
+    importing the modules of every sub-command"""
+    report("python", timeit(lambda: python("pass"), 10))
+    report("import every sub-command", timeit(lambda: python(EAGER), 10))
+    report("hekit list --rescan", timeit(lambda: python(LAZY, "list", "--rescan"), 10))
+    report("hekit -h", timeit(lambda: python(LAZY, "-h"), 10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""Parse time of the TOML files read by hekit.
+Run from the root of the repo with: python -m tests.benchmarks.toml_io"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import toml
+
+from kit.utils.files import load_toml
+from kit.utils.spec import spec_cache
+from tests.benchmarks.common import make_repo, report, timeit
+
+RECIPE = Path(__file__).resolve().parents[2] / "recipes" / "default.toml"
+
+
+def main() -> None:
+    """Compare the toml package, load_toml and the spec cache when warm"""
+    report("recipes/default.toml toml", timeit(lambda: toml.load(RECIPE)))
+    report("recipes/default.toml load_toml", timeit(lambda: load_toml(RECIPE)))
+    spec_cache.clear()
+    report("recipes/default.toml spec_cache", timeit(lambda: spec_cache.load(RECIPE)))
+
+    with TemporaryDirectory() as tmp:
+        info_files = sorted(make_repo(Path(tmp), 50, 10).glob("*/*/hekit.info"))
+
+        def load_all(load):
+            for info_file in info_files:
+                load(info_file)
+
+        report("500 hekit.info toml", timeit(lambda: load_all(toml.load)))
+        report("500 hekit.info load_toml", timeit(lambda: load_all(load_toml)))
+        spec_cache.clear()
+        report("500 hekit.info spec_cache", timeit(lambda: load_all(spec_cache.load)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from kit.commands.gc import collect_garbage, root_instances
+from kit.utils.constants import Constants
+from kit.utils.files import dump_toml
+from kit.utils.status_index import StatusIndex
+from tests.common_utils import create_config_file
+from tests.test_util_dependencies import make_instance
+
+
+def test_root_instances(tmp_path):
+    recipe = tmp_path / "recipe.toml"
+    dump_toml(
+        recipe,
+        {"hexl": [{"name": "1.2.3"}, {"name": "!version!"}], "ntl": [{"name": "11"}]},
+    )
+    assert root_instances([recipe], str(tmp_path), {"version": "1.2.4"}) == {
+        "hexl/1.2.3",
+        "hexl/1.2.4",
+        "ntl/11",
+    }
+
+
+def test_root_instances_expand_references(tmp_path):
+    recipe = tmp_path / "recipe.toml"
+    dump_toml(
+        recipe,
+        {
+            "hexl": [{"name": "%version%-!build!", "version": "1.2.4"}],
+            "helib": [
+                {
+                    "name": "with-%hexl_name%",
+                    "hexl": "hexl/1.2.4-!build!",
+                    "hexl_name": "$%hexl%/name$",
+                }
+            ],
+        },
+    )
+    roots = root_instances([recipe], str(tmp_path), {"build": "debug"})
+    assert roots == {"hexl/1.2.4-debug", "helib/with-1.2.4-debug"}
+
+
+def test_gc_is_a_reserved_command():
+    """Plugins cannot take the name of the sub-command"""
+    assert "gc" in Constants.HEKIT_COMMANDS
+
+
+def test_gc_reports_unused_instances(mocker, args, repo):
+    mock_print = mocker.patch("kit.commands.gc.print")
+
+    collect_garbage(args)
+    printed = [call.args[0] for call in mock_print.call_args_list]
+    assert [line.split()[0] for line in printed[:-1]] == [
+        "hexl/1.2.4",
+        "palisade/v1.11.6",
+    ]
+    assert printed[-1].startswith("2 unused instances using ")
+    assert (repo / "hexl" / "1.2.4").exists()
+
+
+def test_gc_removes_unused_instances(mocker, args, repo):
+    mock_popen = mocker.patch("kit.utils.trash.Popen")
+    mocker.patch("kit.commands.gc.print")
+    mocker.patch("kit.commands.gc.input", return_value="y")
+    StatusIndex(repo).rebuild({"hexl/1.2.4": {}, "palisade/v1.11.6": {}})
+    args.remove = True
+
+    collect_garbage(args)
+    assert not (repo / "hexl" / "1.2.4").exists()
+    assert not (repo / "palisade").exists()
+    assert (repo / "hexl" / "1.2.3").exists()
+    assert (repo / "ntl" / "11.5.1").exists()
+    assert StatusIndex(repo).load() == {}
+    assert ["rm", "-rf", "--"] == mock_popen.call_args.args[0][:3]
+    assert 2 == len(mock_popen.call_args.args[0][3:])
+
+
+def test_gc_answer_no(mocker, args, repo):
+    mocker.patch("kit.commands.gc.print")
+    mock_input = mocker.patch("kit.commands.gc.input", return_value="n")
+    args.remove = True
+
+    collect_garbage(args)
+    mock_input.assert_called_once()
+    assert (repo / "hexl" / "1.2.4").exists()
+
+
+def test_gc_nothing_unused(mocker, args, repo):
+    mock_print = mocker.patch("kit.commands.gc.print")
+    dump_toml(
+        args.recipe_files[0],
+        {"helib": [{"name": "v2.2.1"}], "palisade": [{"name": "v1.11.6"}]},
+    )
+    (repo / "hexl" / "1.2.4" / "hekit.spec").unlink()
+    (repo / "hexl" / "1.2.4").rmdir()
+
+    collect_garbage(args)
+    mock_print.assert_called_once_with("No unused instances")
+
+
+"""Utilities used by the tests"""
+
+
+class MockArgs:
+    def __init__(self, repo):
+        self.config = create_config_file(repo)
+        self.recipe_files = [repo.parent / "recipe.toml"]
+        self.recipe_arg = {}
+        self.remove = False
+        self.y = True
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    make_instance(repo, "hexl", "1.2.3")
+    make_instance(repo, "hexl", "1.2.4")
+    make_instance(repo, "ntl", "11.5.1")
+    make_instance(repo, "helib", "v2.2.1", hexl="hexl/1.2.3", ntl="ntl/11.5.1")
+    make_instance(repo, "palisade", "v1.11.6", hexl="hexl/1.2.3")
+    return repo
+
+
+@pytest.fixture
+def args(repo):
+    args = MockArgs(repo)
+    dump_toml(args.recipe_files[0], {"helib": [{"name": "v2.2.1"}]})
+    return args
@@ -3,7 +3,12 @@
 
 import pytest
 from pathlib import Path
-from kit.commands.install import install_components, get_recipe_arg_dict
+from argparse import ArgumentTypeError
+from kit.commands.install import (
+    install_components,
+    get_recipe_arg_dict,
+    get_jobs_number,
+)
 
 
 def test_install_components_all_unskipped(mocker, args, unskipped_components):
@@ -17,10 +22,10 @@ def test_install_components_all_unskipped(mocker, args, unskipped_components):
     install_components(args)
     mock_component.assert_called_once()
     mock_component.assert_called_with(
-        args.recipe_file, args.config.repo_location, args.recipe_arg
+        args.recipe_file, args.config.repo_location, args.recipe_arg, args.verbose
     )
     mock_print.assert_called_with(
-        "[HEKIT]", "component/instance:", "component_test/instance_test"
+        "[HEKIT] component/instance: component_test/instance_test\n", end=""
     )
     assert 3 == mock_print.call_count
 
@@ -36,10 +41,10 @@ def test_install_components_all_skipped(mocker, args, skipped_components):
     install_components(args)
     mock_component.assert_called_once()
     mock_component.assert_called_with(
-        args.recipe_file, args.config.repo_location, args.recipe_arg
+        args.recipe_file, args.config.repo_location, args.recipe_arg, args.verbose
     )
     mock_print.assert_called_with(
-        "[HEKIT]", "Skipping component/instance:", "component_test/instance_test"
+        "[HEKIT] Skipping component/instance: component_test/instance_test\n", end=""
     )
     assert 6 == mock_print.call_count
 
@@ -55,14 +60,33 @@ def test_install_components_one_unskipped(mocker, args, one_unskipped_component)
     install_components(args)
     mock_component.assert_called_once()
     mock_component.assert_called_with(
-        args.recipe_file, args.config.repo_location, args.recipe_arg
+        args.recipe_file, args.config.repo_location, args.recipe_arg, args.verbose
     )
     mock_print.assert_called_with(
-        "[HEKIT]", "Skipping component/instance:", "component_test/instance_test"
+        "[HEKIT] Skipping component/instance: component_test/instance_test\n", end=""
     )
     assert 5 == mock_print.call_count
 
 
+def test_install_components_plan(mocker, args):
+    """The plan is printed and nothing is installed"""
+    mock_plan = mocker.patch("kit.commands.install.plan_components_from_recipe_file")
+    mock_install = mocker.patch(
+        "kit.commands.install.install_components_from_recipe_file"
+    )
+    args.plan = True
+
+    install_components(args)
+    mock_plan.assert_called_once_with(
+        args.recipe_file,
+        args.upto_stage,
+        args.config.repo_location,
+        args.force,
+        args.recipe_arg,
+    )
+    mock_install.assert_not_called()
+
+
 def test_get_recipe_arg_dict_correct_format():
     act_arg = "key1=value1, key2=value2, key3=value3"
     exc_dict = {"key1": "value1", "key2": "value2", "key3": "value3"}
@@ -96,6 +120,16 @@ def test_get_recipe_arg_dict_missing_comma():
     )
 
 
+def test_get_jobs_number_correct_value():
+    assert 8 == get_jobs_number("8")
+
+
+@pytest.mark.parametrize("jobs", ["0", "-2", "two"])
+def test_get_jobs_number_wrong_value(jobs):
+    with pytest.raises(ArgumentTypeError):
+        get_jobs_number(jobs)
+
+
 """Utilities used by the tests"""
 
 
@@ -107,6 +141,9 @@ class MockArgs:
         self.upto_stage = "install"
         self.force = False
         self.recipe_arg = {"version": "1.2.3"}
+        self.jobs = 1
+        self.verbose = False
+        self.plan = False
 
 
 class MockComponent:
@@ -117,6 +154,9 @@ class MockComponent:
     def skip(self):
         return self._skip
 
+    def cached_install(self):
+        return False
+
     def component_name(self):
         return "component_test"
 
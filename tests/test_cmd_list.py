@@ -1,9 +1,15 @@
 # Copyright (C) 2022 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
+import csv
+import io
+import json
 import pytest
 from pathlib import Path
 from kit.commands.list_cmd import list_components, RepoProperties, _SEP_SPACES
+from kit.utils.files import dump_toml, load_toml
+from kit.utils.status_index import StatusIndex
+from tests.common_utils import create_config_file
 
 
 def test_get_repo_properties_max_width(mocker):
@@ -228,6 +234,279 @@ def test_list_components_KeyError_exception(
     mock_print.assert_called_with(arg1, arg2, arg3, arg4, arg5)
 
 
+def test_list_timings(mocker, args, lib_directory, name_version_lib):
+    mocker.patch("kit.utils.files.walk", side_effect=lib_directory)
+    usage = {
+        "wall_time": 12.5,
+        "user_time": 40.25,
+        "sys_time": 2.0,
+        "max_rss": 2048,
+        "exit_code": 0,
+    }
+    mocker.patch(
+        "kit.commands.list_cmd.load_toml",
+        return_value={"status": {}, "timings": {"build": usage}},
+    )
+    mock_print = mocker.patch("kit.commands.list_cmd.print")
+    args.timings = True
+
+    list_components(args)
+    assert 2 == mock_print.call_count
+    exp_lib, exp_version = name_version_lib
+    _, column1 = get_width_and_header(exp_lib, exp_version)
+    mock_print.assert_called_with(
+        f"{column1} {'build':9}",
+        f"{12.5:10.2f} {40.25:10.2f}",
+        f"{2.0:10.2f} {2.0:10.1f}",
+        f"{0:10}",
+    )
+
+
+def test_list_components_from_index(mocker, args, tmp_path, all_actions_success):
+    """The index is read instead of the repo"""
+    args.config = create_config_file(tmp_path)
+    args.rescan = False
+    StatusIndex(tmp_path).rebuild(
+        {"hexl/1.2.3": all_actions_success, "helib/v2.2.1": fetch_failure_info()}
+    )
+    mock_walk = mocker.patch("kit.utils.files.walk")
+    mock_load = mocker.patch("kit.commands.list_cmd.load_toml")
+    mock_print = mocker.patch("kit.commands.list_cmd.print")
+
+    list_components(args)
+    mock_walk.assert_not_called()
+    mock_load.assert_not_called()
+    assert 3 == mock_print.call_count
+    width, _ = get_width_and_header("helib", "v2.2.1")
+    mock_print.assert_any_call(
+        f"{'helib':11} {'v2.2.1':10}",
+        f"{'failure':{width}}",
+        f"{'':{width}}",
+        f"{'':{width}}",
+    )
+
+
+def test_list_components_rescan_rebuilds_index(
+    mocker, args, tmp_path, all_actions_success
+):
+    args.config = create_config_file(tmp_path)
+    info_dir = tmp_path / "hexl" / "1.2.3"
+    info_dir.mkdir(parents=True)
+    dump_toml(info_dir / "hekit.info", all_actions_success)
+    mock_print = mocker.patch("kit.commands.list_cmd.print")
+
+    list_components(args)
+    assert 2 == mock_print.call_count
+    assert StatusIndex(tmp_path).load() == {"hexl/1.2.3": all_actions_success}
+
+
+def test_list_components_from_index_shows_broken_instances(
+    mocker, args, tmp_path, all_actions_success
+):
+    """Instances without info file are listed the same with and without index"""
+    args.config = create_config_file(tmp_path)
+    (tmp_path / "hexl" / "1.2.3").mkdir(parents=True)
+    dump_toml(tmp_path / "hexl" / "1.2.3" / "hekit.info", all_actions_success)
+    (tmp_path / "ntl" / "11.5.1").mkdir(parents=True)
+    mock_print = mocker.patch("kit.commands.list_cmd.print")
+
+    list_components(args)
+    scanned = mock_print.call_args_list
+    info_file = tmp_path / "ntl" / "11.5.1" / "hekit.info"
+    assert scanned[-1].args[-1] == f"file '{info_file}' not found"
+    assert StatusIndex(tmp_path).load()["ntl/11.5.1"] == {
+        "error": f"file '{info_file}' not found"
+    }
+
+    mock_print.reset_mock()
+    args.config = create_config_file(tmp_path)
+    args.rescan = False
+    list_components(args)
+    assert mock_print.call_args_list == scanned
+
+
+def test_list_components_json(args, tmp_path, capsys, all_actions_success):
+    args.config = create_config_file(tmp_path)
+    args.format = "json"
+    make_instance(tmp_path, "hexl", "1.2.3", all_actions_success)
+    make_instance(tmp_path, "helib", "v2.2.1", fetch_failure_info())
+
+    list_components(args)
+    records = json.loads(capsys.readouterr().out)
+    assert [r["component"] for r in records] == ["helib", "hexl"]
+    assert records[1] == {
+        "component": "hexl",
+        "instance": "1.2.3",
+        "fetch": "success",
+        "build": "success",
+        "install": "success",
+        "error": "",
+    }
+
+
+def test_list_components_json_stream(args, tmp_path, capsys, all_actions_success):
+    args.config = create_config_file(tmp_path)
+    args.format = "json"
+    args.stream = True
+    make_instance(tmp_path, "hexl", "1.2.3", all_actions_success)
+    make_instance(tmp_path, "hexl", "1.2.4", all_actions_success)
+
+    list_components(args)
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["instance"] for line in lines] == ["1.2.3", "1.2.4"]
+
+
+def test_list_components_csv_timings(args, tmp_path, capsys):
+    args.config = create_config_file(tmp_path)
+    args.format = "csv"
+    args.timings = True
+    usage = {
+        "wall_time": 1.5,
+        "user_time": 1.0,
+        "sys_time": 0.5,
+        "max_rss": 1024,
+        "exit_code": 0,
+    }
+    info = {"status": {"fetch": "success", "build": "", "install": ""}}
+    make_instance(tmp_path, "hexl", "1.2.3", {**info, "timings": {"fetch": usage}})
+
+    list_components(args)
+    rows = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+    assert len(rows) == 1
+    assert rows[0]["fetch"] == "success"
+    assert rows[0]["fetch_wall_time"] == "1.5"
+    assert rows[0]["build_wall_time"] == ""
+
+
+def test_list_components_filters(args, tmp_path, capsys, all_actions_success):
+    args.config = create_config_file(tmp_path)
+    args.format = "json"
+    make_instance(tmp_path, "hexl", "1.2.3", all_actions_success)
+    make_instance(tmp_path, "hexl", "1.2.4", fetch_failure_info())
+    make_instance(tmp_path, "helib", "v2.2.1", fetch_failure_info())
+    (tmp_path / "seal" / "4.0.0").mkdir(parents=True)
+
+    args.status = "failure"
+    list_components(args)
+    records = json.loads(capsys.readouterr().out)
+    assert [r["instance"] for r in records] == ["v2.2.1", "1.2.4"]
+
+    args.config = create_config_file(tmp_path)
+    args.component = "hexl"
+    args.rescan = False
+    list_components(args)
+    records = json.loads(capsys.readouterr().out)
+    assert [r["instance"] for r in records] == ["1.2.4"]
+
+    args.config = create_config_file(tmp_path)
+    args.component = None
+    args.rescan = True
+    args.status = "unknown"
+    list_components(args)
+    records = json.loads(capsys.readouterr().out)
+    assert [(r["component"], r["error"] != "") for r in records] == [("seal", True)]
+
+
+def test_list_components_component_filter_keeps_index(
+    args, tmp_path, all_actions_success, mocker
+):
+    """A scan of one component updates its entries without dropping the rest"""
+    args.config = create_config_file(tmp_path)
+    make_instance(tmp_path, "hexl", "1.2.3", all_actions_success)
+    make_instance(tmp_path, "helib", "v2.2.1", fetch_failure_info())
+    mocker.patch("kit.commands.list_cmd.print")
+    list_components(args)
+
+    args.config = create_config_file(tmp_path)
+    args.component = "hexl"
+    list_components(args)
+    assert set(StatusIndex(tmp_path).load()) == {"hexl/1.2.3", "helib/v2.2.1"}
+
+
+def test_list_components_concurrent_scan_is_sorted(
+    mocker, args, tmp_path, capsys, all_actions_success
+):
+    mocker.patch("kit.commands.list_cmd._SCAN_WORKERS", 8)
+    args.config = create_config_file(tmp_path)
+    args.format = "json"
+    expected = [(f"comp{c}", f"v{i}") for c in range(5) for i in range(20)]
+    for comp_name, comp_inst in reversed(expected):
+        make_instance(tmp_path, comp_name, comp_inst, all_actions_success)
+    exp_structure = {f"comp{c}": sorted(f"v{i}" for i in range(20)) for c in range(5)}
+    assert RepoProperties(tmp_path).structure == exp_structure
+
+    list_components(args)
+    records = json.loads(capsys.readouterr().out)
+    assert [(r["component"], r["instance"]) for r in records] == sorted(expected)
+
+
+def test_get_repo_properties_skips_trash(tmp_path):
+    (tmp_path / ".trash" / "1.2.3-0123").mkdir(parents=True)
+    (tmp_path / "hexl" / "1.2.4").mkdir(parents=True)
+
+    assert RepoProperties(tmp_path).structure == {"hexl": ["1.2.4"]}
+
+
+def test_list_sizes(mocker, args, tmp_path, all_actions_success):
+    args.config = create_config_file(tmp_path)
+    args.size = True
+    sizes = {"fetch": 1024, "build": 3 * 1024**3, "install": 0, "total": 3 * 1024**3}
+    make_instance(tmp_path, "hexl", "1.2.3", {**all_actions_success, "sizes": sizes})
+    mock_instance_sizes = mocker.patch("kit.commands.list_cmd.instance_sizes")
+    mock_print = mocker.patch("kit.commands.list_cmd.print")
+
+    list_components(args)
+    mock_instance_sizes.assert_not_called()
+    mock_print.assert_called_with(
+        f"{'hexl':11} {'1.2.3':10}",
+        f"{'1.0K':>10}",
+        f"{'3.0G':>10}",
+        f"{'0B':>10}",
+        f"{'3.0G':>10}",
+    )
+
+
+def test_list_sizes_backfills_old_instances(
+    args, tmp_path, capsys, all_actions_success
+):
+    args.config = create_config_file(tmp_path)
+    args.format = "json"
+    args.size = True
+    make_instance(tmp_path, "hexl", "1.2.3", all_actions_success)
+    build_dir = tmp_path / "hexl" / "1.2.3" / "build"
+    build_dir.mkdir()
+    (build_dir / "lib.a").write_bytes(b"x" * 100_000)
+
+    list_components(args)
+    (record,) = json.loads(capsys.readouterr().out)
+    assert record["sizes"]["build"] >= 100_000
+    assert record["sizes"]["fetch"] == 0
+    info = load_toml(tmp_path / "hexl" / "1.2.3" / "hekit.info")
+    assert info["sizes"] == record["sizes"]
+    assert StatusIndex(tmp_path).load()["hexl/1.2.3"]["sizes"] == record["sizes"]
+
+    # Backfilled from the index too, and only once
+    (tmp_path / "hexl" / "1.2.4").mkdir()
+    dump_toml(tmp_path / "hexl" / "1.2.4" / "hekit.info", all_actions_success)
+    StatusIndex(tmp_path).update("hexl", "1.2.4", all_actions_success)
+    args.config = create_config_file(tmp_path)
+    args.rescan = False
+    list_components(args)
+    records = json.loads(capsys.readouterr().out)
+    assert records[0]["sizes"] == info["sizes"]
+    assert StatusIndex(tmp_path).load()["hexl/1.2.4"]["sizes"]["total"] >= 0
+
+
+def test_list_json_without_size(args, tmp_path, capsys, all_actions_success):
+    args.config = create_config_file(tmp_path)
+    args.format = "json"
+    make_instance(tmp_path, "hexl", "1.2.3", {**all_actions_success, "sizes": {}})
+
+    list_components(args)
+    (record,) = json.loads(capsys.readouterr().out)
+    assert "sizes" not in record
+
+
 """Utilities used by the tests"""
 
 
@@ -235,6 +514,13 @@ class MockArgs:
     def __init__(self):
         self.tests_path = Path(__file__).resolve().parent
         self.config = f"{self.tests_path}/input_files/default.config"
+        self.timings = False
+        self.rescan = True
+        self.format = "text"
+        self.status = None
+        self.component = None
+        self.stream = False
+        self.size = False
 
 
 @pytest.fixture
@@ -242,6 +528,12 @@ def args():
     return MockArgs()
 
 
+@pytest.fixture(autouse=True)
+def serial_scan(mocker):
+    """The mocked directory walks return their results in order of call"""
+    mocker.patch("kit.commands.list_cmd._SCAN_WORKERS", 1)
+
+
 @pytest.fixture
 def tree_directory():
     return [
@@ -300,6 +592,16 @@ def install_failure():
     return {"status": {"fetch": "success", "build": "success", "install": "failure"}}
 
 
+def make_instance(repo, comp_name, comp_inst, info):
+    info_dir = repo / comp_name / comp_inst
+    info_dir.mkdir(parents=True)
+    dump_toml(info_dir / "hekit.info", info)
+
+
+def fetch_failure_info():
+    return {"status": {"fetch": "failure", "build": "", "install": ""}}
+
+
 def get_width_and_header(comp_name, comp_inst, separation_spaces=_SEP_SPACES):
     width = 10
 
@@ -2,6 +2,9 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import pytest
+import tarfile
+from hashlib import sha256
+from io import BytesIO
 from shutil import make_archive
 from pathlib import Path
 from kit.utils.constants import Constants, PluginsConfig, PluginState
@@ -188,29 +191,113 @@ def test_move_plugin_data_dir(tmp_path):
 
 
 def test_move_plugin_data_tar(tmp_path):
-    """Verify that the SW extracts correctly the plugin in a tarball file"""
+    """Verify that the SW moves correctly the plugin extracted from a tarball file"""
     plugin_name = "test"
     plugin_type = PluginType.TAR
     plugin_path = create_plugins_files(
         plugin_name, tmp_path, plugin_type, with_file=True
     )
+    staging_path = tmp_path / "staging"
     dest_path = create_tmp_directory(tmp_path)
 
-    move_plugin_data(plugin_name, plugin_path, plugin_type, dest_path)
-    assert (dest_path / plugin_name).exists()
+    check_plugin_structure(plugin_path, plugin_type, staging_path)
+    move_plugin_data(plugin_name, staging_path, plugin_type, dest_path)
+    assert (dest_path / plugin_name / "plugin.toml").exists()
+    assert not (staging_path / plugin_name).exists()
 
 
 def test_move_plugin_data_zip(tmp_path):
-    """Verify that the SW extracts correctly the plugin in a zip file"""
+    """Verify that the SW moves correctly the plugin extracted from a zip file"""
     plugin_name = "test"
     plugin_type = PluginType.ZIP
     plugin_path = create_plugins_files(
         plugin_name, tmp_path, plugin_type, with_file=True
     )
+    staging_path = tmp_path / "staging"
     dest_path = create_tmp_directory(tmp_path)
 
-    move_plugin_data(plugin_name, plugin_path, plugin_type, dest_path)
-    assert (dest_path / plugin_name).exists()
+    check_plugin_structure(plugin_path, plugin_type, staging_path)
+    move_plugin_data(plugin_name, staging_path, plugin_type, dest_path)
+    assert (dest_path / plugin_name / "plugin.toml").exists()
+    assert not (staging_path / plugin_name).exists()
+
+
+@pytest.mark.parametrize("plugin_type", [PluginType.TAR, PluginType.ZIP])
+def test_check_plugin_structure_bundle(tmp_path, plugin_type):
+    """Verify that the SW extracts and checks all the
+    plugins of an archive in a single pass"""
+    bundle_path = tmp_path / "bundle"
+    bundle_path.mkdir()
+    for plugin_name in ("test-a", "test_b", "test_c"):
+        create_plugins_files(plugin_name, bundle_path, PluginType.DIR, with_file=True)
+    (bundle_path / "test-a").rename(bundle_path / "test_a")
+    plugin_path = make_bundle(bundle_path, plugin_type)
+    staging_path = tmp_path / "staging"
+
+    act_settings = check_plugin_structure(plugin_path, plugin_type, staging_path)
+    assert [s["name"] for s in act_settings] == ["test-a", "test_b", "test_c"]
+    assert (staging_path / "test_a" / "start_test-a.py").exists()
+    assert (staging_path / "test_c" / "plugin.toml").exists()
+
+
+@pytest.mark.parametrize("plugin_type", [PluginType.TAR, PluginType.ZIP])
+def test_check_plugin_structure_checksum(tmp_path, plugin_type):
+    """Verify that the SW checks the checksum of an archive"""
+    plugin_path = create_plugins_files("test", tmp_path, plugin_type, with_file=True)
+    checksum = sha256(plugin_path.read_bytes()).hexdigest()
+
+    act_settings = check_plugin_structure(plugin_path, plugin_type, None, checksum)
+    assert act_settings[0]["name"] == "test"
+
+    with pytest.raises(InvalidPluginError) as exc_info:
+        check_plugin_structure(plugin_path, plugin_type, None, "0" * 64)
+    assert str(exc_info.value) == (
+        f"Checksum of '{plugin_path.name}' does not match, "
+        f"expected {'0' * 64} but found {checksum}"
+    )
+
+
+def test_check_plugin_structure_tar_wrong_directory(tmp_path):
+    """Verify that the SW raises an error when the
+    directory of a plugin is not named after it"""
+    create_plugins_files("test", tmp_path, PluginType.DIR, with_file=True)
+    (tmp_path / "test").rename(tmp_path / "other")
+    plugin_path = Path(
+        make_archive(tmp_path / "other", "gztar", root_dir=tmp_path, base_dir="other")
+    )
+
+    with pytest.raises(InvalidPluginError) as exc_info:
+        check_plugin_structure(plugin_path, PluginType.TAR)
+    assert str(exc_info.value) == "File 'test/plugin.toml' not found in 'other.tar.gz'"
+
+
+def test_check_plugin_structure_tar_invalid_path(tmp_path):
+    """Verify that the SW refuses members extracted outside the destination"""
+    plugin_path = tmp_path / "evil.tar"
+    with tarfile.open(plugin_path, "w") as f:
+        info = tarfile.TarInfo("../evil.py")
+        f.addfile(info, BytesIO(b""))
+
+    with pytest.raises(InvalidPluginError) as exc_info:
+        check_plugin_structure(plugin_path, PluginType.TAR, tmp_path / "staging")
+    assert str(exc_info.value) == "Invalid path '../evil.py' in 'evil.tar'"
+    assert not (tmp_path / "evil.py").exists()
+
+
+def test_install_plugin_sha256_of_dir(mocker, tmp_path):
+    """Verify that the SW reports an error when a
+    checksum is given for a plugin directory"""
+    plugin_path = create_plugins_files("test", tmp_path, PluginType.DIR, with_file=True)
+    args = MockArgs(plugin_path)
+    args.sha256 = "0" * 64
+    Mockers(mocker)
+
+    with pytest.raises(ValueError) as exc_info:
+        install_plugin(args)
+    assert (
+        str(exc_info.value)
+        == "Flag '--sha256' can only be used with tarball or zip files"
+    )
 
 
 def test_are_plugin_args_correct_elements(mocker):
@@ -569,6 +656,59 @@ def test_refresh_plugins_correct(mocker, tmp_path):
     )
 
 
+def test_refresh_plugins_records_sub_command(mocker, tmp_path):
+    """Verify that the SW records the sub-command of the plugin
+    and the function that creates its parser"""
+    plugin_name = "test"
+    plugin_path = create_plugins_files(
+        plugin_name, tmp_path, PluginType.DIR, with_file=True
+    )
+    (plugin_path / f"start_{plugin_name}.py").write_text(
+        "def set_test_subparser(subparsers):\n"
+        "   subparsers.add_parser('test', description='tests things')\n"
+    )
+    args = MockArgs(plugin_path)
+    args.root_dir = tmp_path
+    mockers = Mockers(mocker)
+
+    refresh_plugins(args)
+    mockers.mock_dump_toml.assert_called_with(
+        PluginsConfig.FILE,
+        {
+            "plugins": {
+                "test": {
+                    "version": "1.0.0",
+                    "state": "enabled",
+                    "start": "start_test.py",
+                    "command": "test",
+                    "function": "set_test_subparser",
+                    "description": "tests things",
+                }
+            }
+        },
+    )
+
+
+def test_install_plugin_checks_installed_sub_commands(mocker, tmp_path):
+    """Verify that the SW checks the new sub-command against those of the
+    installed plugins, as they are not registered by 'hekit plugins'"""
+    plugin_name = "test1"
+    plugin_path = create_plugins_files(
+        plugin_name, tmp_path, PluginType.DIR, with_file=True
+    )
+    args = MockArgs(plugin_path)
+    args.hekit_parsers_list = ["list"]
+    Mockers(mocker)
+    mock_args_correct = mocker.patch(
+        "kit.commands.plugin.are_plugin_args_correct", return_value=False
+    )
+
+    install_plugin(args)
+    mock_args_correct.assert_called_once_with(
+        plugin_name, False, ["list", "plugin1", "plugin2"]
+    )
+
+
 """Utilities used by the tests"""
 
 
@@ -629,6 +769,11 @@ def create_plugins_files(plugin_name, tmp_path, plugin_type, with_file=False):
         return tmp_path / f"{plugin_name}.zip"
 
 
+def make_bundle(bundle_path, plugin_type):
+    archive_format = "gztar" if plugin_type == PluginType.TAR else "zip"
+    return Path(make_archive(bundle_path, archive_format, root_dir=bundle_path))
+
+
 def create_config_file(filepath):
     with filepath.open("w") as f:
         for k, v in get_plugin_config_dict().items():
@@ -647,6 +792,7 @@ class MockArgs:
         self.force = False
         self.all = False
         self.hekit_parsers_list = {}
+        self.sha256 = None
 
 
 class Mockers:
@@ -4,10 +4,13 @@
 import pytest
 from pathlib import Path
 from kit.commands.remove import remove_components
+from kit.utils.trash import Trash
+from tests.common_utils import create_config_file
+from tests.test_util_dependencies import make_instance
 
 
 def test_remove_instance_of_component_with_many_instances(mocker, args):
-    mock_rmtree = mocker.patch("kit.commands.remove.rmtree")
+    mock_move = mock_trash(mocker)
     mock_print = mocker.patch("kit.commands.remove.print")
     mock_listdir = mocker.patch("kit.commands.remove.listdir", return_value=["v2.3.2"])
     text = f"Instance '{args.instance}' of component '{args.component}' successfully removed"
@@ -16,29 +19,30 @@ def test_remove_instance_of_component_with_many_instances(mocker, args):
     path = f"{args.config.repo_location}/{args.component}/{args.instance}"
     mock_print.assert_called_once()
     mock_print.assert_called_with(text)
-    mock_rmtree.assert_called_once()
-    mock_rmtree.assert_called_with(path)
+    mock_move.assert_called_once()
+    mock_move.assert_called_with(path)
     mock_listdir.assert_called_once()
 
 
 def test_remove_instance_of_component_with_single_instance(mocker, args):
-    mock_rmtree = mocker.patch("kit.commands.remove.rmtree")
+    mock_move = mock_trash(mocker)
     mock_print = mocker.patch("kit.commands.remove.print")
     mock_listdir = mocker.patch("kit.commands.remove.listdir", return_value=[])
+    mock_rmdir = mocker.patch("kit.commands.remove.rmdir")
     text = f"Instance '{args.instance}' of component '{args.component}' successfully removed"
 
     remove_components(args)
     path = f"{args.config.repo_location}/{args.component}"
     mock_print.assert_called_once()
     mock_print.assert_called_with(text)
-    assert 2 == mock_rmtree.call_count
-    mock_rmtree.assert_called_with(path)
+    mock_move.assert_called_once_with(f"{path}/{args.instance}")
+    mock_rmdir.assert_called_once_with(path)
     mock_listdir.assert_called_once()
 
 
 def test_remove_all_instances_answer_yes(mocker, args):
     args.instance = None
-    mock_rmtree = mocker.patch("kit.commands.remove.rmtree")
+    mock_move = mock_trash(mocker)
     mock_print = mocker.patch("kit.commands.remove.print")
     mock_listdir = mocker.patch("kit.commands.remove.listdir", return_value=[])
     mock_input = mocker.patch("kit.commands.remove.input", return_value="y")
@@ -48,22 +52,22 @@ def test_remove_all_instances_answer_yes(mocker, args):
     path = f"{args.config.repo_location}/{args.component}"
     mock_print.assert_called_once()
     mock_print.assert_called_with(text)
-    mock_rmtree.assert_called_once()
-    mock_rmtree.assert_called_with(path)
+    mock_move.assert_called_once()
+    mock_move.assert_called_with(path)
     mock_listdir.assert_not_called()
     mock_input.assert_called_once()
 
 
 def test_remove_all_instances_answer_no(mocker, args):
     args.instance = None
-    mock_rmtree = mocker.patch("kit.commands.remove.rmtree")
+    mock_move = mock_trash(mocker)
     mock_print = mocker.patch("kit.commands.remove.print")
     mock_listdir = mocker.patch("kit.commands.remove.listdir", return_value=[])
     mock_input = mocker.patch("kit.commands.remove.input", return_value="n")
 
     remove_components(args)
     mock_print.assert_not_called()
-    mock_rmtree.assert_not_called()
+    mock_move.assert_not_called()
     mock_listdir.assert_not_called()
     mock_input.assert_called_once()
 
@@ -72,9 +76,11 @@ def test_remove_all_components_answer_yes(mocker, args):
     args.all = True
     args.instance = ""
     args.component = ""
-    mock_rmtree = mocker.patch("kit.commands.remove.rmtree")
+    mock_move = mock_trash(mocker)
     mock_print = mocker.patch("kit.commands.remove.print")
-    mock_listdir = mocker.patch("kit.commands.remove.listdir", return_value=[])
+    mock_listdir = mocker.patch(
+        "kit.commands.remove.listdir", return_value=[".trash", "hexl", "seal"]
+    )
     mock_input = mocker.patch("kit.commands.remove.input", return_value="y")
     text = f"All components successfully removed"
 
@@ -82,9 +88,10 @@ def test_remove_all_components_answer_yes(mocker, args):
     path = f"{args.config.repo_location}"
     mock_print.assert_called_once()
     mock_print.assert_called_with(text)
-    mock_rmtree.assert_called_once()
-    mock_rmtree.assert_called_with(path)
-    mock_listdir.assert_not_called()
+    assert 2 == mock_move.call_count
+    mock_move.assert_any_call(f"{path}/hexl")
+    mock_move.assert_any_call(f"{path}/seal")
+    mock_listdir.assert_called_once_with(path)
     mock_input.assert_called_once()
 
 
@@ -92,21 +99,21 @@ def test_remove_all_components_answer_no(mocker, args):
     args.all = True
     args.instance = ""
     args.component = ""
-    mock_rmtree = mocker.patch("kit.commands.remove.rmtree")
+    mock_move = mock_trash(mocker)
     mock_print = mocker.patch("kit.commands.remove.print")
     mock_listdir = mocker.patch("kit.commands.remove.listdir", return_value=[])
     mock_input = mocker.patch("kit.commands.remove.input", return_value="n")
 
     remove_components(args)
     mock_print.assert_not_called()
-    mock_rmtree.assert_not_called()
+    mock_move.assert_not_called()
     mock_listdir.assert_not_called()
     mock_input.assert_called_once()
 
 
 def test_remove_all_ValueError_exception(mocker, args):
     args.all = True
-    mock_rmtree = mocker.patch("kit.commands.remove.rmtree")
+    mock_move = mock_trash(mocker)
     mock_print = mocker.patch("kit.commands.remove.print")
     mock_listdir = mocker.patch("kit.commands.remove.listdir", return_value=[])
     mock_input = mocker.patch("kit.commands.remove.input", return_value="n")
@@ -121,7 +128,7 @@ def test_remove_all_ValueError_exception(mocker, args):
 
 def test_remove_component_ValueError_exception(mocker, args):
     args.component = ""
-    mock_rmtree = mocker.patch("kit.commands.remove.rmtree")
+    mock_move = mock_trash(mocker)
     mock_print = mocker.patch("kit.commands.remove.print")
     mock_listdir = mocker.patch("kit.commands.remove.listdir", return_value=[])
     mock_input = mocker.patch("kit.commands.remove.input", return_value="n")
@@ -135,9 +142,8 @@ def test_remove_component_ValueError_exception(mocker, args):
 
 
 def test_remove_components_FileNotFoundError_exception(mocker, args):
-    mock_rmtree = mocker.patch(
-        "kit.commands.remove.rmtree", side_effect=FileNotFoundError
-    )
+    mock_move = mock_trash(mocker)
+    mock_move.side_effect = FileNotFoundError
     mock_print = mocker.patch("kit.commands.remove.print")
     mock_listdir = mocker.patch("kit.commands.remove.listdir", return_value=[])
     text = f"Instance '{args.instance}' of component '{args.component}' not found."
@@ -146,11 +152,92 @@ def test_remove_components_FileNotFoundError_exception(mocker, args):
     path = f"{args.config.repo_location}/{args.component}/{args.instance}"
     mock_print.assert_called_once()
     mock_print.assert_called_with("Nothing to remove", text)
-    mock_rmtree.assert_called_once()
-    mock_rmtree.assert_called_with(path)
+    mock_move.assert_called_once()
+    mock_move.assert_called_with(path)
     mock_listdir.assert_not_called()
 
 
+def test_remove_instance_is_moved_to_trash(mocker, args, tmp_path):
+    mock_popen = mocker.patch("kit.utils.trash.Popen")
+    mocker.patch("kit.commands.remove.print")
+    args.config = create_config_file(tmp_path)
+    inst_path = tmp_path / args.component / args.instance
+    (inst_path / "build").mkdir(parents=True)
+    (tmp_path / args.component / "v2").mkdir()
+
+    remove_components(args)
+    assert not inst_path.exists()
+    (trashed,) = (tmp_path / Trash.dirname).iterdir()
+    assert (trashed / "build").is_dir()
+    assert mock_popen.call_args.args[0] == ["rm", "-rf", "--", str(trashed)]
+
+
+def test_remove_purge_trash(mocker, args, tmp_path):
+    mock_print = mocker.patch("kit.commands.remove.print")
+    args.config = create_config_file(tmp_path)
+    args.component = ""
+    args.instance = ""
+    args.purge_trash = True
+    (tmp_path / Trash.dirname / "hexl-1" / "build").mkdir(parents=True)
+
+    remove_components(args)
+    mock_print.assert_called_once_with("1 entries deleted from the trash")
+    assert not (tmp_path / Trash.dirname).exists()
+
+
+def test_remove_purge_trash_ValueError_exception(mocker, args):
+    args.purge_trash = True
+
+    with pytest.raises(ValueError) as execinfo:
+        remove_components(args)
+    assert (
+        str(execinfo.value)
+        == "Flag '--purge-trash' cannot be used when removing components"
+    )
+
+
+def test_remove_instance_required_by_others(mocker, args, tmp_path):
+    mock_popen = mocker.patch("kit.utils.trash.Popen")
+    mocker.patch("kit.commands.remove.print")
+    args.config = create_config_file(tmp_path)
+    args.component, args.instance = "hexl", "1.2.3"
+    make_instance(tmp_path, "hexl", "1.2.3")
+    make_instance(tmp_path, "helib", "v2.2.1", hexl="hexl/1.2.3")
+
+    with pytest.raises(ValueError) as execinfo:
+        remove_components(args)
+    assert str(execinfo.value) == (
+        "'hexl/1.2.3' is required by helib/v2.2.1. Use '--force' to remove anyway"
+    )
+    assert (tmp_path / "hexl" / "1.2.3").exists()
+
+    args.config = create_config_file(tmp_path)
+    args.force = True
+    remove_components(args)
+    assert not (tmp_path / "hexl").exists()
+    mock_popen.assert_called_once()
+
+
+def test_remove_component_required_by_others(mocker, args, tmp_path):
+    mocker.patch("kit.utils.trash.Popen")
+    mocker.patch("kit.commands.remove.print")
+    args.config = create_config_file(tmp_path)
+    args.component, args.instance = "hexl", ""
+    args.y = False
+    make_instance(tmp_path, "hexl", "1.2.3")
+    make_instance(tmp_path, "hexl", "1.2.4")
+    make_instance(tmp_path, "helib", "v2.2.1", hexl="hexl/1.2.4")
+
+    with pytest.raises(ValueError, match="'hexl/1.2.4' is required by helib/v2.2.1"):
+        remove_components(args)
+
+    # Dependents removed together are not in the way
+    args.config = create_config_file(tmp_path)
+    args.component = "helib"
+    remove_components(args)
+    assert not (tmp_path / "helib").exists()
+
+
 """Utilities used by the tests"""
 
 
@@ -162,8 +249,17 @@ class MockArgs:
         self.component = "component"
         self.all = False
         self.y = True
+        self.purge_trash = False
+        self.force = False
 
 
 @pytest.fixture
 def args():
     return MockArgs()
+
+
+def mock_trash(mocker):
+    """Return the mock of the move of the paths into the trash"""
+    mock_trash_class = mocker.patch("kit.commands.remove.Trash")
+    mock_trash_class.dirname = Trash.dirname
+    return mock_trash_class.return_value.move
@@ -45,10 +45,7 @@ def test_gen_primes_negative_start(hekit_path):
     cmd = f"{hekit_path} gen-primes -1 10"
     act_result = execute_process(cmd)
     assert "Error while running subcommand" in act_result.stderr
-    assert (
-        "ValueError('A negative number was found in the input: [-1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10]')"
-        in act_result.stderr
-    )
+    assert "ValueError(\"start '-1' should not be negative\")" in act_result.stderr
     assert 0 != act_result.returncode
 
 
@@ -58,21 +55,18 @@ def test_gen_primes_negative_stop(hekit_path):
     cmd = f"{hekit_path} gen-primes -5 -1"
     act_result = execute_process(cmd)
     assert "Error while running subcommand" in act_result.stderr
-    assert (
-        "ValueError('A negative number was found in the input: [-5, -4, -3, -2, -1]')"
-        in act_result.stderr
-    )
+    assert "ValueError(\"start '-5' should not be negative\")" in act_result.stderr
     assert 0 != act_result.returncode
 
 
 def test_gen_primes_max_stop(hekit_path):
     """Verify that gen-primes cmd triggers an error when
     stop is equal to sys.maxsize"""
-    cmd = f"{hekit_path} gen-primes -5 {sys.maxsize}"
+    cmd = f"{hekit_path} gen-primes 0 {sys.maxsize}"
     act_result = execute_process(cmd)
     assert "Error while running subcommand" in act_result.stderr
     assert (
-        "OverflowError('Python int too large to convert to C ssize_t')"
+        f"ValueError(\"stop '{sys.maxsize}' should not be larger than {2**48}\")"
         in act_result.stderr
     )
     assert 0 != act_result.returncode
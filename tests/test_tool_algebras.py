@@ -2,12 +2,11 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import pytest
-import os.path
 from sys import maxsize
 from argparse import ArgumentTypeError
-from subprocess import CalledProcessError
 
 from kit.tools.algebras import *
+from kit.utils.primes import PrimeTable, factorize_numbers
 
 
 def test_powerset():
@@ -25,36 +24,31 @@ def test_powerset():
 
 
 def test_prime_factors():
-    assert len(list(compute_prime_factors([x for x in range(10)]))) == 10
-    assert list(compute_prime_factors([1])) == [()]
-    assert list(compute_prime_factors([5])) == [(5,)]
-    assert list(compute_prime_factors([12])) == [(2, 2, 3)]
-    # Note that largest prime pre-computed in primes.txt is 139999
-    assert set(compute_prime_factors([24, 10009729])) == set(
-        [(2, 2, 2, 3), (10009729,)]
-    )
+    assert len(list(factorize_numbers([x for x in range(10)]))) == 10
+    assert list(factorize_numbers([1])) == [()]
+    assert list(factorize_numbers([5])) == [(5,)]
+    assert list(factorize_numbers([12])) == [(2, 2, 3)]
+    assert set(factorize_numbers([24, 10009729])) == set([(2, 2, 2, 3), (10009729,)])
 
-    # cmdline factor util hangs with no input
-    # compute_prime_factors should not hang if no input passed in
     with pytest.raises(ValueError):
-        assert list(compute_prime_factors([]))
+        assert list(factorize_numbers([]))
 
     with pytest.raises(ValueError):
-        list(compute_prime_factors([-1]))
+        list(factorize_numbers([-1]))
 
-    with pytest.raises(CalledProcessError):
-        list(compute_prime_factors([7.5]))
+    with pytest.raises(TypeError):
+        list(factorize_numbers([7.5]))
 
 
 def test_find_ms():
     # No inputs given
     with pytest.raises(ValueError):
-        assert list(find_ms(ps=[], ds=[], factorize=compute_prime_factors))
+        assert list(find_ms(ps=[], ds=[], factorize=factorize_numbers))
 
-    assert set(find_ms([12], [5], compute_prime_factors)) == set(
+    assert set(find_ms([12], [5], factorize_numbers)) == set(
         [(12, 5, (11,)), (12, 5, (22621,)), (12, 5, (11, 22621))]
     )
-    assert set(find_ms([2, 3], [2, 3], compute_prime_factors)) == set(
+    assert set(find_ms([2, 3], [2, 3], factorize_numbers)) == set(
         [
             (2, 2, (3,)),
             (2, 3, (7,)),
@@ -72,14 +66,36 @@ def test_find_ms():
     )
 
     with pytest.raises(TypeError):
-        list(find_ms(12, 1, compute_prime_factors))
+        list(find_ms(12, 1, factorize_numbers))
+
+    # Checking for positive integers
+    with pytest.raises(TypeError):
+        list(find_ms([8.5], [1], factorize_numbers))
+    with pytest.raises(TypeError):
+        list(find_ms([4], [1.5], factorize_numbers))
+    with pytest.raises(ValueError):
+        list(find_ms([12], [-1], factorize_numbers))
+    with pytest.raises(ValueError):
+        list(find_ms([-12], [1], factorize_numbers))
+
+
+def test_find_ms_with_cache(mocker, tmp_path):
+    cache = FactorCache(tmp_path / "factors.json")
+    factorize = mocker.Mock(side_effect=factorize_numbers)
+    expected = set(find_ms([2, 3], [2, 3], factorize_numbers))
+    assert set(find_ms([2, 3], [2, 3], factorize, cache)) == expected
+    assert (tmp_path / "factors.json").exists()
 
-    with pytest.raises(CalledProcessError):
-        # Checking for positive integers
-        list(find_ms([8.5], [1], compute_prime_factors))
-        list(find_ms([4], [1.5], compute_prime_factors))
-        list(find_ms([12], [-1], compute_prime_factors))
-        list(find_ms([-12], [1], compute_prime_factors))
+    cache = FactorCache(tmp_path / "factors.json")
+    assert set(find_ms([2, 3], [2, 3], factorize, cache)) == expected
+    factorize.assert_called_once()
+
+
+def test_positive_float():
+    assert positive_float("2.5") == 2.5
+    for string in ("0", "-1", "one"):
+        with pytest.raises(ArgumentTypeError):
+            positive_float(string)
 
 
 def test_phi():
@@ -158,25 +174,19 @@ def test_parse_range():
         parse_range("-1-20")
 
 
-@pytest.fixture
-def primes_file_obj(tmp_path):
-    # a primes.txt needs to be generated for testing
-    # check tools first to see if file exists
-    f_primes = tmp_path / "primes.txt"
-
-    with f_primes.open("w") as f:
-        write_primes(2, 140_000, outfile=f)
-
-    primesObj = PrimesFromFile(f_primes)
-    return f_primes, primesObj
-
-
-def test_PrimesFromFile_obj(primes_file_obj):
-    # Create primes.txt if it doesn't exist
-    f_primes, primes_obj = primes_file_obj
-    assert primes_obj.max == 139_999
-    assert len(primes_obj.primes) == 13_010
+def test_parse_range_for_primes(mocker, tmp_path):
+    table_file = tmp_path / "primes.bin"
+    mocker.patch(
+        "kit.tools.algebras.PrimeTable",
+        side_effect=lambda: PrimeTable(table_file, limit=100, max_limit=1_000_000),
+    )
 
-    # Cleanup
-    if os.path.exists(f_primes):
-        os.remove(f_primes)
+    assert parse_range_for_primes("2, 11-25, 31, 12-14") == [2, 11, 13, 17, 19, 23, 31]
+    # The table is extended beyond the limit of the old primes.txt file
+    assert parse_range_for_primes("139990-140001, 999980-1000000") == [
+        139991,
+        139999,
+        999983,
+    ]
+    with pytest.raises(ValueError):
+        parse_range_for_primes("1000001")
@@ -0,0 +1,229 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from os import utime
+from pathlib import Path
+from subprocess import run as subprocess_run
+from kit.utils.cache import ArtifactCache, FetchCache, stage_key, tree_fingerprint
+from kit.utils.component_builder import run
+
+
+def test_stage_key_is_deterministic():
+    attribs = {"build": "make", "init_build_dir": "build"}
+    key = stage_key("build", attribs, ["b", "a"])
+    assert key == stage_key("build", dict(reversed(attribs.items())), ["a", "b"])
+
+
+def test_stage_key_changes_with_inputs():
+    attribs = {"build": "make"}
+    key = stage_key("build", attribs, ["a"])
+    assert key != stage_key("build", {"build": "make -j"}, ["a"])
+    assert key != stage_key("build", attribs, ["b"])
+    assert key != stage_key("install", attribs, ["a"])
+
+
+def test_artifact_cache_store_and_restore(tmp_path, install_tree):
+    cache = ArtifactCache(tmp_path / "cache", 2**30)
+    assert "key" not in cache
+
+    cache.store("key", install_tree)
+    assert "key" in cache
+    assert not list((tmp_path / "cache").glob(".tmp-*"))
+
+    dst_dir = tmp_path / "restored"
+    dst_dir.mkdir()
+    (dst_dir / "stale.txt").write_text("stale")
+    cache.restore("key", dst_dir)
+    assert (dst_dir / "lib" / "libtest.a").read_text() == "archive"
+    assert (dst_dir / "lib" / "libtest.so").is_symlink()
+    assert not (dst_dir / "stale.txt").exists()
+
+
+def test_artifact_cache_restore_missing_key(tmp_path):
+    cache = ArtifactCache(tmp_path / "cache", 2**30)
+    with pytest.raises(KeyError):
+        cache.restore("key", tmp_path / "restored")
+
+
+def test_artifact_cache_evicts_least_recently_used(tmp_path, install_tree):
+    (install_tree / "lib" / "libtest.a").write_bytes(b"x" * 100)
+    cache = ArtifactCache(tmp_path / "cache", 250)
+    for age, key in enumerate(("new", "old", "oldest")):
+        cache.store(key, install_tree)
+        utime(cache.path(key), (1000 - age, 1000 - age))
+
+    cache.store("newest", install_tree)
+    assert "newest" in cache
+    assert "new" in cache
+    assert "old" not in cache
+    assert "oldest" not in cache
+
+
+def test_artifact_cache_eviction_skips_locked_entries(tmp_path, install_tree):
+    (install_tree / "lib" / "libtest.a").write_bytes(b"x" * 100)
+    cache = ArtifactCache(tmp_path / "cache", 50)
+    cache.store("old", install_tree)
+    utime(cache.path("old"), (1000, 1000))
+
+    with cache.lock("old", exclusive=False):
+        cache.store("new", install_tree)
+    assert "old" in cache
+
+
+def test_tree_fingerprint_changes_with_files(tmp_path, install_tree):
+    fingerprint = tree_fingerprint(install_tree)
+    assert fingerprint == tree_fingerprint(install_tree)
+
+    (install_tree / "lib" / "libtest.a").write_text("another archive")
+    assert fingerprint != tree_fingerprint(install_tree)
+
+
+def test_fetch_cache_git_clone_from_mirror(tmp_path, source_repo, recorded_run):
+    runner, calls = recorded_run
+    cache = FetchCache(tmp_path / "cache", 2**30, runner)
+    cmd = f"git clone {source_repo} --branch main"
+
+    for instance in ("first", "second"):
+        fetch_dir = tmp_path / instance
+        fetch_dir.mkdir()
+        assert cache.run(cmd, fetch_dir) == (True, 0)
+        clone_dir = fetch_dir / "source"
+        assert (clone_dir / "README").read_text() == "readme"
+        remote_url = subprocess_run(
+            ["git", "-C", clone_dir, "remote", "get-url", "origin"],
+            capture_output=True,
+            encoding="utf-8",
+        ).stdout.strip()
+        assert remote_url == str(source_repo)
+
+    # Network access: one mirror clone then one mirror update
+    assert sum(args[:3] == ["git", "clone", "--mirror"] for args in calls) == 1
+    assert sum("update" in args for args in calls) == 1
+
+
+def test_fetch_cache_wget_links_cached_file(tmp_path, recorded_run):
+    runner, calls = recorded_run
+    cache = FetchCache(tmp_path / "cache", 2**30, runner)
+    cmd = "wget https://example.com/downloads/lib-1.0.tar.gz"
+
+    for instance in ("first", "second"):
+        fetch_dir = tmp_path / instance
+        fetch_dir.mkdir()
+        assert cache.run(cmd, fetch_dir) == (True, 0)
+        assert (fetch_dir / "lib-1.0.tar.gz").read_text() == "tarball"
+
+    assert len(calls) == 1
+    assert (tmp_path / "second" / "lib-1.0.tar.gz").stat().st_nlink == 3
+
+
+@pytest.mark.parametrize(
+    "cmd",
+    [
+        "wget -O out.tar.gz https://example.com/lib.tar.gz",
+        "curl -LO https://example.com/lib.tar.gz",
+    ],
+)
+def test_fetch_cache_other_commands_unchanged(tmp_path, recorded_run, cmd):
+    runner, calls = recorded_run
+    cache = FetchCache(tmp_path / "cache", 2**30, runner)
+
+    cache.run(cmd, tmp_path)
+    assert calls == [cmd]
+
+
+def test_fetch_cache_evicts_least_recently_used(tmp_path, recorded_run):
+    runner, calls = recorded_run
+    cache = FetchCache(tmp_path / "cache", 20, runner)
+    urls = [f"https://example.com/lib-{i}.tar.gz" for i in range(3)]
+
+    for age, url in enumerate(urls):
+        cache.run(f"wget {url}", tmp_path)
+        key = cache.key("files", url)
+        utime(cache.path(key), (1000 + age, 1000 + age))
+
+    # Each file is 7 bytes, the oldest one does not fit
+    keys = [cache.key("files", url) for url in urls]
+    assert [key in cache for key in keys] == [False, True, True]
+    assert (cache.path(keys[1]).parent / f"{keys[1]}.size").read_text() == "7"
+
+
+def test_fetch_cache_entry_added_concurrently(tmp_path, recorded_run):
+    runner, _ = recorded_run
+    cache = FetchCache(tmp_path / "cache", 2**30, runner)
+    url = "https://example.com/lib.tar.gz"
+    key = cache.key("files", url)
+
+    # Another process finished the download first
+    other = cache.tmp_path(key)
+    other.mkdir()
+    (other / "lib.tar.gz").write_text("other")
+    cache.add(key, other)
+    tmp_entry = cache.tmp_path(key)
+    tmp_entry.mkdir()
+    (tmp_entry / "lib.tar.gz").write_text("mine")
+    cache.add(key, tmp_entry)
+
+    assert not tmp_entry.exists()
+    assert cache.run(f"wget {url}", tmp_path) == (True, 0)
+    assert (tmp_path / "lib.tar.gz").read_text() == "other"
+
+
+def test_fetch_cache_reports_failed_mirror_update(tmp_path, source_repo, mocker):
+    printer = mocker.Mock()
+
+    def runner(cmd_and_args, cwd=None):
+        if "update" in cmd_and_args:
+            return False, 1
+        return run(cmd_and_args, cwd=cwd)
+
+    cache = FetchCache(tmp_path / "cache", 2**30, runner, printer)
+    for instance in ("first", "second"):
+        (tmp_path / instance).mkdir()
+        assert cache.run(f"git clone {source_repo}", tmp_path / instance) == (True, 0)
+
+    printer.assert_called_once_with(
+        f"Cannot update mirror of '{source_repo}', using cached copy"
+    )
+
+
+"""Utilities used by the tests"""
+
+
+@pytest.fixture
+def recorded_run():
+    """Run git commands and fake downloads, recording the commands"""
+    calls = []
+
+    def runner(cmd_and_args, cwd=None):
+        calls.append(cmd_and_args)
+        if isinstance(cmd_and_args, list) and cmd_and_args[0] == "git":
+            return run(cmd_and_args, cwd=cwd)
+        if isinstance(cmd_and_args, str):
+            return True, 0
+        url = cmd_and_args[-1]
+        (Path(cwd) / url.rsplit("/", 1)[-1]).write_text("tarball")
+        return True, 0
+
+    return runner, calls
+
+
+@pytest.fixture
+def source_repo(tmp_path):
+    repo = tmp_path / "remote" / "source.git"
+    repo.mkdir(parents=True)
+    git = ["git", "-C", repo, "-c", "user.name=test", "-c", "user.email=test@test"]
+    subprocess_run([*git, "init", "-q", "-b", "main"], check=True)
+    (repo / "README").write_text("readme")
+    subprocess_run([*git, "add", "README"], check=True)
+    subprocess_run([*git, "commit", "-q", "-m", "init"], check=True)
+    return repo
+
+
+@pytest.fixture
+def install_tree(tmp_path):
+    install_dir = tmp_path / "install"
+    (install_dir / "lib").mkdir(parents=True)
+    (install_dir / "lib" / "libtest.a").write_text("archive")
+    (install_dir / "lib" / "libtest.so").symlink_to("libtest.a")
+    return install_dir
@@ -2,14 +2,28 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import pytest
+from shutil import rmtree
+from threading import Lock
+from io import BytesIO
 from kit.utils.component_builder import (
+    ProcessOutput,
     chain_run,
     run,
     BuildError,
     components_to_build_from,
     ComponentBuilder,
+    StageUsage,
+    install_components_concurrently,
     stages,
+    hekit_print,
+    _print_lock,
 )
+from kit.utils.tsort import CycleError
+from kit.utils.cache import ArtifactCache
+from kit.utils.constants import CacheConfig
+from kit.utils.files import load_toml
+from kit.utils.spec import Spec, spec_cache
+from kit.utils.status_index import StatusIndex
 
 
 def test_stages_fetch(mocker, unskipped_components):
@@ -68,6 +82,7 @@ def test_run_success(mocker, cmd_and_args, Popen_success):
     mock_Popen = mocker.patch("kit.utils.component_builder.Popen")
     mock_proc = mock_Popen.return_value.__enter__.return_value
     mock_proc.returncode = exp_code
+    mock_proc.stdout.read1.return_value = b""
 
     act_status, act_code = run(cmd_and_args)
     assert act_status == exp_status
@@ -80,6 +95,7 @@ def test_run_failure(mocker, cmd_and_args, Popen_failure):
     mock_Popen = mocker.patch("kit.utils.component_builder.Popen")
     mock_proc = mock_Popen.return_value.__enter__.return_value
     mock_proc.returncode = exp_code
+    mock_proc.stdout.read1.return_value = b""
 
     act_status, act_code = run(cmd_and_args)
     assert act_status == exp_status
@@ -96,6 +112,74 @@ def test_run_without_arguments(mocker):
     mock_Popen.assert_not_called()
 
 
+def test_process_output_writes_log_verbatim(mocker):
+    mock_print = mocker.patch("kit.utils.component_builder.print")
+    log = BytesIO()
+    output = ProcessOutput("CMAKE", log, verbose=False)
+
+    output.write(b"line 1\nline")
+    output.write(b" 2\nline 3")
+    output.close()
+    assert log.getvalue() == b"line 1\nline 2\nline 3\n"
+    mock_print.assert_not_called()
+
+
+def test_process_output_verbose_prints_lines(mocker):
+    mock_print = mocker.patch("kit.utils.component_builder.print")
+    output = ProcessOutput("CMAKE", verbose=True)
+
+    output.write(b"line 1\nline")
+    output.write(b" 2\n")
+    assert printed_lines(mock_print) == ["[CMAKE] line 1\n", "[CMAKE] line 2\n"]
+
+
+def test_process_output_progress_is_throttled(mocker):
+    mock_print = mocker.patch("kit.utils.component_builder.print")
+    mock_time = mocker.patch("kit.utils.component_builder.monotonic")
+    mock_time.return_value = 0.0
+    output = ProcessOutput("MAKE", verbose=False)
+
+    output.write(b"a\nb\n")
+    mock_time.return_value = ProcessOutput.progress_interval / 2
+    output.write(b"c\n")
+    mock_print.assert_not_called()
+
+    mock_time.return_value = ProcessOutput.progress_interval * 2
+    output.write(b"d\ne\n")
+    mock_print.assert_called_once_with("[MAKE] (5 lines) e\n", end="")
+
+
+def test_process_output_tail_on_failure(mocker):
+    mock_print = mocker.patch("kit.utils.component_builder.print")
+    output = ProcessOutput("MAKE", verbose=False)
+    nlines = ProcessOutput.tail_lines + 10
+
+    output.write(b"".join(b"line %d\n" % i for i in range(nlines)))
+    output.print_tail()
+    assert printed_lines(mock_print)[1:] == [
+        f"[MAKE] line {i}\n" for i in range(10, nlines)
+    ]
+
+
+def test_run_writes_log(mocker):
+    mocker.patch("kit.utils.component_builder.print")
+    log = BytesIO()
+
+    act_status, act_code = run("echo hello", log=log, verbose=False)
+    assert (act_status, act_code) == (True, 0)
+    assert log.getvalue() == b"$ echo hello\nhello\n"
+
+
+def test_run_adds_usage(mocker):
+    mocker.patch("kit.utils.component_builder.print")
+    usage = StageUsage()
+
+    assert run("true", verbose=False, usage=usage) == (True, 0)
+    assert run("sh -c 'exit 3'", verbose=False, usage=usage) == (False, 3)
+    assert usage.max_rss > 0
+    assert usage.user_time >= 0 and usage.sys_time >= 0
+
+
 def test_components_to_build_from_(mocker, specs_data):
     exp_filename, exp_repo, exp_recipe_arg, exp_spec = specs_data
     mock_Spec = mocker.patch("kit.utils.component_builder.Spec.from_toml_file")
@@ -110,9 +194,316 @@ def test_components_to_build_from_(mocker, specs_data):
     mock_Spec.assert_called_with(exp_filename, exp_repo, exp_recipe_arg)
 
 
+def test_install_components_concurrently_respects_dependencies(mocker, recipe_graph):
+    toml_specs, graph = recipe_graph
+    executed = []
+    lock = Lock()
+
+    def the_stages(component):
+        def run_component():
+            with lock:
+                executed.append(component.component_name())
+            return True, 0
+
+        yield run_component
+
+    mocker.patch.object(spec_cache, "load", return_value=toml_specs)
+    mocker.patch("kit.utils.component_builder.get_dependency_graph", return_value=graph)
+    mocker.patch(
+        "kit.utils.component_builder.Spec.from_toml_component",
+        side_effect=lambda specs, comp, *_: iter([comp] if comp in specs else []),
+    )
+    mocker.patch(
+        "kit.utils.component_builder.ComponentBuilder", side_effect=MockSpecComponent
+    )
+
+    install_components_concurrently("recipe.toml", "/repo", {}, the_stages, jobs=4)
+    assert sorted(executed) == sorted(toml_specs)
+    assert executed.index("ntl") < executed.index("helib")
+    assert executed.index("hexl") < executed.index("helib")
+    assert executed.index("helib") < executed.index("example")
+
+
+def test_install_components_concurrently_stops_on_failure(mocker, recipe_graph):
+    toml_specs, graph = recipe_graph
+    executed = []
+
+    def the_stages(component):
+        def run_component():
+            executed.append(component.component_name())
+            return component.component_name() != "helib", 3
+
+        yield run_component
+
+    mocker.patch.object(spec_cache, "load", return_value=toml_specs)
+    mocker.patch("kit.utils.component_builder.get_dependency_graph", return_value=graph)
+    mocker.patch(
+        "kit.utils.component_builder.Spec.from_toml_component",
+        side_effect=lambda specs, comp, *_: iter([comp] if comp in specs else []),
+    )
+    mocker.patch(
+        "kit.utils.component_builder.ComponentBuilder", side_effect=MockSpecComponent
+    )
+
+    with pytest.raises(BuildError) as exc_info:
+        install_components_concurrently("recipe.toml", "/repo", {}, the_stages, 2)
+    assert exc_info.value.error == 3
+    assert "example" not in executed
+
+
+def test_install_components_concurrently_prompts_first(mocker, recipe_graph):
+    toml_specs, graph = recipe_graph
+    toml_specs["ntl"][0]["version"] = "!ntl-version!"
+    toml_specs["seal"][0]["version"] = "!seal-version!"
+    recipe_args = {"seal-version": "4.0"}
+    prompts = []
+
+    def the_stages(component):
+        def run_component():
+            # All prompts happen before any stage runs
+            assert prompts == ["Please enter ntl-version: "]
+            return True, 0
+
+        yield run_component
+
+    def mock_input(prompt):
+        prompts.append(prompt)
+        return "11.5.1"
+
+    mocker.patch("kit.utils.spec.input", side_effect=mock_input)
+    mocker.patch.object(spec_cache, "load", return_value=toml_specs)
+    mocker.patch("kit.utils.component_builder.get_dependency_graph", return_value=graph)
+    mocker.patch(
+        "kit.utils.component_builder.Spec.from_toml_component",
+        side_effect=lambda specs, comp, *_: iter([comp] if comp in specs else []),
+    )
+    mocker.patch(
+        "kit.utils.component_builder.ComponentBuilder", side_effect=MockSpecComponent
+    )
+
+    install_components_concurrently("recipe.toml", "/repo", recipe_args, the_stages, 2)
+    assert "ntl-version" in recipe_args
+
+
+def test_run_labelled_output(mocker):
+    mock_print = mocker.patch("kit.utils.component_builder.print")
+
+    run("echo hello", label="hexl/1.2.3")
+    assert printed_lines(mock_print) == [
+        "[HEKIT hexl/1.2.3] echo hello\n",
+        "[ECHO hexl/1.2.3] hello\n",
+    ]
+
+
+def test_hekit_print_writes_whole_line_holding_lock(mocker):
+    def check_locked(*args, **kwargs):
+        assert _print_lock.locked()
+
+    mock_print = mocker.patch(
+        "kit.utils.component_builder.print", side_effect=check_locked
+    )
+    hekit_print("a", "b\nc", box_msg="HEKIT x/1")
+    mock_print.assert_called_once_with("[HEKIT x/1] a b\n[HEKIT x/1]c\n", end="")
+    assert not _print_lock.locked()
+
+
+def test_install_components_concurrently_cycle(mocker):
+    toml_specs = {"a": [{"b": "b/1"}], "b": [{"a": "a/1"}]}
+    mocker.patch.object(spec_cache, "load", return_value=toml_specs)
+    mocker.patch(
+        "kit.utils.component_builder.get_dependency_graph",
+        return_value={"a": ["b"], "b": ["a"]},
+    )
+
+    with pytest.raises(CycleError):
+        install_components_concurrently("recipe.toml", "/repo", {}, stages, 2)
+
+
+def test_stage_key_only_changes_for_affected_stages(tmp_path):
+    cache = ArtifactCache(tmp_path / "cache", 2**30)
+    instance = {"name": "1.0", "fetch": "wget url", "build": "make"}
+    builder = ComponentBuilder(
+        Spec.from_instance_spec("comp", instance, tmp_path, {}), cache
+    )
+    other = ComponentBuilder(
+        Spec.from_instance_spec("comp", {**instance, "build": "make -j"}, tmp_path, {}),
+        cache,
+    )
+
+    assert builder.stage_key("fetch") == other.stage_key("fetch")
+    assert builder.stage_key("build") != other.stage_key("build")
+    assert builder.stage_key("install") != other.stage_key("install")
+
+
+def test_already_successful_requires_same_key(tmp_path, mocker):
+    mocker.patch("kit.utils.component_builder.run", return_value=(True, 0))
+    cache = ArtifactCache(tmp_path / "cache", 2**30)
+    instance = {"name": "1.0", "fetch": "wget url", "build": "make"}
+    builder = ComponentBuilder(
+        Spec.from_instance_spec("comp", instance, tmp_path, {}), cache
+    )
+    chain_run(stages("build", force=False)(builder))
+
+    same = ComponentBuilder(
+        Spec.from_instance_spec("comp", instance, tmp_path, {}), cache
+    )
+    assert same.already_successful("fetch")
+    assert same.already_successful("build")
+
+    changed = ComponentBuilder(
+        Spec.from_instance_spec("comp", {**instance, "build": "make -j"}, tmp_path, {}),
+        cache,
+    )
+    assert changed.already_successful("fetch")
+    assert not changed.already_successful("build")
+
+
+def test_install_restored_from_cache(tmp_path, mocker):
+    mock_run = mocker.patch("kit.utils.component_builder.run", return_value=(True, 0))
+    cache = ArtifactCache(tmp_path / "cache", 2**30)
+    instance = {"name": "1.0", "fetch": "wget url", "install": "make install"}
+    spec = Spec.from_instance_spec("comp", instance, tmp_path, {})
+    builder = ComponentBuilder(spec, cache)
+    # Output of the mocked install command
+    (tmp_path / "comp" / "1.0" / "install").mkdir(parents=True)
+    (tmp_path / "comp" / "1.0" / "install" / "lib.a").write_text("lib")
+    chain_run(stages("install", force=False)(builder))
+    assert builder.stage_key("install") in cache
+
+    # Remove the instance and install it again
+    rmtree(tmp_path / "comp")
+    mock_run.reset_mock()
+    builder = ComponentBuilder(spec, cache)
+    chain_run(stages("install", force=False)(builder))
+
+    mock_run.assert_not_called()
+    assert (tmp_path / "comp" / "1.0" / "install" / "lib.a").read_text() == "lib"
+    assert builder.already_successful("install")
+
+
+def test_empty_install_tree_not_cached(tmp_path, mocker):
+    """Components without install command leave their output in build"""
+    mock_run = mocker.patch("kit.utils.component_builder.run", return_value=(True, 0))
+    cache = ArtifactCache(tmp_path / "cache", 2**30)
+    instance = {"name": "1.0", "build": "make"}
+    spec = Spec.from_instance_spec("comp", instance, tmp_path, {})
+    builder = ComponentBuilder(spec, cache)
+    chain_run(stages("install", force=False)(builder))
+    assert builder.stage_key("install") not in cache
+
+    rmtree(tmp_path / "comp")
+    mock_run.reset_mock()
+    builder = ComponentBuilder(spec, cache)
+    assert not builder.cached_install()
+    chain_run(stages("install", force=False)(builder))
+    mock_run.assert_called()
+
+
+def test_build_key_follows_local_sources(tmp_path):
+    cache = ArtifactCache(tmp_path / "cache", 2**30)
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "main.cpp").write_text("int main() {}")
+    instance = {"name": "1.0", "src_dir": str(src_dir), "build": "make"}
+    spec = Spec.from_instance_spec("comp", instance, tmp_path, {})
+    key = ComponentBuilder(spec, cache).stage_key("build")
+
+    (src_dir / "main.cpp").write_text("int main() { return 1; }")
+    assert key != ComponentBuilder(spec, cache).stage_key("build")
+
+
+def test_stage_records_timings(tmp_path, mocker):
+    mocker.patch("kit.utils.component_builder.print")
+    cache = ArtifactCache(tmp_path / "cache", 2**30)
+    instance = {"name": "1.0", "build": "true", "install": "sh -c 'exit 2'"}
+    spec = Spec.from_instance_spec("comp", instance, tmp_path, {})
+    builder = ComponentBuilder(spec, cache)
+    builder.setup()
+
+    assert builder.build() == (True, 0)
+    assert builder.install() == (False, 2)
+    timings = load_toml(tmp_path / "comp" / "1.0" / "hekit.info")["timings"]
+    assert timings["build"]["exit_code"] == 0
+    assert timings["build"]["max_rss"] > 0
+    assert timings["install"]["exit_code"] == 2
+    assert timings["install"]["wall_time"] >= 0
+
+
+def test_update_info_file_updates_status_index(tmp_path, mocker):
+    mocker.patch("kit.utils.component_builder.run", return_value=(True, 0))
+    StatusIndex(tmp_path).rebuild({})
+    instance = {"name": "1.0", "build": "make"}
+    spec = Spec.from_instance_spec("comp", instance, tmp_path, {})
+    builder = ComponentBuilder(spec, ArtifactCache(tmp_path / "cache", 2**30))
+    builder.setup()
+
+    assert builder.build() == (True, 0)
+    assert StatusIndex(tmp_path).load()["comp/1.0"]["status"]["build"] == "success"
+
+
+def test_stage_records_sizes(tmp_path, mocker):
+    mocker.patch("kit.utils.component_builder.print")
+    cache = ArtifactCache(tmp_path / "cache", 2**30)
+    instance = {"name": "1.0", "build": "sh -c 'head -c 100000 /dev/zero > lib.a'"}
+    spec = Spec.from_instance_spec("comp", instance, tmp_path, {})
+    builder = ComponentBuilder(spec, cache)
+    builder.setup()
+
+    assert builder.build() == (True, 0)
+    sizes = load_toml(tmp_path / "comp" / "1.0" / "hekit.info")["sizes"]
+    assert sizes["build"] >= 100_000
+    assert sizes["total"] >= sizes["build"]
+
+
+def test_install_records_size_of_install_tree(tmp_path, mocker):
+    mocker.patch("kit.utils.component_builder.print")
+    cache = ArtifactCache(tmp_path / "cache", 2**30)
+    # The install commands run in the build tree by default
+    instance = {
+        "name": "1.0",
+        "install": "sh -c 'head -c 100000 /dev/zero > ../install/lib.a'",
+    }
+    spec = Spec.from_instance_spec("comp", instance, tmp_path, {})
+    builder = ComponentBuilder(spec, cache)
+    builder.setup()
+
+    assert builder.install() == (True, 0)
+    sizes = load_toml(tmp_path / "comp" / "1.0" / "hekit.info")["sizes"]
+    assert sizes["install"] >= 100_000
+
+
 """Utilities used by the tests"""
 
 
+@pytest.fixture(autouse=True)
+def cache_config(mocker, tmp_path):
+    """Keep the default caches of the builders out of ~/.hekit"""
+    mocker.patch.object(CacheConfig, "INSTALL_DIR", tmp_path / "default" / "install")
+    mocker.patch.object(CacheConfig, "FETCH_DIR", tmp_path / "default" / "fetch")
+
+
+@pytest.fixture
+def recipe_graph():
+    # "gsl" is a dependency defined in another recipe file
+    graph = {
+        "example": ["helib"],
+        "helib": ["ntl", "hexl"],
+        "seal": ["hexl", "gsl"],
+        "ntl": [],
+        "hexl": [],
+    }
+    toml_specs = {comp: [{"name": "1.0"}] for comp in graph}
+    return toml_specs, graph
+
+
+class MockSpecComponent:
+    def __init__(self, component, verbose=False, label_output=False):
+        self._component = component
+
+    def component_name(self):
+        return self._component
+
+
 @pytest.fixture
 def funcs_success():
     def func_success():
@@ -187,6 +578,9 @@ class MockComponent:
     def skip(self):
         return self._skip
 
+    def cached_install(self):
+        return False
+
     def component_name(self):
         return "component_test"
 
@@ -207,3 +601,7 @@ class MockComponent:
 
     def reset_stage_info_file(self, stage):
         pass
+
+
+def printed_lines(mock_print):
+    return [c.args[0] for c in mock_print.call_args_list]
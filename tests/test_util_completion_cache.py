@@ -0,0 +1,104 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import pytest
+from os import utime
+
+from kit.utils.completion_cache import CompletionCache
+
+
+def test_list_dirs_is_cached_until_the_dir_changes(mocker, cache_file, repo):
+    mock_list_dirs = mocker.patch(
+        "kit.utils.completion_cache.list_dirs", return_value=["hexl"]
+    )
+    cache = CompletionCache(cache_file, repo / "plugins.toml")
+    assert cache.list_dirs(repo) == ["hexl"]
+    cache.save()
+
+    cache = CompletionCache(cache_file, repo / "plugins.toml")
+    assert cache.list_dirs(repo) == ["hexl"]
+    mock_list_dirs.assert_called_once()
+
+    (repo / "seal").mkdir()
+    touch(repo, 1)
+    mock_list_dirs.return_value = ["hexl", "seal"]
+    assert cache.list_dirs(repo) == ["hexl", "seal"]
+    assert mock_list_dirs.call_count == 2
+
+
+def test_list_dirs_of_missing_dir(cache_file, tmp_path):
+    cache = CompletionCache(cache_file, tmp_path / "plugins.toml")
+    assert cache.list_dirs(tmp_path / "missing") == []
+    cache.save()
+    assert not cache_file.exists()
+
+
+def test_plugin_commands_are_cached_until_the_config_changes(
+    mocker, cache_file, tmp_path
+):
+    plugins_file = tmp_path / "plugins.toml"
+    plugins_file.write_text("[plugins]\n")
+    compute = mocker.Mock(return_value={"my-plugin": "does things"})
+
+    cache = CompletionCache(cache_file, plugins_file)
+    assert cache.plugin_commands(compute) == {"my-plugin": "does things"}
+    cache.save()
+    cache = CompletionCache(cache_file, plugins_file)
+    assert cache.plugin_commands(compute) == {"my-plugin": "does things"}
+    compute.assert_called_once()
+
+    touch(plugins_file, 1)
+    compute.return_value = {}
+    cache = CompletionCache(cache_file, plugins_file)
+    assert cache.plugin_commands(compute) == {}
+    assert compute.call_count == 2
+
+
+def test_plugin_commands_without_config(mocker, cache_file, tmp_path):
+    plugins_file = tmp_path / "plugins.toml"
+    compute = mocker.Mock(return_value={})
+    cache = CompletionCache(cache_file, plugins_file)
+    assert cache.plugin_commands(compute) == {}
+    assert cache.plugin_commands(compute) == {}
+    compute.assert_called_once()
+
+    plugins_file.write_text("[plugins]\n")
+    compute.return_value = {"my-plugin": None}
+    assert cache.plugin_commands(compute) == {"my-plugin": None}
+
+
+def test_outdated_cache_is_ignored(cache_file, repo):
+    cache_file.parent.mkdir()
+    cache_file.write_text(json.dumps({"version": 0, "dirs": {str(repo): "bad"}}))
+    cache = CompletionCache(cache_file, repo / "plugins.toml")
+    assert cache.list_dirs(repo) == ["hexl"]
+
+
+def test_unwritable_cache_is_skipped(tmp_path, repo):
+    (tmp_path / "file").touch()
+    cache = CompletionCache(tmp_path / "file" / "completion.json", repo / "x")
+    assert cache.list_dirs(repo) == ["hexl"]
+    cache.save()
+
+
+"""Utilities used by the tests"""
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return tmp_path / "cache" / "completion.json"
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = tmp_path / "repo"
+    (repo / "hexl").mkdir(parents=True)
+    return repo
+
+
+def touch(path, seconds):
+    """Move the mtime of path forward, as filesystems
+    may not tell apart modifications close in time"""
+    stat = path.stat()
+    utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10**9))
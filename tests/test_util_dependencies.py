@@ -0,0 +1,71 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from kit.utils.dependencies import DependencyIndex, installed_instances
+from kit.utils.files import dump_toml
+
+
+def test_installed_instances_skips_hidden_directories(repo):
+    (repo / ".trash" / "v1-0123").mkdir(parents=True)
+    assert installed_instances(repo) == [
+        "helib/v2.2.1",
+        "hexl/1.2.3",
+        "hexl/1.2.4",
+        "ntl/11.5.1",
+        "palisade/v1.11.6",
+    ]
+
+
+def test_dependents_and_dependencies(repo):
+    index = DependencyIndex.from_repo(repo)
+    assert index.dependencies["helib/v2.2.1"] == {"hexl/1.2.3", "ntl/11.5.1"}
+    assert index.dependents["hexl/1.2.3"] == {"helib/v2.2.1", "palisade/v1.11.6"}
+    assert index.dependencies["hexl/1.2.4"] == set()
+    assert index.dependents["hexl/1.2.4"] == set()
+
+
+def test_instance_without_spec(repo):
+    (repo / "seal" / "4.0.0").mkdir(parents=True)
+    index = DependencyIndex.from_repo(repo)
+    assert index.dependencies["seal/4.0.0"] == set()
+
+
+def test_required_by(repo):
+    index = DependencyIndex.from_repo(repo)
+    assert index.required_by(["hexl/1.2.3"]) == {
+        "hexl/1.2.3": ["helib/v2.2.1", "palisade/v1.11.6"]
+    }
+    assert index.required_by(["hexl/1.2.3", "helib/v2.2.1"]) == {
+        "hexl/1.2.3": ["palisade/v1.11.6"]
+    }
+    assert index.required_by(["palisade/v1.11.6", "hexl/1.2.4"]) == {}
+
+
+def test_reachable(repo):
+    index = DependencyIndex.from_repo(repo)
+    assert index.reachable(["helib/v2.2.1", "seal/4.0.0"]) == {
+        "helib/v2.2.1",
+        "hexl/1.2.3",
+        "ntl/11.5.1",
+    }
+    assert index.reachable([]) == set()
+
+
+"""Utilities used by the tests"""
+
+
+def make_instance(repo, component, instance, **deps):
+    spec = {"name": instance, "build": f"cmake {repo}/{component}/{instance}", **deps}
+    (repo / component / instance).mkdir(parents=True)
+    dump_toml(repo / component / instance / "hekit.spec", {component: [spec]})
+
+
+@pytest.fixture
+def repo(tmp_path):
+    make_instance(tmp_path, "hexl", "1.2.3")
+    make_instance(tmp_path, "hexl", "1.2.4")
+    make_instance(tmp_path, "ntl", "11.5.1")
+    make_instance(tmp_path, "helib", "v2.2.1", hexl="hexl/1.2.3", ntl="ntl/11.5.1")
+    make_instance(tmp_path, "palisade", "v1.11.6", hexl="hexl/1.2.3")
+    return tmp_path
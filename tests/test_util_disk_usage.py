@@ -0,0 +1,76 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+from os import link, symlink
+from kit.utils.disk_usage import disk_usage, disk_usages, human_size, instance_sizes
+from kit.utils.files import dump_toml
+
+
+def test_disk_usage(tmp_path):
+    (tmp_path / "build" / "lib").mkdir(parents=True)
+    (tmp_path / "build" / "lib" / "libhexl.a").write_bytes(b"x" * 100_000)
+    (tmp_path / "hekit.info").write_text("")
+
+    size = disk_usage(tmp_path)
+    assert size >= 100_000
+    assert size == disk_usages([tmp_path])[0]
+
+
+def test_disk_usage_counts_hard_links_once(tmp_path):
+    (tmp_path / "a").write_bytes(b"x" * 100_000)
+    size = disk_usage(tmp_path)
+    link(tmp_path / "a", tmp_path / "b")
+    assert disk_usage(tmp_path) == size
+
+
+def test_disk_usage_does_not_follow_symlinks(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a").write_bytes(b"x" * 100_000)
+    (tmp_path / "dst").mkdir()
+    symlink(tmp_path / "src", tmp_path / "dst" / "link")
+    assert disk_usage(tmp_path / "dst") < 100_000
+
+
+def test_disk_usage_missing_path(tmp_path):
+    assert disk_usages([tmp_path / "missing", tmp_path / "other"]) == [0, 0]
+
+
+def test_instance_sizes(tmp_path):
+    instance_dir = tmp_path / "hexl" / "1.2.3"
+    (instance_dir / "src").mkdir(parents=True)
+    (instance_dir / "src" / "a").write_bytes(b"x" * 100_000)
+    spec = {"name": "1.2.3", "init_fetch_dir": str(instance_dir / "src")}
+    dump_toml(instance_dir / "hekit.spec", {"hexl": [spec]})
+
+    sizes = instance_sizes(instance_dir)
+    assert sizes["fetch"] >= 100_000
+    assert sizes["build"] == sizes["install"] == 0
+    assert sizes["total"] >= sizes["fetch"]
+
+
+def test_instance_sizes_without_spec(tmp_path):
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "a").write_bytes(b"x" * 100_000)
+
+    sizes = instance_sizes(tmp_path)
+    assert sizes["build"] >= 100_000
+    assert sizes["fetch"] == sizes["install"] == 0
+
+
+def test_instance_sizes_of_install_tree(tmp_path):
+    (tmp_path / "install" / "lib").mkdir(parents=True)
+    (tmp_path / "install" / "lib" / "a").write_bytes(b"x" * 100_000)
+    spec = {"name": "1.2.3", "init_install_dir": str(tmp_path / "build")}
+    dump_toml(tmp_path / "hekit.spec", {"hexl": [spec]})
+
+    sizes = instance_sizes(tmp_path)
+    assert sizes["install"] >= 100_000
+    assert sizes["build"] == 0
+
+
+def test_human_size():
+    assert human_size(0) == "0B"
+    assert human_size(1023) == "1023B"
+    assert human_size(1536) == "1.5K"
+    assert human_size(3 * 1024**3) == "3.0G"
+    assert human_size(2 * 1024**4) == "2.0T"
@@ -0,0 +1,112 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import pytest
+
+from kit.utils.factor_cache import FactorCache
+from kit.utils.primes import factor_integer, factorize_numbers
+
+
+def test_factorize_is_cached_across_runs(mocker, cache_file):
+    factorize = mocker.Mock(side_effect=factorize_numbers)
+    cache = FactorCache(cache_file)
+    assert cache.factorize([12, 2**64 + 1, 12], factorize) == [
+        (2, 2, 3),
+        (274177, 67280421310721),
+        (2, 2, 3),
+    ]
+    factorize.assert_called_once_with([12, 2**64 + 1])
+    cache.save()
+
+    cache = FactorCache(cache_file)
+    assert len(cache) == 2
+    assert cache.factorize([2**64 + 1, 15], factorize) == [
+        (274177, 67280421310721),
+        (3, 5),
+    ]
+    factorize.assert_called_with([15])
+
+    assert cache.factorize([15, 12], factorize) == [(3, 5), (2, 2, 3)]
+    assert factorize.call_count == 2
+
+
+def test_factorize_keeps_the_factors_computed_before_failing(cache_file):
+    def fail_on_second(numbers):
+        yield (3, 5)
+        raise TimeoutError("timed out")
+
+    cache = FactorCache(cache_file)
+    with pytest.raises(TimeoutError):
+        cache.factorize([15, 21], fail_on_second)
+    assert 15 in cache and 21 not in cache
+
+
+def test_least_recently_used_are_evicted(cache_file):
+    cache = FactorCache(cache_file, max_size=100)
+    for n in range(2, 30):
+        cache.add(n, factor_integer(n))
+    assert cache.size <= 100
+    assert 2 not in cache and 29 in cache
+
+    oldest = min(n for n in range(2, 30) if n in cache)
+    cache.get(oldest)
+    cache.add(101, (101,))
+    assert oldest in cache and oldest + 1 not in cache
+
+
+def test_invalid_file_is_ignored(cache_file):
+    cache_file.parent.mkdir()
+    cache_file.write_text("not json")
+    assert len(FactorCache(cache_file)) == 0
+
+    cache_file.write_text(json.dumps({"version": 0, "factors": {"c": ["2", "2"]}}))
+    assert len(FactorCache(cache_file)) == 0
+
+
+def test_save_only_when_modified(cache_file):
+    cache = FactorCache(cache_file)
+    cache.save()
+    assert not cache_file.exists()
+
+    cache.add(2**200 - 1, factor_integer(2**200 - 1))
+    cache.save()
+    data = json.loads(cache_file.read_text())
+    assert data["version"] == FactorCache.version
+    assert len(data["factors"]) == 1
+
+
+def test_reads_do_not_rewrite_the_file(mocker, cache_file):
+    cache = FactorCache(cache_file)
+    cache.add(6, (2, 3))
+    cache.add(15, (3, 5))
+    cache.save()
+
+    cache = FactorCache(cache_file)
+    dump = mocker.patch("kit.utils.factor_cache.dump_json")
+    assert cache.factorize([6, 15], mocker.Mock()) == [(2, 3), (3, 5)]
+    cache.save()
+    dump.assert_not_called()
+
+    # The order of the reads is kept once an entry is added
+    cache.get(6)
+    cache.add(35, (5, 7))
+    cache.save()
+    assert list(dump.call_args.args[1]["factors"]) == ["f", "6", "23"]
+
+
+def test_unwritable_cache_is_skipped(tmp_path):
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+    cache = FactorCache(blocker / "factors.json")
+    cache.add(6, (2, 3))
+    cache.save()
+    assert not (blocker / "factors.json").exists()
+
+
+"""Utilities used by the tests"""
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return tmp_path / "cache" / "factors.json"
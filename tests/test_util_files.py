@@ -1,6 +1,7 @@
 # Copyright (C) 2022 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
+import json
 import pytest
 
 from pathlib import Path
@@ -10,6 +11,7 @@ from kit.utils.files import (
     create_default_workspace,
     load_toml,
     dump_toml,
+    dump_json,
 )
 
 
@@ -23,6 +25,7 @@ def test_files_in_dir_commands_filter_py(get_toolkit_path):
         "new.py",
         "list_cmd.py",
         "plugin.py",
+        "gc.py",
     }
     module = get_toolkit_path / "kit" / "commands"
     filter = lambda f: f[0] != "_" and f.endswith(".py")
@@ -42,6 +45,7 @@ def test_files_in_dir_commands_filter_None(get_toolkit_path):
         "new.py",
         "list_cmd.py",
         "plugin.py",
+        "gc.py",
     }
     module = get_toolkit_path / "kit" / "commands"
     filter = None
@@ -97,6 +101,25 @@ def test_dump_toml(tmp_path):
     assert file_data == load_toml(file_name)
 
 
+def test_dump_json(tmp_path):
+    file_name = tmp_path / "test.json"
+    file_name.write_text("{}")
+    file_data = {"test": {"a": "b", "c": ["d", 1]}}
+
+    dump_json(file_name, file_data)
+    assert file_data == json.loads(file_name.read_text())
+    # The temporary file replaced the original
+    assert [p.name for p in tmp_path.iterdir()] == ["test.json"]
+
+
+def test_load_toml_returns_new_dicts(tmp_path):
+    file_name = tmp_path / "test.toml"
+    file_name.write_text('[status]\nfetch = "success"\n')
+
+    load_toml(file_name)["status"]["fetch"] = "failure"
+    assert "success" == load_toml(file_name)["status"]["fetch"]
+
+
 @pytest.fixture
 def get_toolkit_path():
     return Path(__file__).resolve().parent.parent
@@ -0,0 +1,128 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from kit.utils.component_builder import ComponentBuilder, chain_run, stages
+from kit.utils.files import dump_toml, load_toml
+from kit.utils.plan import (
+    critical_path,
+    plan_components_from_recipe_file,
+    unresolved_user_args,
+)
+from kit.utils.spec import Spec
+
+
+def test_unresolved_user_args(recipe):
+    toml_specs, _ = recipe
+    assert unresolved_user_args(toml_specs, {}) == ["prefix"]
+    assert unresolved_user_args(toml_specs, {"prefix": "/usr"}) == []
+
+
+def test_unresolved_user_args_in_lists():
+    toml_specs = {"lib": [{"name": "!v!", "build": ["make !target!", "!v!"]}]}
+    assert unresolved_user_args(toml_specs, {"v": "1"}) == ["target"]
+
+
+def test_plan_validates_as_install(mocker, tmp_path, recipe):
+    _, recipe_file = recipe
+    mocker.patch("kit.utils.plan.print")
+    link = tmp_path / "link.toml"
+    link.symlink_to(recipe_file)
+    with pytest.raises(TypeError) as exc_info:
+        plan_components_from_recipe_file(link, "install", tmp_path, False, {})
+    assert str(exc_info.value) == "The TOML file cannot be a symlink"
+
+    with pytest.raises(ValueError) as exc_info:
+        plan_components_from_recipe_file(recipe_file, "deploy", tmp_path, False, {})
+    assert str(exc_info.value) == "Not a valid stage value 'deploy'"
+
+
+def test_critical_path():
+    graph = {"a": [], "b": ["a"], "c": ["a"], "d": ["b", "c"]}
+    weights = {"a": 1.0, "b": 5.0, "c": 2.0, "d": 1.0}
+    assert critical_path(graph, weights) == (["a", "b", "d"], 7.0)
+
+
+def test_critical_path_empty():
+    assert critical_path({}, {}) == ([], 0.0)
+
+
+def test_plan_does_not_execute(mocker, tmp_path, recipe):
+    _, recipe_file = recipe
+    mock_run = mocker.patch("kit.utils.component_builder.run")
+    mock_input = mocker.patch("kit.utils.spec.input")
+    mock_print = mocker.patch("kit.utils.plan.print")
+
+    plan_components_from_recipe_file(recipe_file, "install", tmp_path, False, {})
+    mock_run.assert_not_called()
+    mock_input.assert_not_called()
+    assert not (tmp_path / "lib").exists()
+
+    lines = [call.args[0] for call in mock_print.call_args_list]
+    # The dependency is resolved from the recipe, not from the repo
+    assert f"    $ cmake -DLIB_DIR={tmp_path}/lib/1.0/install" in lines
+    assert "    $ make install PREFIX=!prefix!" in lines
+    assert "recipe arguments not given: prefix" in lines
+    assert "stages to run without recorded timings: 6" in lines
+
+
+def test_plan_reports_done_stages_and_estimate(mocker, tmp_path, recipe):
+    toml_specs, recipe_file = recipe
+    mocker.patch("kit.utils.component_builder.print")
+    mocker.patch("kit.utils.component_builder.run", return_value=(True, 0))
+    spec = Spec.from_instance_spec(
+        "lib", toml_specs["lib"][0], tmp_path, {"prefix": "/usr"}
+    )
+    chain_run(stages("build", force=False)(ComponentBuilder(spec)))
+    info_file = tmp_path / "lib" / "1.0" / "hekit.info"
+    mock_print = mocker.patch("kit.utils.plan.print")
+
+    plan_components_from_recipe_file(
+        recipe_file, "install", tmp_path, False, {"prefix": "/usr"}
+    )
+    lines = [call.args[0] for call in mock_print.call_args_list]
+    assert lines[:3] == ["lib/1.0", "  fetch      done", "  build      done"]
+    assert info_file.exists()
+    assert lines[-1] == "stages to run without recorded timings: 4"
+
+    # Timings recorded by a previous install
+    info = load_toml(info_file)
+    info["status"]["install"] = "failure"
+    info["timings"]["install"] = {"wall_time": 30.0}
+    dump_toml(info_file, info)
+    mock_print.reset_mock()
+    plan_components_from_recipe_file(
+        recipe_file, "install", tmp_path, False, {"prefix": "/usr"}
+    )
+    lines = [call.args[0] for call in mock_print.call_args_list]
+    assert "  install    run    ~30.0s" in lines
+    assert "critical path: lib (~30.0s)" in lines
+
+
+"""Utilities used by the tests"""
+
+
+@pytest.fixture
+def recipe(tmp_path):
+    toml_specs = {
+        "lib": [
+            {
+                "name": "1.0",
+                "fetch": "curl -LO lib.tar.gz",
+                "build": "make",
+                "install": "make install PREFIX=!prefix!",
+                "export_install_dir": "install",
+            }
+        ],
+        "app": [
+            {
+                "name": "2.0",
+                "lib": "lib/1.0",
+                "build": "cmake -DLIB_DIR=$%lib%/export_install_dir$",
+                "install": "cmake --install .",
+            }
+        ],
+    }
+    recipe_file = tmp_path / "recipe.toml"
+    dump_toml(recipe_file, toml_specs)
+    return toml_specs, recipe_file
@@ -1,14 +1,215 @@
 import pytest
+from io import StringIO
+from math import prod
 from kit.utils.primes import *
 
 
-def test_parse_factor_line():
-    # parse_factor_line doesn't check for correctness
-    assert parse_factor_line("6: 2 3") == (6, (2, 3))
-    assert parse_factor_line("6: \t2 \t3") == (6, (2, 3))
-    assert parse_factor_line("6: 3 2") == (6, (3, 2))  # order matters
-    assert parse_factor_line("36: 2 2 3 3") == (36, (2, 2, 3, 3))
+def test_small_primes():
+    assert small_primes(1) == []
+    assert small_primes(2) == [2]
+    assert small_primes(30) == [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
 
+
+@pytest.mark.parametrize(
+    "start,stop,segment_size",
+    [(0, 1000, 16), (1, 1, 3), (2, 2, 5), (9, 9, 3), (97, 1009, 10), (0, 5000, 7)],
+)
+def test_primes_in_range(start, stop, segment_size):
+    """The segments do not change the primes found"""
+    expected = [n for n in range(start, stop + 1) if is_prime_naive(n)]
+    assert list(primes_in_range(start, stop, segment_size)) == expected
+
+
+def test_primes_in_range_large_numbers():
+    assert list(primes_in_range(10**12, 10**12 + 100, 16)) == [
+        1000000000039,
+        1000000000061,
+        1000000000063,
+        1000000000091,
+    ]
+
+
+def test_write_primes():
+    out = StringIO()
+    write_primes(0, 10, out)
+    assert out.getvalue() == "2\n3\n5\n7\n"
+
+    out = StringIO()
+    write_primes(2, 140_000, out)
+    primes = list(map(int, out.getvalue().split()))
+    assert len(primes) == 13_010
+    assert primes[-1] == 139_999
+
+
+def test_write_primes_without_primes():
+    out = StringIO()
+    write_primes(10, 10, out)
+    assert out.getvalue() == "\n"
+
+
+def test_write_primes_wrong_range():
+    with pytest.raises(ValueError) as exc_info:
+        write_primes(100, 10, StringIO())
+    assert str(exc_info.value) == "start '100' should not be larger than stop '10'"
+
+    with pytest.raises(ValueError) as exc_info:
+        write_primes(-5, 10, StringIO())
+    assert str(exc_info.value) == "start '-5' should not be negative"
+
+    with pytest.raises(ValueError) as exc_info:
+        write_primes(0, MAX_PRIMES_STOP + 1, StringIO())
+    assert str(exc_info.value) == (
+        f"stop '{MAX_PRIMES_STOP + 1}' should not be larger than {MAX_PRIMES_STOP}"
+    )
+
+
+def test_pack_flags():
+    flags = bytes([1, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0, 0, 0, 0])
+    assert pack_flags(flags) == bytes([0b10000001, 0b00000010])
+    assert pack_flags(b"") == b""
+
+
+def test_prime_table_is_prime(tmp_path):
+    table = PrimeTable(tmp_path / "primes.bin", limit=100)
+    assert table.limit == 111
+    expected = [n for n in range(-5, 1000) if is_prime_naive(n)]
+    assert [n for n in range(-5, 1000) if table.is_prime(n)] == expected
+    # Extended on demand, doubling its size
+    assert table.limit == 1791
+
+
+@pytest.mark.parametrize(
+    "numbers",
+    [range(0, 2), range(0, 3), range(15, 33), range(16, 17), range(3, 500, 4)],
+)
+def test_prime_table_primes_in_range(tmp_path, numbers):
+    table = PrimeTable(tmp_path / "primes.bin", limit=100)
+    expected = tuple(n for n in numbers if is_prime_naive(n))
+    assert table.primes_in_range(numbers) == expected
+    assert table.primes_in_range(numbers[::-1]) == expected
+
+
+def test_prime_table_is_loaded_from_file(mocker, tmp_path):
+    table_file = tmp_path / "primes.bin"
+    PrimeTable(table_file, limit=10_000)
+    mock_sieve = mocker.patch("kit.utils.primes.odd_sieve_segments")
+
+    table = PrimeTable(table_file, limit=1000)
+    mock_sieve.assert_not_called()
+    assert table.limit == 10_015
+    assert len(table.primes_in_range(range(10_000))) == 1229
+
+
+@pytest.mark.parametrize(
+    "header",
+    [b"HEKITPRM\x02\x00\x00\x00", b"OTHER", b"HEKITPRM\x01\x00\x00\x00\xff"],
+)
+def test_prime_table_rebuilds_invalid_file(tmp_path, header):
+    table_file = tmp_path / "primes.bin"
+    PrimeTable(table_file, limit=1000)
+    table_file.write_bytes(header + table_file.read_bytes()[len(header) :])
+
+    table = PrimeTable(table_file, limit=100)
+    assert table.limit == 111
+    assert table.primes_in_range(range(100)) == tuple(small_primes(100))
+
+
+def test_prime_table_max_limit(tmp_path):
+    table = PrimeTable(tmp_path / "primes.bin", limit=100, max_limit=1000)
+    assert table.is_prime(997)
+    with pytest.raises(ValueError) as exc_info:
+        table.is_prime(1001)
+    assert str(exc_info.value) == "Cannot process number higher than 1000"
+
+
+def test_factor_integer():
+    assert factor_integer(0) == ()
+    assert factor_integer(1) == ()
+    assert factor_integer(12) == (2, 2, 3)
+    assert factor_integer(10009729) == (10009729,)
+    for n in range(2, 2000):
+        factors = factor_integer(n)
+        assert prod(factors) == n
+        assert all(map(is_prime_naive, factors))
+
+
+@pytest.mark.parametrize("use_ecm", [False, True])
+def test_factor_integer_large_numbers(use_ecm):
+    assert factor_integer(1_000_000_007 * 998_244_353, use_ecm=use_ecm) == (
+        998_244_353,
+        1_000_000_007,
+    )
+    assert factor_integer(65_537**2 * 2_147_483_647, use_ecm=use_ecm) == (
+        65_537,
+        65_537,
+        2_147_483_647,
+    )
+    assert factor_integer(2**128 - 1, use_ecm=use_ecm) == (
+        3,
+        5,
+        17,
+        257,
+        641,
+        65537,
+        274177,
+        6700417,
+        67280421310721,
+    )
+
+
+def test_factor_integer_wrong_input():
+    with pytest.raises(ValueError) as exc_info:
+        factor_integer(-12)
+    assert str(exc_info.value) == "Cannot factorize the negative number -12"
+
+    with pytest.raises(TypeError) as exc_info:
+        factor_integer(7.5)
+    assert str(exc_info.value) == "Cannot factorize '7.5', it is not an integer"
+
+
+def test_factor_integer_timeout(mocker):
+    mocker.patch("kit.utils.primes.monotonic", side_effect=[0, 5])
+    n = 1_000_000_007 * 998_244_353
+    with pytest.raises(TimeoutError) as exc_info:
+        factor_integer(n, timeout=1)
+    assert str(exc_info.value) == f"Factorization of {n} timed out"
+
+
+def test_factorize_numbers():
+    assert list(factorize_numbers([24, 1, 10009729])) == [
+        (2, 2, 2, 3),
+        (),
+        (10009729,),
+    ]
+
+    with pytest.raises(ValueError):
+        factorize_numbers([])
     with pytest.raises(ValueError):
-        parse_factor_line("6 3 2")
-        parse_factor_line("6.1: 3 2")
+        factorize_numbers([5, -1])
+
+
+def test_is_probable_prime():
+    assert [n for n in range(-5, 5000) if is_probable_prime(n)] == small_primes(4999)
+    # Strong pseudoprime to the bases 2, 3, 5 and 7
+    assert not is_probable_prime(3_215_031_751)
+    assert is_probable_prime(2**89 - 1)
+    assert not is_probable_prime((2**61 - 1) * (2**89 - 1))
+
+
+def test_pollard_brent():
+    n = 1_000_000_007 * 998_244_353
+    assert pollard_brent(n) in (998_244_353, 1_000_000_007)
+    assert pollard_brent(n, max_iterations=100) is None
+
+
+def test_ecm():
+    n = 1_000_000_007 * 998_244_353
+    assert ecm(n, None, b1=2000, curves=200) in (998_244_353, 1_000_000_007)
+    assert ecm(n, None, b1=10, curves=1) is None
+
+
+"""Utilities used by the tests"""
+
+
+def is_prime_naive(n):
+    return n > 1 and all(n % d for d in range(2, int(n**0.5) + 1))
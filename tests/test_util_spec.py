@@ -2,9 +2,17 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import pytest
+import kit.utils.spec
 from filecmp import cmp as compare_files
 from pathlib import Path
-from kit.utils.spec import Spec, InvalidSpecError
+from kit.utils.spec import (
+    Spec,
+    InvalidSpecError,
+    SpecCache,
+    compile_template,
+    fill_self_ref_string_dict,
+    read_spec,
+)
 
 
 def test_transform_spec_to_toml_dict():
@@ -94,6 +102,91 @@ def test_basic_substitutions_are_expanded():
     assert spec["another"] == "start-bla/bob2/bla-end"
 
 
+def test_self_reference_cycle_is_detected():
+    instance = {"name": "x", "a": "%b%", "b": "pre-%c%", "c": "%a%-post"}
+    with pytest.raises(InvalidSpecError) as execinfo:
+        fill_self_ref_string_dict(instance, "")
+    assert "cycle in references: a -> b -> c -> a" == str(execinfo.value)
+
+
+def test_self_reference_to_itself_is_detected():
+    with pytest.raises(InvalidSpecError):
+        fill_self_ref_string_dict({"name": "%name%"}, "")
+
+
+def test_long_self_reference_chain_is_expanded():
+    """Deeper than the recursion limit"""
+    length = 5000
+    instance = {f"k{i}": f"%k{i + 1}%" for i in range(length)}
+    instance[f"k{length}"] = "end"
+    expanded = fill_self_ref_string_dict(instance, "")
+    assert set(expanded.values()) == {"end"}
+
+
+def test_self_references_are_expanded_once():
+    """A key referenced by many keys is only expanded once"""
+    instance = {"base": "%root%/lib", "root": "/opt"}
+    instance.update({f"k{i}": f"%base%/k{i}" for i in range(100)})
+    compile_template.cache_clear()
+
+    expanded = fill_self_ref_string_dict(instance, "")
+    assert expanded["k99"] == "/opt/lib/k99"
+    # Templates are parsed once for each kind of reference
+    assert compile_template.cache_info().misses <= 2 * len(instance)
+
+
+def test_unbalanced_delimiters_are_literal():
+    instance = {"name": "x", "a": "100% of !name", "b": "%a% $HOME/%name%"}
+    expanded = fill_self_ref_string_dict(instance, "")
+    assert expanded["b"] == "100% of !name $HOME/x"
+
+
+def test_spec_cache_parses_file_once(mocker, tmp_path):
+    path = tmp_path / "hekit.spec"
+    path.write_text('[[hexl]]\nname = "bob"\n')
+    spy = mocker.spy(kit.utils.spec, "load_toml")
+    cache = SpecCache()
+
+    for _ in range(3):
+        assert cache.load(path) == {"hexl": [{"name": "bob"}]}
+    assert spy.call_count == 1
+
+
+def test_spec_cache_reloads_modified_file(tmp_path):
+    path = tmp_path / "hekit.spec"
+    path.write_text('[[hexl]]\nname = "bob"\n')
+    cache = SpecCache()
+    cache.load(path)
+
+    path.write_text('[[hexl]]\nname = "alice"\n')
+    assert cache.load(path) == {"hexl": [{"name": "alice"}]}
+
+
+def test_spec_cache_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SpecCache().load(tmp_path / "hekit.spec")
+
+
+def test_written_spec_is_read_from_cache(mocker, tmp_path):
+    """Dependencies written by a run are not parsed again"""
+    dep_loc = tmp_path / "hexl" / "bob"
+    dep_loc.mkdir(parents=True)
+    spec = Spec.from_instance_spec("hexl", {"name": "bob"}, tmp_path, {})
+    spec.to_toml_file(dep_loc / "hekit.spec")
+    spy = mocker.spy(kit.utils.spec, "load_toml")
+
+    for _ in range(3):
+        assert read_spec("hexl", "bob", tmp_path)["name"] == "bob"
+    spy.assert_not_called()
+
+
+def test_reference_to_non_string_value():
+    instance = {"name": "x", "version": 233.3, "fetch": "--branch %version%"}
+    with pytest.raises(TypeError) as execinfo:
+        fill_self_ref_string_dict(instance, "")
+    assert "replacement for 'version' must be str, not float" == str(execinfo.value)
+
+
 def test_write_spec_to_toml_file(create_basic_spec_file, tmp_path):
     """Compare with manually written TOML file"""
     path_to_expected_file, expected_dict = create_basic_spec_file
@@ -214,45 +307,22 @@ def test_user_substitutions_are_expanded_to_init(mocker):
     assert spec["export_something"] == f"{rloc}/hexl/{exp_name}/blu/{exp_version}/blu"
 
 
-def test_validate_unique_instance_no_file():
-    """Verify that the function continues without errors
-    if hekit.spec file does not exist"""
-    act_comp = "comp"
-    act_inst = {"name": "test"}
-    act_rloc = "/home"
-
-    Spec._validate_unique_instance(act_comp, act_inst, act_rloc)
-
-
-def test_validate_unique_instance_same_values(mocker):
-    """Verify that the function continues without errors
-    if the instance is the same as the previous one"""
-    mock_read_spec = mocker.patch("kit.utils.spec.read_spec")
-    mock_read_spec.return_value = {"name": "test", "option": "debug"}
-    act_comp = "comp"
-    act_inst = {"name": "test", "option": "debug"}
-    act_rloc = "/home"
-
-    Spec._validate_unique_instance(act_comp, act_inst, act_rloc)
-    mock_read_spec.assert_called_once()
-
+def test_from_instance_spec_dependencies(mocker):
+    """The component/instance of the dependencies are recorded"""
+    instance = {
+        "name": "v1",
+        "hexl": "hexl/1.2.3",
+        "ntl": "ntl/11.5.1",
+        "pre-build": "cmake -DNTL_DIR=$%ntl%/export_install_dir$",
+        "post-build": ["echo $%hexl%/export_cmake$"],
+    }
+    read_spec = {"export_install_dir": "ntl_dir", "export_cmake": "hexl_dir"}
 
-def test_validate_unique_instance_different_values(mocker):
-    """Verify it triggers InvalidSpec exception when
-    the instance is not the same as the previous one"""
-    mock_read_spec = mocker.patch("kit.utils.spec.read_spec")
-    mock_read_spec.return_value = {"name": "test", "option": "debug"}
-    act_comp = "comp"
-    act_inst = {"name": "test", "option": "release"}
-    act_rloc = "/home"
+    mocker.patch("kit.utils.spec.read_spec", return_value=read_spec)
 
-    with pytest.raises(InvalidSpecError) as execinfo:
-        Spec._validate_unique_instance(act_comp, act_inst, act_rloc)
-    mock_read_spec.assert_called_once()
-    assert (
-        "comp/test is already present but it was executed with different options"
-        in str(execinfo.value)
-    )
+    spec = Spec.from_instance_spec("helib", instance, "", {})
+    assert spec.dependencies == ("hexl/1.2.3", "ntl/11.5.1")
+    assert spec["pre-build"] == "cmake -DNTL_DIR=ntl_dir"
 
 
 def test_from_toml_file_tsort(mocker):
@@ -260,13 +330,11 @@ def test_from_toml_file_tsort(mocker):
     tests_path = Path(__file__).resolve().parent
     mock_read_spec = mocker.patch("kit.utils.spec.read_spec")
     mock_read_spec.return_value = {"export_install_dir": "", "export_cmake": ""}
-    mock_validate_unique = mocker.patch("kit.utils.spec.Spec._validate_unique_instance")
     exp_keys_list = ["ntl", "hexl", "hexl", "helib", "palisade", "gsl", "zstd", "seal"]
     filepath = f"{tests_path}/input_files/test_tsort.toml"
 
     specs = list(Spec.from_toml_file(filepath, rloc="", recipe_arg_dict={}))
     assert 6 == mock_read_spec.call_count
-    assert 8 == mock_validate_unique.call_count
     assert len(specs) == len(exp_keys_list)
     for exp_key, spec in zip(exp_keys_list, specs):
         spec_as_dict = spec.to_toml_dict()
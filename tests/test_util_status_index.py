@@ -0,0 +1,72 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from kit.utils.status_index import StatusIndex
+
+
+def test_load_without_index(tmp_path):
+    assert StatusIndex(tmp_path).load() is None
+    assert StatusIndex(tmp_path / "missing").load() is None
+
+
+def test_update_without_index_is_ignored(tmp_path, info):
+    """The index can only be built by a rescan"""
+    index = StatusIndex(tmp_path)
+    index.update("hexl", "1.2.3", info)
+    assert not index.path.exists()
+
+
+def test_rebuild_and_update(tmp_path, info):
+    index = StatusIndex(tmp_path)
+    index.rebuild({"hexl/1.2.3": info})
+    index.update("helib", "v2.2.1", {**info, "status": {"fetch": "failure"}})
+
+    assert index.load() == {
+        "hexl/1.2.3": {"status": info["status"], "timings": info["timings"]},
+        "helib/v2.2.1": {
+            "status": {"fetch": "failure"},
+            "timings": info["timings"],
+        },
+    }
+
+
+def test_remove(tmp_path, info):
+    index = StatusIndex(tmp_path)
+    index.rebuild({"hexl/1.2.3": info, "hexl/1.3.0": info, "helib/v2.2.1": info})
+
+    index.remove("hexl", "1.2.3")
+    assert sorted(index.load()) == ["helib/v2.2.1", "hexl/1.3.0"]
+    index.remove("hexl")
+    assert sorted(index.load()) == ["helib/v2.2.1"]
+
+
+def test_corrupted_index_requires_rescan(tmp_path, info):
+    index = StatusIndex(tmp_path)
+    index.path.write_text("{")
+    assert index.load() is None
+    index.path.write_text('{"version": 0, "instances": {}}')
+    assert index.load() is None
+
+
+def test_concurrent_updates(tmp_path, info):
+    index = StatusIndex(tmp_path)
+    index.rebuild({})
+    with ThreadPoolExecutor(8) as pool:
+        for i in range(64):
+            pool.submit(index.update, "comp", f"v{i}", info)
+    assert len(index.load()) == 64
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
+
+
+"""Utilities used by the tests"""
+
+
+@pytest.fixture
+def info():
+    return {
+        "status": {"fetch": "success", "build": "success", "install": "success"},
+        "hash": {"fetch": "a", "build": "b", "install": "c"},
+        "timings": {"fetch": {"wall_time": 1.0}},
+    }
@@ -3,13 +3,25 @@
 
 import pytest
 
+from argparse import ArgumentParser
+from importlib import import_module
 from pathlib import Path
-from kit.utils.constants import PluginsConfig
+from kit.utils.completion_cache import CompletionCache
+from kit.utils.constants import Constants, PluginsConfig
 from kit.utils.subparsers import (
+    KIT_MANIFESTS,
+    Manifest,
+    command_line_args,
+    import_from_source_file,
+    register_subparser,
+    requested_command,
     get_subparsers_plugins,
     get_plugin_arg_choices,
+    get_plugin_manifests,
+    get_plugins_manifests,
     get_plugins_start_files,
     get_subparsers_kit,
+    plugin_commands,
     validate_input,
 )
 
@@ -63,6 +75,7 @@ def test_get_subparsers_kit_commands_all(get_toolkit_path):
         "set_new_subparser",
         "set_list_subparser",
         "set_plugin_subparser",
+        "set_gc_subparser",
     }
 
     act_funcs = get_subparsers_kit(["commands"], get_toolkit_path / "kit")
@@ -103,6 +116,182 @@ def test_get_subparsers_kit_tools_some(mocker, get_toolkit_path):
     assert 0 == len(exp_func)
 
 
+def test_kit_manifests_match_subparsers(get_toolkit_path):
+    """The manifests describe every sub-command of the commands and tools"""
+    parser = ArgumentParser(prog="hekit")
+    subparsers = parser.add_subparsers()
+    funcs = {}
+    for func in get_subparsers_kit(["commands", "tools"], get_toolkit_path / "kit"):
+        names = set(subparsers.choices)
+        func(subparsers)
+        for name in subparsers.choices.keys() - names:
+            funcs[name] = (func.__module__, func.__name__)
+
+    assert list(KIT_MANIFESTS) == list(subparsers.choices)
+    for name, manifest in KIT_MANIFESTS.items():
+        assert (manifest.module, manifest.function) == funcs[name]
+        assert manifest.description == subparsers.choices[name].description
+
+
+def test_kit_manifests_are_hekit_commands():
+    """Plugins cannot take the name of a sub-command"""
+    assert set(KIT_MANIFESTS) == Constants.HEKIT_COMMANDS
+
+
+def test_register_subparser_imports_requested_command_only(mocker):
+    mock_import = mocker.patch(
+        "kit.utils.subparsers.import_module", side_effect=import_module
+    )
+    mock_plugins = mocker.patch("kit.utils.subparsers.get_plugins_start_files")
+    parser = ArgumentParser(prog="hekit")
+    parser.add_argument("--config")
+    subparsers = parser.add_subparsers()
+
+    register_subparser(subparsers, ["--config", "list", "list", "--rescan"])
+    mock_import.assert_called_once_with("kit.commands.list_cmd")
+    mock_plugins.assert_not_called()
+    assert list(subparsers.choices) == [
+        "list",
+        *(k for k in KIT_MANIFESTS if k != "list"),
+    ]
+    args = parser.parse_args(["--config", "list", "list", "--rescan"])
+    assert args.rescan and not args.timings
+    assert subparsers.choices["gc"].description == KIT_MANIFESTS["gc"].description
+
+
+def test_register_subparser_imports_plugins_otherwise(mocker):
+    mock_import = mocker.patch("kit.utils.subparsers.import_module")
+    mock_manifests = mocker.patch(
+        "kit.utils.subparsers.get_plugins_manifests", return_value=({}, {})
+    )
+    subparsers = ArgumentParser(prog="hekit").add_subparsers()
+
+    register_subparser(subparsers, ["my-plugin", "--arg"])
+    mock_import.assert_not_called()
+    mock_manifests.assert_called_once()
+    assert list(subparsers.choices) == list(KIT_MANIFESTS)
+
+
+def test_register_subparser_imports_requested_plugin_only(mocker, tmp_path):
+    create_plugin(["test", "other"], tmp_path)
+    manifests = {
+        "prog_test": Manifest(
+            f"{tmp_path}/test/start_test.py", "set_test_subparser", "tests"
+        ),
+        "prog_other": Manifest(
+            f"{tmp_path}/other/start_other.py", "set_other_subparser", "others"
+        ),
+    }
+    mocker.patch(
+        "kit.utils.subparsers.get_plugins_manifests", return_value=(manifests, {})
+    )
+    mock_import = mocker.patch(
+        "kit.utils.subparsers.import_from_source_file",
+        side_effect=import_from_source_file,
+    )
+    subparsers = ArgumentParser(prog="hekit").add_subparsers()
+
+    register_subparser(subparsers, ["prog_test"])
+    mock_import.assert_called_once_with("start_test", manifests["prog_test"].module)
+    assert list(subparsers.choices) == [*KIT_MANIFESTS, "prog_test", "prog_other"]
+    assert subparsers.choices["prog_test"].get_default("fn").__name__ == "test_func"
+    assert subparsers.choices["prog_other"].description == "others"
+
+
+def test_get_plugins_manifests(tmp_path):
+    config_file = tmp_path / "plugins.toml"
+    config_file.write_text(
+        "[plugins.recorded]\n"
+        'start = "start.py"\n'
+        'state = "enabled"\n'
+        'command = "recorded"\n'
+        'function = "set_recorded_subparser"\n'
+        "[plugins.legacy-plugin]\n"
+        'start = "start_legacy.py"\n'
+        'state = "enabled"\n'
+        "[plugins.disabled]\n"
+        'start = "start.py"\n'
+        'state = "disabled"\n'
+        'command = "disabled"\n'
+        'function = "set_disabled_subparser"\n'
+    )
+
+    manifests, start_files = get_plugins_manifests(config_file, tmp_path)
+    assert manifests == {
+        "recorded": Manifest(
+            f"{tmp_path}/recorded/start.py", "set_recorded_subparser", ""
+        )
+    }
+    assert start_files == {"legacy-plugin": "start_legacy.py"}
+    assert get_plugins_manifests(tmp_path / "missing.toml") == ({}, {})
+
+
+def test_get_plugin_manifests(tmp_path):
+    create_plugin(["test"], tmp_path)
+    assert get_plugin_manifests("test", "start_test.py", tmp_path) == {
+        "prog_test": Manifest(
+            f"{tmp_path}/test/start_test.py", "set_test_subparser", ""
+        )
+    }
+
+
+def test_register_subparser_completes_plugins_from_cache(mocker, tmp_path):
+    mocker.patch.dict("os.environ", {"_ARGCOMPLETE": "1"})
+    mock_plugins = mocker.patch("kit.utils.subparsers.get_subparsers_plugins")
+    mocker.patch(
+        "kit.utils.subparsers.get_plugins_manifests",
+        return_value=({}, {"my-plugin": "start.py"}),
+    )
+    mocker.patch(
+        "kit.utils.subparsers.CompletionCache",
+        side_effect=lambda: CompletionCache(
+            tmp_path / "completion.json", tmp_path / "plugins.toml"
+        ),
+    )
+    mock_commands = mocker.patch(
+        "kit.utils.subparsers.plugin_commands",
+        return_value={"my-plugin": "does things"},
+    )
+    subparsers = ArgumentParser(prog="hekit").add_subparsers()
+
+    register_subparser(subparsers, ["my-p"])
+    mock_plugins.assert_not_called()
+    assert list(subparsers.choices) == [*KIT_MANIFESTS, "my-plugin"]
+    assert subparsers.choices["my-plugin"].description == "does things"
+
+    # The options of a plugin sub-command are completed importing it
+    mock_plugins.return_value = []
+    register_subparser(ArgumentParser().add_subparsers(), ["my-plugin", "--"])
+    mock_plugins.assert_called_once()
+    mock_commands.assert_called_once_with({"my-plugin": "start.py"})
+
+
+def test_plugin_commands(mocker, tmp_path):
+    create_plugin(["test"], tmp_path)
+    mocker.patch.object(PluginsConfig, "ROOT_DIR", tmp_path)
+    assert plugin_commands({"test": "start_test.py"}) == {"prog_test": None}
+
+
+@pytest.mark.parametrize(
+    "args,command",
+    [
+        ([], None),
+        (["--debug"], None),
+        (["--debug", "install", "recipe.toml"], "install"),
+        (["--config", "remove", "list"], "list"),
+    ],
+)
+def test_requested_command(args, command):
+    assert requested_command(args) == command
+
+
+def test_command_line_args_when_completing(mocker):
+    mocker.patch.dict(
+        "os.environ", {"_ARGCOMPLETE": "1", "COMP_LINE": "hekit list --st"}
+    )
+    assert command_line_args() == ["list", "--st"]
+
+
 def test_validate_input_non_printable_char():
     """Verify that the SW raises an error when
     there is a non printable char"""
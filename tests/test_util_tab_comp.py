@@ -2,8 +2,10 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import pytest
+from os import utime
 from toml import dump
 from pathlib import Path
+from kit.utils.completion_cache import CompletionCache
 from kit.utils.constants import PluginState, PluginsConfig
 from kit.utils.tab_completion import (
     get_plugins_by_state,
@@ -54,6 +56,26 @@ def test_get_instances_empty(mocker, tmp_path):
     assert act_inst == []
 
 
+def test_completers_answer_from_the_cache(mocker, tmp_path):
+    """Verify that the directories are only listed again when they change"""
+    args = Mockargs()
+    mock_load_config = mocker.patch("kit.utils.tab_completion.load_config")
+    mock_load_config.return_value = Config(tmp_path)
+    create_plugin_file(tmp_path, "hexl", ["1.2.3"])
+    mock_list_dirs = mocker.patch(
+        "kit.utils.completion_cache.list_dirs", side_effect=lambda p: ["1.2.3"]
+    )
+
+    assert instances_completer("", args) == ["1.2.3"]
+    assert instances_completer("", args) == ["1.2.3"]
+    mock_list_dirs.assert_called_once()
+    create_plugin_file(tmp_path, "hexl", ["1.2.3", "2.0.0"])
+    mock_list_dirs.side_effect = lambda p: ["1.2.3", "2.0.0"]
+    stat = (tmp_path / "hexl").stat()
+    utime(tmp_path / "hexl", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert instances_completer("", args) == ["1.2.3", "2.0.0"]
+
+
 def test_get_plugins_by_state_enable(create_tmp_file):
     """Verify that the SW returns the enabled plugins"""
     act_data = get_plugins_by_state(PluginState.ENABLE, create_tmp_file)
@@ -73,6 +95,16 @@ def test_get_plugins_by_state_disable(create_tmp_file):
 """Utilities used by the tests"""
 
 
+@pytest.fixture(autouse=True)
+def completion_cache(mocker, tmp_path):
+    """Keep the completion cache of the tests out of ~/.hekit"""
+    cache_file = tmp_path / "cache" / "completion.json"
+    mocker.patch(
+        "kit.utils.tab_completion.CompletionCache",
+        side_effect=lambda: CompletionCache(cache_file),
+    )
+
+
 class Config:
     def __init__(self, repo_location):
         self.repo_location = repo_location
@@ -0,0 +1,64 @@
+# Copyright (C) 2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from time import monotonic, sleep
+from kit.utils.trash import Trash
+
+
+def test_move_is_a_rename_into_the_trash(tmp_path):
+    inst_path = tmp_path / "hexl" / "1.2.3"
+    (inst_path / "build").mkdir(parents=True)
+    trash = Trash(tmp_path)
+
+    trashed = trash.move(inst_path)
+    assert not inst_path.exists()
+    assert trashed.parent == trash.path
+    assert trashed.name.startswith("1.2.3-")
+    assert (trashed / "build").is_dir()
+
+
+def test_move_same_name_twice(tmp_path):
+    trash = Trash(tmp_path)
+    (tmp_path / "a" / "v1").mkdir(parents=True)
+    (tmp_path / "b" / "v1").mkdir(parents=True)
+
+    assert trash.move(tmp_path / "a" / "v1") != trash.move(tmp_path / "b" / "v1")
+
+
+def test_move_missing_path(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Trash(tmp_path).move(tmp_path / "hexl")
+    assert not Trash(tmp_path).path.exists()
+
+
+def test_purge(tmp_path):
+    trash = Trash(tmp_path)
+    for name in ("hexl", "seal"):
+        build = tmp_path / name / "build"
+        build.mkdir(parents=True)
+        (build / "lib.a").write_text("")
+        (tmp_path / name / "hekit.info").write_text("")
+        trash.move(tmp_path / name)
+
+    assert 2 == trash.purge(workers=2)
+    assert not trash.path.exists()
+    assert 0 == trash.purge()
+
+
+def test_delete_in_background(tmp_path):
+    trash = Trash(tmp_path)
+    (tmp_path / "hexl" / "build").mkdir(parents=True)
+    trashed = trash.move(tmp_path / "hexl")
+
+    trash.delete_in_background(trashed)
+    deadline = monotonic() + 10
+    while trashed.exists() and monotonic() < deadline:
+        sleep(0.01)
+    assert not trashed.exists()
+
+
+def test_delete_in_background_nothing(mocker, tmp_path):
+    mock_popen = mocker.patch("kit.utils.trash.Popen")
+    Trash(tmp_path).delete_in_background()
+    mock_popen.assert_not_called()
@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import pytest
-from kit.utils.tsort import tsort, CycleError
+from kit.utils.tsort import tsort, waves, TopologicalSorter, CycleError
 
 
 def test_tsort_libraries():
@@ -44,3 +44,63 @@ def test_tsort_handles_cycle():
     G = {15: {6}, 2: {11, 15}, 6: {2}}
     with pytest.raises(CycleError):
         tuple(tsort(G))
+
+
+def test_tsort_handles_cycle_not_including_first_node():
+    """A cycle deeper in the graph should be detected as well"""
+    G = {"A": ["B"], "B": ["C"], "C": ["D"], "D": ["B"]}
+    with pytest.raises(CycleError) as exc_info:
+        tuple(tsort(G))
+    assert "cycle:['B', 'C', 'D', 'B']" == str(exc_info.value)
+
+
+def test_tsort_deep_chain():
+    """A long chain does not hit the recursion limit"""
+    size = 100_000
+    G = {i: [i - 1] for i in range(size, 0, -1)}
+    assert tuple(tsort(G)) == tuple(range(size + 1))
+
+
+def test_waves_libraries():
+    G = {
+        "example": ["helib"],
+        "helib": ["ntl", "hexl"],
+        "zstd": [],
+        "seal": ["hexl", "gsl", "zstd"],
+        "ntl": [],
+        "gsl": [],
+        "palisade": ["hexl"],
+        "hexl": [],
+    }
+
+    result = [set(wave) for wave in waves(G)]
+    assert result == [
+        {"zstd", "ntl", "gsl", "hexl"},
+        {"helib", "seal", "palisade"},
+        {"example"},
+    ]
+
+
+def test_waves_handles_cycle():
+    G = {15: {6}, 2: {11, 15}, 6: {2}}
+    with pytest.raises(CycleError) as exc_info:
+        tuple(waves(G))
+    assert "cycle:" in str(exc_info.value)
+
+
+def test_topological_sorter_get_ready_after_done():
+    G = {"D": {"B", "C"}, "C": {"A"}, "B": {"A"}}
+    sorter = TopologicalSorter(G)
+
+    assert sorter.get_ready() == ("A",)
+    # Already given nodes are not returned again
+    assert sorter.get_ready() == ()
+    sorter.done("A")
+    assert set(sorter.get_ready()) == {"B", "C"}
+    sorter.done("B")
+    assert sorter.get_ready() == ()
+    sorter.done("C")
+    assert sorter.get_ready() == ("D",)
+    assert sorter.is_active()
+    sorter.done("D")
+    assert not sorter.is_active()